@@ -1,16 +1,109 @@
 import base64
+import binascii
+import re
 
-from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from PIL import Image
 from rest_framework import serializers
 
+from foodgram.settings import (IMAGE_MAX_PIXELS, IMAGE_MAX_SIZE,
+                               IMAGE_RENDITIONS)
+from recipes.images import rendition_name
+
+# Длина части строки Base64, декодируемой за раз (кратна 4)
+DECODE_CHUNK_SIZE = 64 * 1024
+
+
+class DecodedImageFile(TemporaryUploadedFile):
+    '''Временный файл декодированной картинки.
+    Хранилище при сохранении перемещает его на место, поэтому к моменту
+    сборки мусора файла может уже не быть.
+    '''
+    def __del__(self):
+        self.close()
+
 
 class Base64ImageField(serializers.ImageField):
     '''Поле загрузки картинки в формате Base64.
+    Картинка декодируется частями во временный файл; размер файла и
+    количество пикселей проверяются до разбора изображения.
+    В ответе - ссылка на копию картинки rendition. Копию можно выбрать
+    параметром запроса image_size или ключом image_rendition контекста,
+    image_size=original - ссылка на исходную картинку. Пока копии не
+    созданы (renditions_ready объекта), отдается исходная картинка.
     '''
+    default_error_messages = {
+        'too_large': 'Размер картинки больше {max_size} байт.',
+        'too_many_pixels': 'Картинка больше {max_pixels} пикселей.',
+        'invalid_base64': 'Некорректные данные Base64.',
+    }
+
+    def __init__(self, rendition=None, **kwargs):
+        self.rendition = rendition
+        super().__init__(**kwargs)
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
             format, imgstr = data.split(';base64,')
             ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            data = self.decode(imgstr, 'temp.' + ext, format[5:])
 
         return super().to_internal_value(data)
+
+    def decode(self, imgstr, name, content_type):
+        if re.search(r'\s', imgstr):
+            imgstr = re.sub(r'\s', '', imgstr)
+        if len(imgstr) * 3 // 4 > IMAGE_MAX_SIZE:
+            self.fail('too_large', max_size=IMAGE_MAX_SIZE)
+        file = DecodedImageFile(name, content_type, 0, None)
+        try:
+            for start in range(0, len(imgstr), DECODE_CHUNK_SIZE):
+                file.write(base64.b64decode(
+                    imgstr[start:start + DECODE_CHUNK_SIZE]))
+        except binascii.Error:
+            file.close()
+            self.fail('invalid_base64')
+        file.size = file.tell()
+        file.seek(0)
+        self.check_pixels(file)
+        return file
+
+    def check_pixels(self, file):
+        '''Размеры картинки читаются из заголовка, без декодирования.
+        Данные, в которых не удалось прочитать заголовок, отклоняются.
+        '''
+        try:
+            with Image.open(file.temporary_file_path()) as image:
+                width, height = image.size
+        except Image.DecompressionBombError:
+            file.close()
+            self.fail('too_many_pixels', max_pixels=IMAGE_MAX_PIXELS)
+        except (OSError, ValueError):
+            file.close()
+            self.fail('invalid_image')
+        if width * height > IMAGE_MAX_PIXELS:
+            file.close()
+            self.fail('too_many_pixels', max_pixels=IMAGE_MAX_PIXELS)
+
+    def get_rendition(self):
+        request = self.context.get('request')
+        rendition = (
+            request is not None
+            and getattr(request, 'query_params', {}).get('image_size')
+            or self.context.get('image_rendition')
+            or self.rendition
+        )
+        if rendition in IMAGE_RENDITIONS:
+            return rendition
+        return None
+
+    def to_representation(self, value):
+        rendition = self.get_rendition()
+        if (not value or rendition is None
+                or not getattr(value.instance, 'renditions_ready', False)):
+            return super().to_representation(value)
+        url = value.storage.url(rendition_name(value.name, rendition))
+        request = self.context.get('request')
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
@@ -1,29 +1,81 @@
+from django.db.models import F
 from django_filters.rest_framework import FilterSet, filters
 
-from recipes.models import Recipe, Tag
+from recipes.models import Recipe, Tag, ensure_tag_masks
+from recipes.search import search_recipes
 
 
 class RecipeFilter(FilterSet):
     tags = filters.ModelMultipleChoiceFilter(field_name='tags__slug',
                                              to_field_name='slug',
-                                             queryset=Tag.objects.all())
+                                             queryset=Tag.objects.all(),
+                                             method='tags_filter')
+    tags_match = filters.ChoiceFilter(
+        choices=(('any', 'Хотя бы один из тэгов'),
+                 ('all', 'Все тэги')),
+        method='tags_match_filter')
     is_favorited = filters.BooleanFilter(
         method='is_favorited_filter')
     is_in_shopping_cart = filters.BooleanFilter(
         method='is_in_shopping_cart_filter')
+    search = filters.CharFilter(method='search_filter')
+    ordering = filters.ChoiceFilter(
+        choices=(('trending', 'Популярные сейчас'),
+                 ('top', 'Популярные за все время')),
+        method='ordering_filter')
 
     class Meta:
         model = Recipe
         fields = ('tags', 'author',)
 
+    def tags_filter(self, queryset, name, value):
+        '''Отбор по маске тэгов рецепта: одно условие на строку рецепта
+        без соединения с TagInRecipe (и без повторов рецептов).
+        Тэгам без бита бит назначается до отбора.
+        '''
+        if not value:
+            return queryset
+        if any(tag.bit is None for tag in value):
+            ensure_tag_masks()
+            value = Tag.objects.filter(pk__in=[tag.pk for tag in value])
+        mask = 0
+        for tag in value:
+            mask |= tag.mask
+        queryset = queryset.alias(tag_bits=F('tag_mask').bitand(mask))
+        if self.form.cleaned_data.get('tags_match') == 'all':
+            return queryset.filter(tag_bits=mask)
+        return queryset.exclude(tag_bits=0)
+
+    def tags_match_filter(self, queryset, name, value):
+        '''Учитывается в tags_filter.
+        '''
+        return queryset
+
     def is_favorited_filter(self, queryset, name, value):
         user = self.request.user
         if value and user.is_authenticated:
-            return queryset.filter(favorit_recipe__user=user)
+            return queryset.filter(is_favorited=True)
         return queryset
 
     def is_in_shopping_cart_filter(self, queryset, name, value):
         user = self.request.user
         if value and user.is_authenticated:
-            return queryset.filter(shop_recipe__user=user)
+            return queryset.filter(is_in_shopping_cart=True)
         return queryset
+
+    def search_filter(self, queryset, name, value):
+        '''Полнотекстовый поиск по названию и описанию рецепта.
+        Результаты идут по релевантности, поэтому параметр cursor с поиском
+        не сочетается: пагинатор отвечает 400, листать можно по page.
+        '''
+        return search_recipes(queryset, value)
+
+    def ordering_filter(self, queryset, name, value):
+        '''Порядок по рейтингу из таблицы RecipeRanking (при равном
+        рейтинге - от новых к старым). Все поля порядка берутся из строки
+        рейтинга (id рецепта равен recipe_id), поэтому выдача идет по
+        индексу ranking_trending_idx или ranking_top_idx без сортировки
+        всей таблицы. Параметр cursor с рейтингом не сочетается.
+        '''
+        return queryset.filter(ranking__isnull=False).order_by(
+            f'-ranking__{value}', '-ranking__pub_date', '-id')
@@ -0,0 +1,107 @@
+'''Кэш представлений рецептов.
+
+Общая для всех пользователей часть представления рецепта (автор, тэги,
+ингредиенты, ссылка на картинку) хранится в кэше fragments (отдельном,
+размер и время жизни - в настройках CACHES). Ключ составлен
+из id рецепта, даты его изменения, версий таблиц тэгов и ингредиентов
+и размера картинки. Дата изменения обновляется сигналами при изменении
+рецепта, его тэгов и ингредиентов и профиля автора, версии таблиц - при
+изменении тэгов и ингредиентов; устаревшие записи больше не читаются
+и вытесняются по времени жизни. Флаги текущего пользователя
+добавляются к представлению при каждом запросе.
+'''
+from django.core.cache import caches
+from django.db.models import Prefetch
+
+from foodgram.settings import IMAGE_RENDITIONS
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+
+from .loaders import SubscriptionLoader, VersionLoader
+from .serializers import RecipeFragmentSerializer, RecipeSerializer
+
+# Поля рецепта, которые нужны для ключа и флагов (остальные - из кэша)
+KEY_FIELDS = ('id', 'author', 'pub_date', 'updated_at')
+
+
+def with_related(queryset):
+    '''Рецепты с автором, тэгами и ингредиентами.
+    '''
+    return queryset.select_related('author').prefetch_related(
+        'tags',
+        Prefetch('recipe_ingredients',
+                 queryset=RecipeIngredient.objects.select_related(
+                     'ingredient')),
+    )
+
+
+class RecipeFragmentCache:
+    '''Представления рецептов для запроса request.
+    Рецепты должны быть аннотированы флагами is_favorited и
+    is_in_shopping_cart текущего пользователя.
+    '''
+    key_prefix = 'recipe'
+
+    def __init__(self, request, context=None):
+        self.request = request
+        self.rendition = self.get_rendition(context or {})
+
+    def get_rendition(self, context):
+        '''Размер картинки как у Base64ImageField рецепта.
+        '''
+        rendition = (self.request.query_params.get('image_size')
+                     or context.get('image_rendition')
+                     or 'full')
+        if rendition in IMAGE_RENDITIONS:
+            return rendition
+        return 'original'
+
+    def get_key(self, recipe, versions):
+        return '{}:{}:{}:{}:{}:{}'.format(
+            self.key_prefix, recipe.pk, recipe.updated_at.timestamp(),
+            *versions, self.rendition)
+
+    def render(self, recipe_ids):
+        recipes = with_related(Recipe.objects.filter(pk__in=recipe_ids))
+        return RecipeFragmentSerializer(
+            recipes, many=True,
+            context={'image_rendition': self.rendition}).data
+
+    def get_fragments(self, recipes):
+        '''Общие части представлений: одно чтение кэша на все рецепты,
+        недостающие собираются вместе и записываются одним set_many.
+        '''
+        versions = VersionLoader.for_request(self.request).get(
+            Tag, Ingredient)
+        keys = {recipe.pk: self.get_key(recipe, versions)
+                for recipe in recipes}
+        fragments = caches['fragments'].get_many(keys.values())
+        missing = [pk for pk, key in keys.items() if key not in fragments]
+        if missing:
+            fresh = {keys[item['id']]: item for item in self.render(missing)}
+            caches['fragments'].set_many(fresh)
+            fragments.update(fresh)
+        return {pk: fragments.get(key) for pk, key in keys.items()}
+
+    def merge(self, fragment, recipe, loader):
+        '''Представление рецепта с флагами текущего пользователя.
+        '''
+        values = dict(
+            fragment,
+            author=dict(fragment['author'], is_subscribed=(
+                loader.is_subscribed(recipe.author_id))),
+            is_favorited=recipe.is_favorited,
+            is_in_shopping_cart=recipe.is_in_shopping_cart)
+        if fragment['image']:
+            values['image'] = self.request.build_absolute_uri(
+                fragment['image'])
+        return {field: values[field] for field in RecipeSerializer.Meta.fields}
+
+    def represent(self, recipes):
+        '''Представления рецептов (удаленные за время запроса пропускаются).
+        '''
+        recipes = list(recipes)
+        fragments = self.get_fragments(recipes)
+        loader = SubscriptionLoader.for_request(self.request)
+        loader.prime(recipe.author_id for recipe in recipes)
+        return [self.merge(fragments[recipe.pk], recipe, loader)
+                for recipe in recipes if fragments[recipe.pk] is not None]
@@ -0,0 +1,155 @@
+'''Пакетная загрузка рецептов из JSON Lines.
+
+Строки обрабатываются пачками: тэги и ингредиенты пачки читаются двумя
+запросами, рецепты, их связи и подписи для поиска похожих записываются
+bulk_create в одной транзакции на пачку. Ошибки собираются по номерам
+строк и не прерывают загрузку остальных рецептов.
+'''
+import json
+from itertools import islice
+
+from django.db import DatabaseError, connections, transaction
+
+from foodgram.settings import IMPORT_CHUNK_SIZE
+from jobs.queue import enqueue_many
+from recipes.models import (Ingredient, Recipe, RecipeChange, RecipeIngredient,
+                            RecipeRanking, Tag, TagInRecipe, User,
+                            change_counter, update_tag_masks)
+from recipes.search import update_search_documents
+from recipes.similarity import index_recipes
+
+from .serializers import ImportRecipeSerializer
+
+
+def create_recipes(recipes):
+    '''Сохранить рецепты пачкой.
+    bulk_create не вызывает сигналы, поэтому задания на копии картинок
+    и рассылку в ленты, поисковые документы, строки рейтинга, журнал
+    изменений и счетчик рецептов автора обновляются здесь.
+    Если СУБД не возвращает id вставленных строк, рецепты сохраняются
+    по одному.
+    '''
+    connection = connections[Recipe.objects.db]
+    if not connection.features.can_return_rows_from_bulk_insert:
+        for recipe in recipes:
+            recipe.save()
+        return
+    Recipe.objects.bulk_create(recipes)
+    calls = [(recipe.pk,) for recipe in recipes]
+    enqueue_many('recipes.image_renditions', calls)
+    enqueue_many('recipes.fan_out', calls)
+    update_search_documents(
+        Recipe.objects.filter(pk__in=[recipe.pk for recipe in recipes]))
+    RecipeRanking.objects.bulk_create(
+        [RecipeRanking(recipe=recipe, pub_date=recipe.pub_date)
+         for recipe in recipes])
+    RecipeChange.objects.log([recipe.pk for recipe in recipes])
+    for author_id in {recipe.author_id for recipe in recipes}:
+        change_counter(User, author_id, 'recipes_count', sum(
+            recipe.author_id == author_id for recipe in recipes))
+
+
+class RecipeImporter:
+    '''Загрузка рецептов пользователя author.
+    '''
+    def __init__(self, author, chunk_size=IMPORT_CHUNK_SIZE, context=None):
+        self.author = author
+        self.chunk_size = chunk_size
+        self.context = context or {}
+        self.created = 0
+        self.errors = []
+
+    def run(self, lines):
+        '''Загрузить строки JSON Lines и вернуть отчет.
+        '''
+        lines = enumerate(lines, 1)
+        chunk = list(islice(lines, self.chunk_size))
+        while chunk:
+            self.import_chunk(chunk)
+            chunk = list(islice(lines, self.chunk_size))
+        return {'created': self.created,
+                'failed': len(self.errors),
+                'errors': self.errors}
+
+    def error(self, line, errors):
+        self.errors.append({'line': line, 'errors': errors})
+
+    def parse(self, chunk):
+        items = []
+        for line, text in chunk:
+            if isinstance(text, bytes):
+                text = text.decode('utf-8', 'replace')
+            if not text.strip():
+                continue
+            try:
+                data = json.loads(text)
+            except ValueError as error:
+                self.error(line, {'detail': f'Некорректный JSON: {error}'})
+                continue
+            if not isinstance(data, dict):
+                self.error(line, {'detail': 'Ожидается объект рецепта.'})
+                continue
+            items.append((line, data))
+        return items
+
+    def get_context(self, items):
+        '''Тэги и ингредиенты всех рецептов пачки: два запроса.
+        '''
+        tags = set()
+        ingredients = set()
+        for _, data in items:
+            if isinstance(data.get('tags'), list):
+                tags.update(pk for pk in data['tags'] if isinstance(pk, int))
+            if isinstance(data.get('ingredients'), list):
+                ingredients.update(
+                    ingredient.get('id') for ingredient in data['ingredients']
+                    if isinstance(ingredient, dict)
+                    and isinstance(ingredient.get('id'), int))
+        return dict(self.context,
+                    tags=Tag.objects.in_bulk(tags),
+                    ingredients=Ingredient.objects.in_bulk(ingredients))
+
+    def import_chunk(self, chunk):
+        items = self.parse(chunk)
+        context = self.get_context(items)
+        valid = []
+        for line, data in items:
+            serializer = ImportRecipeSerializer(data=data, context=context)
+            if serializer.is_valid():
+                valid.append((line, serializer.validated_data))
+            else:
+                self.error(line, serializer.errors)
+        if valid:
+            self.save(valid)
+
+    def save(self, valid):
+        '''Записать проверенные рецепты пачки одной транзакцией.
+        '''
+        recipes = []
+        try:
+            with transaction.atomic():
+                for _, data in valid:
+                    recipes.append(Recipe(
+                        author=self.author, name=data['name'],
+                        text=data['text'], image=data['image'],
+                        cooking_time=data['cooking_time']))
+                create_recipes(recipes)
+                TagInRecipe.objects.bulk_create([
+                    TagInRecipe(recipe=recipe, tag=tag)
+                    for recipe, (_, data) in zip(recipes, valid)
+                    for tag in data['tags']])
+                update_tag_masks([recipe.pk for recipe in recipes])
+                RecipeIngredient.objects.bulk_create([
+                    RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                     amount=amount)
+                    for recipe, (_, data) in zip(recipes, valid)
+                    for ingredient, amount in data['ingredients']])
+                index_recipes({
+                    recipe.pk: {ingredient.pk
+                                for ingredient, _ in data['ingredients']}
+                    for recipe, (_, data) in zip(recipes, valid)})
+        except DatabaseError as error:
+            for line, _ in valid:
+                self.error(line, {'detail': str(error)})
+            return
+        self.created += len(recipes)
@@ -0,0 +1,60 @@
+from bisect import bisect_left
+from threading import Lock
+
+from recipes.models import Ingredient
+from recipes.versions import get_version
+
+
+def normalize(name):
+    '''Ключ поиска: без учета регистра, ё и е не различаются.
+    '''
+    return name.casefold().replace('ё', 'е')
+
+
+class IngredientIndex:
+    '''Префиксный индекс ингредиентов в памяти процесса.
+    Загружается один раз и перестраивается при смене версии таблицы
+    Ingredient. Версия берется из памяти процесса и перечитывается из БД
+    не чаще раза в TABLE_VERSION_TIMEOUT секунд (см. recipes.versions),
+    поэтому поиск по прогретому индексу не обращается к БД.
+    '''
+    lock = Lock()
+    current = None
+
+    def __init__(self, version):
+        self.version = version
+        rows = sorted(
+            (normalize(name), name, pk, measurement_unit)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit').iterator()
+        )
+        self.keys = [row[0] for row in rows]
+        self.items = [
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for _, name, pk, measurement_unit in rows
+        ]
+
+    @classmethod
+    def get(cls, version=None):
+        '''Актуальный индекс процесса (для версии таблицы ингредиентов
+        version, если она уже известна).
+        '''
+        if version is None:
+            version = get_version(Ingredient)
+        if cls.current is None or cls.current.version != version:
+            with cls.lock:
+                if cls.current is None or cls.current.version != version:
+                    cls.current = cls(version)
+        return cls.current
+
+    def search(self, prefix, limit=None):
+        '''Ингредиенты, название которых начинается с prefix.
+        '''
+        key = normalize(prefix)
+        start = bisect_left(self.keys, key)
+        stop = start
+        end = len(self.keys) if limit is None else min(
+            len(self.keys), start + limit)
+        while stop < end and self.keys[stop].startswith(key):
+            stop += 1
+        return self.items[start:stop]
@@ -0,0 +1,77 @@
+from users.models import Subscription
+
+from recipes.versions import get_versions
+
+
+class SubscriptionLoader:
+    '''Подписки текущего пользователя в рамках одного запроса.
+    Идентификаторы авторов, на которых подписан пользователь, загружаются
+    одним запросом для всех авторов страницы и далее берутся из памяти.
+    '''
+    attr_name = 'subscription_loader'
+
+    def __init__(self, user):
+        self.user = user
+        self.loaded = set()
+        self.followed = set()
+
+    @classmethod
+    def for_request(cls, request):
+        '''Загрузчик, общий для всех сериализаторов запроса.
+        '''
+        loader = getattr(request, cls.attr_name, None)
+        if loader is None:
+            loader = cls(request.user)
+            setattr(request, cls.attr_name, loader)
+        return loader
+
+    def prime(self, author_ids):
+        '''Загрузить подписки на ещё не проверенных авторов.
+        '''
+        missing = set(author_ids) - self.loaded
+        if not missing:
+            return
+        if self.user.is_authenticated:
+            self.followed.update(
+                Subscription.objects.filter(user=self.user,
+                                            author__in=missing)
+                .values_list('author', flat=True)
+            )
+        self.loaded.update(missing)
+
+    def is_subscribed(self, author_id):
+        '''Пользователь подписан на автора.
+        '''
+        self.prime((author_id,))
+        return author_id in self.followed
+
+
+class VersionLoader:
+    '''Версии таблиц в рамках одного запроса на чтение.
+    Версия каждой таблицы берется один раз (см. recipes.versions): ETag,
+    индекс ингредиентов и кэш представлений рецептов используют одно
+    значение, даже если версия изменится во время запроса.
+    '''
+    attr_name = 'version_loader'
+
+    def __init__(self):
+        self.versions = {}
+
+    @classmethod
+    def for_request(cls, request):
+        '''Загрузчик запроса (общий для HttpRequest и Request DRF).
+        '''
+        request = getattr(request, '_request', request)
+        loader = getattr(request, cls.attr_name, None)
+        if loader is None:
+            loader = cls()
+            setattr(request, cls.attr_name, loader)
+        return loader
+
+    def get(self, *models):
+        '''Версии таблиц моделей: недостающие - одним запросом.
+        '''
+        missing = [model for model in models if model not in self.versions]
+        if missing:
+            self.versions.update(zip(missing, get_versions(*missing)))
+        return [self.versions[model] for model in models]
@@ -0,0 +1,484 @@
+import json
+import math
+import os
+import random
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+from io import StringIO
+from itertools import accumulate, count
+from pathlib import Path
+from urllib.parse import quote
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (override_settings, setup_test_environment,
+                               teardown_test_environment)
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import Subscription
+
+from api.metrics import QueryCounter
+from foodgram.settings import SHOPPING_CART_PDF_FONT
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            Shoppingcart, Tag, TagInRecipe, update_tag_masks)
+from recipes.ranking import rank_recipes
+from recipes.search import update_search_documents
+
+User = get_user_model()
+
+BUDGETS = Path(__file__).resolve().parents[2] / 'benchmark_budgets.json'
+# Запас бюджета задержки относительно замера (разница машин и шум)
+BUDGET_MARGIN = 3
+BUDGET_MIN_MS = 20
+PASSWORD = 'Benchmark-Pa55word'
+NEW_PASSWORD = 'Benchmark-Pa55word-2'
+PNG = ('data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABieywa'
+       'AAAACVBMVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4bAAAACklEQVQI'
+       '12NgAAAAAgAB4iG8MwAAAABJRU5ErkJggg==')
+TAGS = (('Завтрак', 'breakfast'), ('Обед', 'lunch'), ('Ужин', 'dinner'),
+        ('Десерт', 'dessert'), ('Выпечка', 'baking'), ('Постное', 'lenten'))
+NAMES = ('{} по-домашнему', '{} с {}', 'Салат: {} и {}', 'Суп {}',
+         'Запеканка {}')
+CACHES = {alias: {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': f'benchmark-{alias}',
+} for alias in ('default', 'fragments')}
+
+
+class Command(BaseCommand):
+    help = ('Замеряет задержку (p50, p95) и пропускную способность '
+            'маршрутов API на заполненной тестовой БД (SQLite или '
+            'PostgreSQL из настроек; рабочая БД не меняется) и сверяет '
+            'результаты с бюджетами')
+
+    scenarios = (
+        'users_list', 'users_detail', 'users_me', 'users_create',
+        'users_set_password', 'auth_token', 'users_subscriptions',
+        'users_subscribe', 'tags', 'ingredients', 'recipes_list',
+        'recipes_filters', 'recipes_detail', 'recipes_write',
+        'recipes_favorite', 'recipes_shopping_cart', 'recipes_download',
+        'recipes_feed', 'recipes_similar', 'recipes_cook',
+        'recipes_import', 'metrics',
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=2000,
+                            help='Количество рецептов в тестовой БД.')
+        parser.add_argument('--users', type=int, default=200,
+                            help='Количество пользователей в тестовой БД.')
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Количество замеров каждого маршрута.')
+        parser.add_argument('--warmup', type=int, default=3,
+                            help='Запросы перед замерами (не учитываются).')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', default='benchmark_results.json',
+                            help='Файл для результатов в формате JSON.')
+        parser.add_argument('--budgets', default=str(BUDGETS),
+                            help='Файл бюджетов маршрутов.')
+        parser.add_argument('--no-check', action='store_true',
+                            help='Не сверять результаты с бюджетами.')
+        parser.add_argument('--update-budgets', action='store_true',
+                            help='Записать бюджеты по результатам: p95 с '
+                                 f'запасом x{BUDGET_MARGIN} (не меньше '
+                                 f'{BUDGET_MIN_MS} мс), SQL-запросы без '
+                                 'запаса.')
+        parser.add_argument('--only', nargs='+', choices=self.scenarios,
+                            help='Замерить только эти сценарии.')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.numbers = count()
+        self.weights = {}
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with tempfile.TemporaryDirectory() as media, override_settings(
+                    MEDIA_ROOT=media, CACHES=CACHES):
+                started = time.monotonic()
+                self.seed(options['recipes'], options['users'])
+                self.stdout.write(
+                    f'Тестовая БД заполнена за '
+                    f'{time.monotonic() - started:.1f} с.')
+                routes = self.measure(options['only'] or self.scenarios,
+                                      options['requests'], options['warmup'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        report = {
+            'database': connection.vendor,
+            'dataset': {'recipes': options['recipes'],
+                        'users': options['users']},
+            'requests': options['requests'],
+            'routes': routes,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        self.stdout.write(f'Результаты записаны в {options["output"]}.')
+        if options['update_budgets']:
+            self.write_budgets(report, options['budgets'])
+        elif not options['no_check']:
+            self.check_budgets(report, options['budgets'])
+
+    def seed(self, recipes, users):
+        '''Пользователи, тэги, ингредиенты из static/data, рецепты с
+        распределением авторов и ингредиентов по закону Ципфа, избранное,
+        корзины и подписки; производные данные (счетчики, списки покупок,
+        ленты, индекс похожих рецептов, рейтинг) - командами проекта.
+        '''
+        password = make_password(PASSWORD)
+        User.objects.bulk_create([
+            User(username=f'user{number}', email=f'user{number}@example.com',
+                 first_name='Имя', last_name=f'Фамилия {number}',
+                 password=password)
+            for number in range(users)
+        ], batch_size=1000)
+        self.user_ids = list(User.objects.values_list('id', flat=True))
+        self.all_tags = [Tag.objects.create(name=name, slug=slug,
+                                            color=f'#00000{number}')
+                         for number, (name, slug) in enumerate(TAGS)]
+        call_command('csv_to_db', stdout=StringIO())
+        self.ingredient_names = dict(
+            Ingredient.objects.values_list('id', 'name'))
+        self.seed_recipes(recipes)
+        self.seed_relations()
+        call_command('counters', stdout=StringIO())
+        call_command('shopping_list', stdout=StringIO())
+        call_command('fan_out_recipes', stdout=StringIO())
+        call_command('similar_index', stdout=StringIO())
+        rank_recipes()
+        self.seed_clients()
+
+    def zipf_choices(self, population, k):
+        '''k элементов population с весом 1 / номер (с повторами).
+        '''
+        size = len(population)
+        if size not in self.weights:
+            self.weights[size] = list(accumulate(
+                1 / rank for rank in range(1, size + 1)))
+        return self.random.choices(population, cum_weights=self.weights[size],
+                                   k=k)
+
+    def seed_recipes(self, total):
+        ingredient_ids = list(self.ingredient_names)
+        self.random.shuffle(ingredient_ids)
+        authors = self.zipf_choices(self.user_ids, total)
+        self.recipe_ids = list(range(1, total + 1))
+        recipes = []
+        links = []
+        tags = []
+        for recipe_id, author_id in zip(self.recipe_ids, authors):
+            chosen = set(self.zipf_choices(ingredient_ids,
+                                           self.random.randint(3, 10)))
+            names = [self.ingredient_names[pk] for pk in chosen]
+            recipes.append(Recipe(
+                id=recipe_id, author_id=author_id,
+                name=self.random.choice(NAMES).format(*names)[:200],
+                text=f'Возьмите {", ".join(names)}.'[:200],
+                image='recipes/images/benchmark.png',
+                cooking_time=self.random.randint(5, 120)))
+            links.extend(RecipeIngredient(recipe_id=recipe_id,
+                                          ingredient_id=pk,
+                                          amount=self.random.randint(1, 500))
+                         for pk in chosen)
+            tags.extend(TagInRecipe(recipe_id=recipe_id, tag=tag)
+                        for tag in self.random.sample(
+                            self.all_tags, self.random.randint(1, 3)))
+        Recipe.objects.bulk_create(recipes, batch_size=1000)
+        RecipeIngredient.objects.bulk_create(links, batch_size=1000)
+        TagInRecipe.objects.bulk_create(tags, batch_size=1000)
+        for start in range(0, total, 1000):
+            update_tag_masks(self.recipe_ids[start:start + 1000])
+        update_search_documents(Recipe.objects.all())
+
+    def seed_relations(self):
+        '''Каждый пользователь подписан на 5-20 авторов, у каждого
+        10-50 рецептов в избранном и 0-10 в корзине.
+        '''
+        subscriptions = []
+        favorites = []
+        carts = []
+        authors = list(set(
+            Recipe.objects.values_list('author', flat=True)))
+        for user_id in self.user_ids:
+            subscriptions.extend(
+                Subscription(user_id=user_id, author_id=author_id)
+                for author_id in set(self.zipf_choices(
+                    authors, self.random.randint(5, 20))) - {user_id})
+            favorites.extend(
+                Favorite(user_id=user_id, recipe_id=recipe_id)
+                for recipe_id in self.random.sample(
+                    self.recipe_ids, self.random.randint(10, 50)))
+            carts.extend(
+                Shoppingcart(user_id=user_id, recipe_id=recipe_id)
+                for recipe_id in self.random.sample(
+                    self.recipe_ids, self.random.randint(0, 10)))
+        Subscription.objects.bulk_create(subscriptions, batch_size=1000)
+        Favorite.objects.bulk_create(favorites, batch_size=1000)
+        Shoppingcart.objects.bulk_create(carts, batch_size=1000)
+
+    def seed_clients(self):
+        '''Клиенты: читатель (автор, подписки, избранное, корзина),
+        пользователь для смены пароля, для входа и администратор.
+        '''
+        reader, account, self.login, admin = User.objects.filter(
+            id__in=self.user_ids[:4]).order_by('id')
+        admin.is_staff = True
+        admin.save()
+        self.reader = reader
+        self.anonymous = APIClient()
+        self.client = self.client_for(reader)
+        self.account = self.client_for(account)
+        self.admin = self.client_for(admin)
+        self.password = PASSWORD
+        following = set(Subscription.objects.filter(
+            user=reader).values_list('author', flat=True))
+        self.unfollowed = [pk for pk in self.user_ids[1:]
+                           if pk not in following]
+        self.not_favorited = list(Recipe.objects.exclude(
+            favorit_recipe__user=reader).values_list('id', flat=True))
+        self.not_in_cart = list(Recipe.objects.exclude(
+            shop_recipe__user=reader).values_list('id', flat=True))
+
+    def client_for(self, user):
+        client = APIClient()
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def measure(self, scenarios, requests, warmup):
+        self.timings = defaultdict(list)
+        self.queries = defaultdict(int)
+        for scenario in scenarios:
+            self.recording = False
+            for number in range(warmup + requests):
+                self.recording = number >= warmup
+                getattr(self, scenario)()
+        routes = {}
+        for route, timings in self.timings.items():
+            timings.sort()
+            routes[route] = {
+                'p50_ms': round(statistics.median(timings) * 1000, 2),
+                'p95_ms': round(
+                    timings[int(len(timings) * 0.95) - 1] * 1000, 2),
+                'rps': round(len(timings) / sum(timings), 1),
+                'queries': self.queries[route],
+            }
+            self.stdout.write(
+                f'{route:40} p50 {routes[route]["p50_ms"]:8.2f} мс, '
+                f'p95 {routes[route]["p95_ms"]:8.2f} мс, '
+                f'{routes[route]["rps"]:7.1f} запр./с, '
+                f'SQL {routes[route]["queries"]}')
+        return routes
+
+    def request(self, route, method, path, data=None, client=None,
+                content_type='application/json'):
+        '''Выполнить запрос и записать его время и количество SQL-запросов
+        (для потоковых ответов - с передачей всего ответа).
+        '''
+        client = client or self.client
+        if data is not None and content_type == 'application/json':
+            data = json.dumps(data)
+        queries = QueryCounter()
+        started = time.perf_counter()
+        with queries.installed():
+            response = client.generic(method, path, data or '', content_type)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            raise CommandError(
+                f'{method} {path}: {response.status_code} '
+                f'{response.content[:500]!r}')
+        if self.recording:
+            self.timings[route].append(elapsed)
+            self.queries[route] = max(self.queries[route], queries.count)
+        return response
+
+    def recipe(self):
+        return self.random.choice(self.recipe_ids)
+
+    def users_list(self):
+        self.request('users-list', 'GET', '/api/users/?limit=6')
+
+    def users_detail(self):
+        self.request('users-detail', 'GET',
+                     f'/api/users/{self.random.choice(self.user_ids)}/')
+
+    def users_me(self):
+        self.request('users-me', 'GET', '/api/users/me/')
+
+    def users_create(self):
+        number = next(self.numbers)
+        self.request('users-create', 'POST', '/api/users/', {
+            'email': f'new{number}@example.com', 'username': f'new{number}',
+            'first_name': 'Имя', 'last_name': 'Фамилия',
+            'password': PASSWORD,
+        }, client=self.anonymous)
+
+    def users_set_password(self):
+        new_password = (NEW_PASSWORD if self.password == PASSWORD
+                        else PASSWORD)
+        self.request('users-set-password', 'POST',
+                     '/api/users/set_password/',
+                     {'current_password': self.password,
+                      'new_password': new_password},
+                     client=self.account)
+        self.password = new_password
+
+    def auth_token(self):
+        response = self.request(
+            'auth-token-login', 'POST', '/api/auth/token/login/',
+            {'email': self.login.email, 'password': PASSWORD},
+            client=self.anonymous)
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f'Token {response.json()["auth_token"]}')
+        self.request('auth-token-logout', 'POST', '/api/auth/token/logout/',
+                     client=client)
+
+    def users_subscriptions(self):
+        self.request('users-subscriptions', 'GET',
+                     '/api/users/subscriptions/?recipes_limit=3')
+
+    def users_subscribe(self):
+        path = (f'/api/users/{self.random.choice(self.unfollowed)}'
+                f'/subscribe/?recipes_limit=3')
+        self.request('users-subscribe-post', 'POST', path)
+        self.request('users-subscribe-delete', 'DELETE', path)
+
+    def tags(self):
+        self.request('tags-list', 'GET', '/api/tags/')
+        self.request('tags-detail', 'GET',
+                     f'/api/tags/{self.random.choice(self.all_tags).pk}/')
+
+    def ingredients(self):
+        pk, name = self.random.choice(list(self.ingredient_names.items()))
+        self.request('ingredients-list', 'GET',
+                     f'/api/ingredients/?name={quote(name[:3])}')
+        self.request('ingredients-detail', 'GET', f'/api/ingredients/{pk}/')
+
+    def recipes_list(self):
+        self.request('recipes-list', 'GET', '/api/recipes/?limit=6')
+
+    def recipes_filters(self):
+        first, second = self.random.sample(self.all_tags, 2)
+        tags = f'tags={first.slug}&tags={second.slug}'
+        word = self.random.choice(
+            list(self.ingredient_names.values())).split()[0]
+        filters = {
+            'recipes-list-tags': tags,
+            'recipes-list-tags-all': f'{tags}&tags_match=all',
+            'recipes-list-author': f'author={self.reader.pk}',
+            'recipes-list-favorited': 'is_favorited=1',
+            'recipes-list-in-cart': 'is_in_shopping_cart=1',
+            'recipes-list-search': f'search={quote(word)}',
+            'recipes-list-trending': 'ordering=trending',
+        }
+        for route, query in filters.items():
+            self.request(route, 'GET', f'/api/recipes/?limit=6&{query}')
+
+    def recipes_detail(self):
+        self.request('recipes-detail', 'GET', f'/api/recipes/{self.recipe()}/')
+
+    def recipe_data(self):
+        return {
+            'name': 'Новый рецепт', 'text': 'Описание', 'cooking_time': 15,
+            'image': PNG,
+            'tags': [tag.pk for tag in self.random.sample(self.all_tags, 2)],
+            'ingredients': [
+                {'id': pk, 'amount': 100}
+                for pk in self.random.sample(list(self.ingredient_names), 5)],
+        }
+
+    def recipes_write(self):
+        response = self.request('recipes-create', 'POST', '/api/recipes/',
+                                self.recipe_data())
+        path = f'/api/recipes/{response.json()["id"]}/'
+        self.request('recipes-partial-update', 'PATCH', path,
+                     self.recipe_data())
+        self.request('recipes-destroy', 'DELETE', path)
+
+    def recipes_favorite(self):
+        path = f'/api/recipes/{self.random.choice(self.not_favorited)}/'
+        self.request('recipes-favorite-post', 'POST', f'{path}favorite/')
+        self.request('recipes-favorite-delete', 'DELETE', f'{path}favorite/')
+
+    def recipes_shopping_cart(self):
+        path = f'/api/recipes/{self.random.choice(self.not_in_cart)}/'
+        self.request('recipes-shopping-cart-post', 'POST',
+                     f'{path}shopping_cart/')
+        self.request('recipes-shopping-cart-delete', 'DELETE',
+                     f'{path}shopping_cart/')
+
+    def recipes_download(self):
+        '''PDF замеряется, если есть шрифт SHOPPING_CART_PDF_FONT.
+        '''
+        formats = ['txt', 'csv']
+        if os.path.exists(SHOPPING_CART_PDF_FONT):
+            formats.append('pdf')
+        for file_format in formats:
+            self.request(f'recipes-download-shopping-cart-{file_format}',
+                         'GET', f'/api/recipes/download_shopping_cart/'
+                                f'?format={file_format}')
+
+    def recipes_feed(self):
+        self.request('recipes-feed', 'GET', '/api/recipes/feed/?limit=6')
+
+    def recipes_similar(self):
+        self.request('recipes-similar', 'GET',
+                     f'/api/recipes/{self.recipe()}/similar/')
+
+    def recipes_cook(self):
+        ingredients = self.random.sample(list(self.ingredient_names), 8)
+        self.request('recipes-cook', 'GET', '/api/recipes/cook/?limit=6'
+                     f'&ingredients={",".join(map(str, ingredients))}')
+
+    def recipes_import(self):
+        lines = '\n'.join(json.dumps(self.recipe_data()) for _ in range(10))
+        self.request('recipes-import', 'POST', '/api/recipes/import/',
+                     lines.encode(), content_type='application/x-ndjson')
+
+    def metrics(self):
+        self.request('metrics', 'GET', '/api/metrics', client=self.admin)
+
+    def check_budgets(self, report, path):
+        '''Сравнить результаты с бюджетами: превышение любого значения
+        (p50_ms, p95_ms, queries) - ошибка.
+        '''
+        with open(path, encoding='utf-8') as file:
+            budgets = json.load(file)
+        if budgets['dataset'] != report['dataset']:
+            self.stdout.write(self.style.WARNING(
+                f'Бюджеты заданы для данных {budgets["dataset"]}, '
+                f'сверка пропущена.'))
+            return
+        exceeded = []
+        for route, result in report['routes'].items():
+            if route not in budgets['routes']:
+                self.stdout.write(self.style.WARNING(
+                    f'Нет бюджета для {route}.'))
+                continue
+            for key, limit in budgets['routes'][route].items():
+                if result[key] > limit:
+                    exceeded.append(f'{route}: {key} {result[key]} > {limit}')
+        if exceeded:
+            raise CommandError('Превышены бюджеты:\n' + '\n'.join(exceeded))
+        self.stdout.write(self.style.SUCCESS('Бюджеты соблюдены.'))
+
+    def write_budgets(self, report, path):
+        routes = {}
+        for route, result in sorted(report['routes'].items()):
+            p95 = math.ceil(result['p95_ms'] * BUDGET_MARGIN)
+            routes[route] = {'p95_ms': max(p95, BUDGET_MIN_MS),
+                             'queries': result['queries']}
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump({'dataset': report['dataset'], 'routes': routes},
+                      file, ensure_ascii=False, indent=2)
+            file.write('\n')
+        self.stdout.write(f'Бюджеты записаны в {path}.')
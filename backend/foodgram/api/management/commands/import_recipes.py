@@ -0,0 +1,41 @@
+import json
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from api.importer import RecipeImporter
+from foodgram.settings import IMPORT_CHUNK_SIZE
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Загружает рецепты из файла JSON Lines (по одному рецепту '
+            'в строке, поля как при создании рецепта через API)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл или "-" для stdin.')
+        parser.add_argument('--author', required=True,
+                            help='Имя пользователя - автора рецептов.')
+        parser.add_argument('--chunk-size', type=int,
+                            default=IMPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            author = User.objects.get(username=options['author'])
+        except User.DoesNotExist:
+            raise CommandError(
+                f'Пользователь {options["author"]} не найден.')
+        importer = RecipeImporter(author, chunk_size=options['chunk_size'])
+        if options['path'] == '-':
+            report = importer.run(sys.stdin)
+        else:
+            with open(options['path'], encoding='utf-8') as file:
+                report = importer.run(file)
+        for error in report['errors']:
+            self.stderr.write(f'Строка {error["line"]}: ' + json.dumps(
+                error['errors'], ensure_ascii=False))
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено рецептов: {report["created"]}, '
+            f'с ошибками: {report["failed"]}.'))
@@ -0,0 +1,146 @@
+'''Метрики API в формате Prometheus.
+
+Для каждого представления (например, RecipeViewSet.list или
+CastomDjUserViewSet.subscriptions) считаются длительность запроса,
+количество и время SQL-запросов и размер ответа. SQL-запросы считает
+обертка connection.execute_wrapper, установленная на время обработки
+запроса (для потоковых ответов - до конца передачи).
+Под gunicorn каждый процесс пишет метрики в свои файлы в каталоге
+PROMETHEUS_MULTIPROC_DIR (см. gunicorn.conf.py), эндпоинт метрик MetricsView
+суммирует файлы всех процессов.
+'''
+import os
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .renderers import PrometheusRenderer
+
+UNRESOLVED = 'unresolved'
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+REQUESTS = Counter(
+    'foodgram_requests', 'Запросы к API.', ('view', 'status'))
+LATENCY = Histogram(
+    'foodgram_request_duration_seconds', 'Длительность запроса.',
+    ('view',), buckets=TIME_BUCKETS)
+QUERIES = Histogram(
+    'foodgram_request_queries', 'Количество SQL-запросов за запрос.',
+    ('view',), buckets=QUERY_BUCKETS)
+SQL_TIME = Histogram(
+    'foodgram_request_sql_seconds', 'Время SQL-запросов за запрос.',
+    ('view',), buckets=TIME_BUCKETS)
+RESPONSE_SIZE = Histogram(
+    'foodgram_response_size_bytes', 'Размер ответа.',
+    ('view',), buckets=SIZE_BUCKETS)
+
+
+def view_name(view_func, method):
+    '''Имя представления для метрик: класс и действие (метод HTTP,
+    если действия нет) или модуль и имя функции.
+    '''
+    view_class = (getattr(view_func, 'cls', None)
+                  or getattr(view_func, 'view_class', None))
+    if view_class is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    return f'{view_class.__name__}.{actions.get(method) or method}'
+
+
+def export():
+    '''Метрики всех процессов в текстовом формате Prometheus.
+    '''
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return generate_latest(REGISTRY)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
+
+
+class MetricsView(APIView):
+    '''Метрики API в текстовом формате Prometheus.
+    '''
+    permission_classes = [IsAdminUser]
+    renderer_classes = [PrometheusRenderer]
+
+    def get(self, request):
+        return Response(export(), content_type=CONTENT_TYPE_LATEST)
+
+
+class QueryCounter:
+    '''Обертка execute_wrapper: количество и время SQL-запросов.
+    '''
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+    def installed(self):
+        '''Контекст, в котором обертка установлена на все соединения.
+        '''
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self))
+        return stack
+
+
+class MetricsMiddleware:
+    '''Метрики запросов по представлениям.
+    Подключается первой, чтобы учитывать время остальных middleware.
+    '''
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        queries = QueryCounter()
+        with queries.installed():
+            response = self.get_response(request)
+        view = getattr(request, 'metrics_view', UNRESOLVED)
+        if response.streaming:
+            response.streaming_content = self.stream(
+                response.streaming_content, view, response.status_code,
+                started, queries)
+        else:
+            self.observe(view, response.status_code, started, queries,
+                         len(response.content))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_view = view_name(view_func, request.method.lower())
+
+    def stream(self, content, view, status, started, queries):
+        '''Передать потоковый ответ и записать метрики после него.
+        '''
+        size = 0
+        try:
+            with queries.installed():
+                for chunk in content:
+                    size += len(chunk)
+                    yield chunk
+        finally:
+            self.observe(view, status, started, queries, size)
+
+    def observe(self, view, status, started, queries, size):
+        REQUESTS.labels(view, status).inc()
+        LATENCY.labels(view).observe(time.perf_counter() - started)
+        QUERIES.labels(view).observe(queries.count)
+        SQL_TIME.labels(view).observe(queries.seconds)
+        RESPONSE_SIZE.labels(view).observe(size)
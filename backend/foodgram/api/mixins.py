@@ -0,0 +1,37 @@
+from hashlib import md5
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from foodgram.settings import VERSIONED_CACHE_MAX_AGE
+
+from .loaders import VersionLoader
+
+
+class VersionedCacheMixin:
+    '''Условные GET-запросы по версиям таблиц.
+    ETag вычисляется из версий таблиц version_models, адреса запроса
+    и заголовка Accept. Ответ 304 отдается до аутентификации и без
+    запросов к БД (версии берутся из памяти процесса, см.
+    recipes.versions).
+    '''
+    version_models = ()
+
+    def get_etag(self, request):
+        loader = VersionLoader.for_request(request)
+        versions = ':'.join(map(str, loader.get(*self.version_models)))
+        key = '{}|{}|{}'.format(versions, request.get_full_path(),
+                                request.META.get('HTTP_ACCEPT', ''))
+        return '"{}"'.format(md5(key.encode()).hexdigest())
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+        etag = self.get_etag(request)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = super().dispatch(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            patch_cache_control(response, public=True, must_revalidate=True,
+                                max_age=VERSIONED_CACHE_MAX_AGE)
+        return response
@@ -1,5 +1,115 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q, QuerySet
+from rest_framework import exceptions
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class CustomPaginator(PageNumberPagination):
+    '''Постраничная выдача.
+    С параметром cursor (пустым для первой страницы) выдача идет по ключу
+    cursor_ordering представления: без COUNT(*) и OFFSET, поэтому дальние
+    страницы не дороже первой. Списки (не QuerySet) всегда выдаются
+    по номеру страницы. Выдача, упорядоченная фильтром иначе, чем
+    cursor_ordering (рейтинг, релевантность поиска), с параметром cursor
+    не выдается (ошибка 400): ключ курсора потерял бы ее порядок.
+    '''
     page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    cursor_ordering = ('-id',)
+    invalid_cursor_message = 'Неверный курсор.'
+    ordered_queryset_message = ('Параметр cursor не сочетается с порядком '
+                                'выдачи, заданным фильтром.')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = (self.cursor_query_param in request.query_params
+                       and isinstance(queryset, QuerySet))
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        self.ordering = getattr(view, 'cursor_ordering', self.cursor_ordering)
+        self.check_ordering(queryset)
+        self.fields = [queryset.model._meta.get_field(name.lstrip('-'))
+                       for name in self.ordering]
+        page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(
+            request.query_params[self.cursor_query_param])
+        ordering = self.ordering
+        if reverse:
+            ordering = [name[1:] if name.startswith('-') else f'-{name}'
+                        for name in ordering]
+        if position is not None:
+            queryset = queryset.filter(self.after(ordering, position))
+        results = list(queryset.order_by(*ordering)[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+        self.next_position = self.previous_position = None
+        if results and (has_more or reverse):
+            self.next_position = self.get_position(results[-1])
+        if results and position is not None and (has_more or not reverse):
+            self.previous_position = self.get_position(results[0])
+        return results
+
+    def check_ordering(self, queryset):
+        '''Выдача не упорядочена иначе, чем ключом курсора.
+        '''
+        ordering = tuple(queryset.query.order_by)
+        if ordering and ordering != tuple(self.ordering):
+            raise exceptions.ValidationError(
+                {self.cursor_query_param: [self.ordered_queryset_message]})
+
+    def after(self, ordering, position):
+        '''Условие "строка после position" в порядке ordering.
+        '''
+        condition = Q()
+        equal = {}
+        for name, value in zip(ordering, position):
+            field = name.lstrip('-')
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        return condition
+
+    def get_position(self, obj):
+        return [field.value_to_string(obj) for field in self.fields]
+
+    def encode_cursor(self, position, reverse=False):
+        cursor = json.dumps({'p': position, 'r': reverse})
+        return urlsafe_b64encode(cursor.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None, False
+        try:
+            data = json.loads(urlsafe_b64decode(cursor.encode()))
+            position = [field.to_python(value)
+                        for field, value in zip(self.fields, data['p'])]
+            if len(position) != len(self.fields):
+                raise ValueError
+            return position, bool(data['r'])
+        except (KeyError, TypeError, ValueError, ValidationError):
+            raise exceptions.NotFound(self.invalid_cursor_message)
+
+    def get_cursor_link(self, position, reverse=False):
+        if position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param,
+                                   self.encode_cursor(position, reverse))
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_cursor_link(self.next_position)),
+            ('previous', self.get_cursor_link(self.previous_position,
+                                              reverse=True)),
+            ('results', data)
+        ]))
@@ -0,0 +1,208 @@
+import heapq
+import time
+from array import array
+from collections import defaultdict
+from copy import copy
+from threading import Lock
+
+from foodgram.settings import CHANGE_JOURNAL_RETENTION, CHANGE_JOURNAL_SIZE
+from recipes.models import RecipeChange, RecipeIngredient
+
+# Массив хранит id рецепта в 4 байтах (32 бита), маска - 1 бит на каждый
+# id до наибольшего: маска выгоднее, если в списке больше 1/32 всех id
+DENSE_RATIO = 32
+
+
+def to_bitset(ids):
+    '''Множество id как битовая маска (бит i - id i).
+    '''
+    if not ids:
+        return 0
+    data = bytearray(max(ids) // 8 + 1)
+    for pk in ids:
+        data[pk >> 3] |= 1 << (pk & 7)
+    return int.from_bytes(data, 'little')
+
+
+def from_bitset(bits):
+    '''id, биты которых установлены в маске, по возрастанию.
+    '''
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+    for index, byte in enumerate(data):
+        if byte:
+            for bit in range(8):
+                if byte >> bit & 1:
+                    yield index * 8 + bit
+
+
+def count_bits(bitsets):
+    '''Поразрядный счетчик масок: бит i маски planes[k] - k-й разряд
+    количества масок, в которых установлен бит i.
+    '''
+    planes = []
+    for carry in bitsets:
+        for number, plane in enumerate(planes):
+            planes[number] = plane ^ carry
+            carry &= plane
+            if not carry:
+                break
+        else:
+            if carry:
+                planes.append(carry)
+    return planes
+
+
+def combine(bitsets, match):
+    '''Пересечение (match=all) или объединение масок.
+    '''
+    result = bitsets[0]
+    for bits in bitsets[1:]:
+        if match == 'all':
+            result &= bits
+        else:
+            result |= bits
+    return result
+
+
+def pack(ids, max_id):
+    '''Список рецептов ингредиента: маска, если рецептов больше
+    max_id / DENSE_RATIO, иначе массив id (редкие ингредиенты в маске
+    занимали бы max_id / 8 байт ради нескольких бит).
+    '''
+    if len(ids) * DENSE_RATIO > max_id:
+        return to_bitset(ids)
+    return array('I', sorted(ids))
+
+
+def as_bitset(posting):
+    if isinstance(posting, int):
+        return posting
+    return to_bitset(posting)
+
+
+def merge(posting, removed, added, max_id):
+    '''Список рецептов ингредиента без removed и с added.
+    Маска остается маской до полной перестройки индекса.
+    '''
+    if isinstance(posting, int):
+        return posting & ~to_bitset(removed) | to_bitset(added)
+    ids = set(posting)
+    ids.difference_update(removed)
+    ids.update(added)
+    return pack(ids, max_id)
+
+
+class PantryIndex:
+    '''Обратный индекс ингредиентов в памяти процесса: для каждого
+    ингредиента - список id рецептов, в которые он входит (маска или
+    массив, см. pack). Индекс строится один раз, затем перечитываются
+    только рецепты из журнала изменений (RecipeChange). Индекс, который
+    не читал журнал дольше половины CHANGE_JOURNAL_RETENTION или отстал
+    больше чем на CHANGE_JOURNAL_SIZE записей, строится заново.
+    '''
+    lock = Lock()
+    current = None
+
+    def __init__(self):
+        RecipeChange.objects.prune()
+        self.position, self.gaps = RecipeChange.objects.start()
+        self.read_at = time.monotonic()
+        self.postings = {}
+        self.members = {}
+        self.max_id = 0
+        self.load(RecipeIngredient.objects.all(), {})
+
+    @classmethod
+    def get(cls):
+        '''Актуальный индекс процесса.
+        '''
+        current = cls.current
+        latest = RecipeChange.objects.position()
+        if (current is not None and not current.gaps
+                and not current.expired()
+                and current.position == latest):
+            return current
+        with cls.lock:
+            current = cls.current
+            if (current is None or current.expired()
+                    or latest - current.position > CHANGE_JOURNAL_SIZE):
+                cls.current = cls()
+                return cls.current
+            position, changed, gaps = RecipeChange.objects.read(
+                current.position, current.gaps)
+            if len(gaps) > CHANGE_JOURNAL_SIZE:
+                cls.current = cls()
+            else:
+                cls.current = current.updated(changed, position, gaps)
+        return cls.current
+
+    def expired(self):
+        return time.monotonic() - self.read_at > CHANGE_JOURNAL_RETENTION / 2
+
+    def load(self, rows, removed):
+        '''Добавить в индекс строки rows RecipeIngredient и убрать
+        рецепты removed ({ингредиент: множество id рецептов}).
+        '''
+        added = defaultdict(list)
+        for recipe_id, ingredient_id in rows.order_by().values_list(
+                'recipe', 'ingredient').iterator():
+            added[ingredient_id].append(recipe_id)
+            self.members.setdefault(recipe_id, set()).add(ingredient_id)
+            self.max_id = max(self.max_id, recipe_id)
+        for ingredient_id in set(added) | set(removed):
+            posting = merge(self.postings.get(ingredient_id, ()),
+                            removed.get(ingredient_id, ()),
+                            added.get(ingredient_id, ()), self.max_id)
+            if posting:
+                self.postings[ingredient_id] = posting
+            else:
+                self.postings.pop(ingredient_id, None)
+
+    def updated(self, recipe_ids, position, gaps):
+        '''Копия индекса с перечитанными ингредиентами измененных
+        (и удаленных) рецептов; текущий индекс не меняется, пока им
+        пользуются другие потоки.
+        '''
+        index = copy(self)
+        index.postings = dict(self.postings)
+        index.members = dict(self.members)
+        removed = defaultdict(set)
+        for recipe_id in recipe_ids:
+            for ingredient_id in index.members.pop(recipe_id, ()):
+                removed[ingredient_id].add(recipe_id)
+        if recipe_ids:
+            index.load(RecipeIngredient.objects.filter(recipe__in=recipe_ids),
+                       removed)
+        index.position = position
+        index.gaps = gaps
+        index.read_at = time.monotonic()
+        return index
+
+    def search(self, ingredients, match='any', min_coverage=0, limit=None):
+        '''id рецептов по убыванию доли их ингредиентов, которые есть
+        среди ingredients (при равной доле - по убыванию id).
+        match=any - рецепты хотя бы с одним ингредиентом (объединение
+        списков), match=all - рецепты со всеми (пересечение).
+        '''
+        postings = [as_bitset(self.postings.get(pk, 0))
+                    for pk in set(ingredients)]
+        if not postings:
+            return []
+        candidates = combine(postings, match)
+        planes = count_bits(postings)
+        scored = []
+        for covered in range(len(postings), 0, -1):
+            if covered >> len(planes):
+                continue
+            mask = candidates
+            for number, plane in enumerate(planes):
+                mask &= plane if covered >> number & 1 else ~plane
+            for recipe_id in from_bitset(mask):
+                coverage = covered / len(self.members[recipe_id])
+                if coverage >= min_coverage:
+                    scored.append((coverage, recipe_id))
+        if limit is None:
+            scored.sort(reverse=True)
+        else:
+            scored = heapq.nlargest(limit, scored)
+        return [recipe_id for _, recipe_id in scored]
@@ -0,0 +1,14 @@
+from rest_framework.parsers import BaseParser
+
+
+class JSONLinesParser(BaseParser):
+    '''Тело запроса в формате JSON Lines.
+    Возвращает итератор по строкам: они читаются из запроса по мере
+    обработки, тело целиком в память не загружается.
+    '''
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            return iter(())
+        return iter(stream)
@@ -0,0 +1,193 @@
+'''Потоковая генерация простых текстовых PDF-документов.
+
+Документ отдаётся частями: каждая страница записывается сразу после
+заполнения, дерево страниц и таблица ссылок - в конце документа.
+Для кириллицы в документ встраивается TrueType-шрифт, урезанный
+reportlab до символов кодировки cp1251: код символа в тексте равен
+его байту в cp1251.
+'''
+import zlib
+from functools import lru_cache
+
+from reportlab.pdfbase.ttfonts import TTFontFile
+
+ENCODING = 'cp1251'
+FIRST_CHAR = 32
+LAST_CHAR = 255
+
+
+def char_for_code(code):
+    '''Символ Unicode для байта кодировки cp1251 или None.
+    '''
+    try:
+        return bytes((code,)).decode(ENCODING)
+    except UnicodeDecodeError:
+        return None
+
+
+def to_unicode_cmap():
+    '''CMap для извлечения текста из документа (копирование, поиск).
+    '''
+    chars = [(code, char_for_code(code))
+             for code in range(FIRST_CHAR, LAST_CHAR + 1)
+             if char_for_code(code)]
+    blocks = []
+    for start in range(0, len(chars), 100):
+        block = chars[start:start + 100]
+        pairs = '\n'.join('<%02X> <%04X>' % (code, ord(char))
+                          for code, char in block)
+        blocks.append(f'{len(block)} beginbfchar\n{pairs}\nendbfchar')
+    return (
+        '/CIDInit /ProcSet findresource begin\n12 dict begin\nbegincmap\n'
+        '/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) '
+        '/Supplement 0 >> def\n/CMapName /Adobe-Identity-UCS def\n'
+        '/CMapType 2 def\n1 begincodespacerange\n<00> <FF>\n'
+        'endcodespacerange\n%s\nendcmap\n'
+        'CMapName currentdict /CMap defineresource pop\nend\nend'
+        % '\n'.join(blocks)
+    ).encode()
+
+
+TO_UNICODE_CMAP = to_unicode_cmap()
+
+
+class SubsetFont:
+    '''TrueType-шрифт для встраивания в PDF:
+    name      - PostScript-имя урезанного шрифта;
+    widths    - Ширины символов с кодами 0..LAST_CHAR (1/1000 кегля);
+    data      - Файл шрифта, в котором символ с кодом N - это символ
+                cp1251 с байтом N.
+    '''
+    def __init__(self, path):
+        face = TTFontFile(path)
+        codes = [ord(char_for_code(code) or '\0')
+                 for code in range(LAST_CHAR + 1)]
+        self.name = 'AAAAAA+' + face.name.decode()
+        self.bbox = [round(value) for value in face.bbox]
+        self.ascent = round(face.ascent)
+        self.descent = round(face.descent)
+        self.cap_height = round(face.capHeight)
+        self.stem_v = face.stemV
+        self.flags = face.flags
+        self.widths = [round(face.charWidths.get(code, face.defaultWidth))
+                       for code in codes]
+        self.data = face.makeSubset(codes)
+
+
+@lru_cache(maxsize=None)
+def load_font(path):
+    '''Шрифт загружается и урезается один раз на процесс.
+    '''
+    return SubsetFont(path)
+
+
+class PdfWriter:
+    '''Постраничная запись текстового PDF-документа (формат A4).
+    stream() отдаёт документ частями по мере поступления строк.
+    '''
+    width = 595
+    height = 842
+    margin = 50
+    font_size = 12
+    leading = 18
+
+    # Номера объектов, записываемых в начале и в конце документа.
+    CATALOG, PAGES, FONT, DESCRIPTOR, FONT_FILE, TO_UNICODE = range(1, 7)
+
+    def __init__(self, font):
+        self.font = font
+        self.offset = 0
+        self.offsets = {}
+        self.lines_per_page = (self.height - 2 * self.margin) // self.leading
+
+    def write(self, number, body, stream=None):
+        if stream is not None:
+            body += (b'\nstream\n' + stream + b'\nendstream')
+        chunk = b'%d 0 obj\n%s\nendobj\n' % (number, body)
+        self.offsets[number] = self.offset
+        self.offset += len(chunk)
+        return chunk
+
+    def header(self):
+        chunk = b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'
+        self.offset += len(chunk)
+        return chunk
+
+    def font_objects(self):
+        font = self.font
+        yield self.write(self.FONT, (
+            '<< /Type /Font /Subtype /TrueType /BaseFont /{name} '
+            '/FirstChar 0 /LastChar {last} /Widths [{widths}] '
+            '/FontDescriptor {descriptor} 0 R /ToUnicode {to_unicode} 0 R >>'
+        ).format(name=font.name, last=LAST_CHAR,
+                 widths=' '.join(map(str, font.widths)),
+                 descriptor=self.DESCRIPTOR,
+                 to_unicode=self.TO_UNICODE).encode())
+        yield self.write(self.DESCRIPTOR, (
+            '<< /Type /FontDescriptor /FontName /{name} /Flags {flags} '
+            '/FontBBox [{bbox}] /ItalicAngle 0 /Ascent {ascent} '
+            '/Descent {descent} /CapHeight {cap_height} /StemV {stem_v} '
+            '/FontFile2 {file} 0 R >>'
+        ).format(name=font.name, flags=font.flags,
+                 bbox=' '.join(map(str, font.bbox)), ascent=font.ascent,
+                 descent=font.descent, cap_height=font.cap_height,
+                 stem_v=font.stem_v, file=self.FONT_FILE).encode())
+        data = zlib.compress(font.data)
+        yield self.write(self.FONT_FILE, b'<< /Length %d /Length1 %d '
+                         b'/Filter /FlateDecode >>' % (len(data),
+                                                       len(font.data)),
+                         data)
+        yield self.write(self.TO_UNICODE, b'<< /Length %d >>'
+                         % len(TO_UNICODE_CMAP), TO_UNICODE_CMAP)
+
+    @staticmethod
+    def escape(line):
+        text = line.encode(ENCODING, errors='replace')
+        return (text.replace(b'\\', b'\\\\').replace(b'(', b'\\(')
+                .replace(b')', b'\\)'))
+
+    def page(self, number, lines):
+        top = self.height - self.margin - self.font_size
+        content = b'BT /F1 %d Tf %d TL %d %d Td %s ET' % (
+            self.font_size, self.leading, self.margin, top,
+            b' T* '.join(b'(%s) Tj' % self.escape(line) for line in lines))
+        content = zlib.compress(content)
+        yield self.write(number, b'<< /Type /Page /Parent %d 0 R '
+                         b'/MediaBox [0 0 %d %d] /Contents %d 0 R '
+                         b'/Resources << /Font << /F1 %d 0 R >> >> >>' % (
+                             self.PAGES, self.width, self.height,
+                             number + 1, self.FONT))
+        yield self.write(number + 1, b'<< /Length %d /Filter /FlateDecode >>'
+                         % len(content), content)
+
+    def stream(self, lines):
+        '''Документ из строк текста, отдаваемый частями.
+        '''
+        yield self.header()
+        yield from self.font_objects()
+        pages = []
+        number = self.TO_UNICODE + 1
+        buffer = []
+        for line in lines:
+            buffer.append(line)
+            if len(buffer) == self.lines_per_page:
+                yield from self.page(number, buffer)
+                pages.append(number)
+                number += 2
+                buffer = []
+        if buffer or not pages:
+            yield from self.page(number, buffer)
+            pages.append(number)
+            number += 2
+        yield self.write(self.PAGES, b'<< /Type /Pages /Kids [%s] '
+                         b'/Count %d >>' % (
+                             b' '.join(b'%d 0 R' % page for page in pages),
+                             len(pages)))
+        yield self.write(self.CATALOG, b'<< /Type /Catalog /Pages %d 0 R >>'
+                         % self.PAGES)
+        xref = [b'xref\n0 %d\n0000000000 65535 f \n' % number]
+        xref.extend(b'%010d 00000 n \n' % self.offsets[obj]
+                    for obj in range(1, number))
+        yield b''.join(xref) + (
+            b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+            % (number, self.CATALOG, self.offset))
@@ -0,0 +1,94 @@
+import csv
+from abc import ABCMeta, abstractmethod
+
+from django.conf import settings
+from rest_framework.renderers import BaseRenderer
+
+from .pdf import PdfWriter, load_font
+
+
+class Echo:
+    '''Псевдобуфер для csv.writer: возвращает записанную строку.
+    '''
+    def write(self, value):
+        return value
+
+
+class ShoppingCartRenderer(BaseRenderer, metaclass=ABCMeta):
+    '''Потоковый рендерер списка покупок.
+    Строки (name, total_amount, measurement_unit) кодируются по мере
+    чтения из курсора БД, файл целиком в памяти не собирается.
+    Форматы задаются наследниками, реализующими stream().
+    '''
+    charset = 'utf-8'
+    title = 'Список покупок'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        '''Ответы с ошибками выводятся текстом в формате файла.
+        '''
+        if isinstance(data, dict):
+            data = data.get('detail', data)
+        return b''.join(self.stream((), title=str(data)))
+
+    @abstractmethod
+    def stream(self, rows, title=None):
+        '''Файл частями (bytes): заголовок title и строки rows.
+        '''
+
+
+class ShoppingCartTxtRenderer(ShoppingCartRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, rows, title=None):
+        yield f'{title or self.title}: '.encode()
+        for row in rows:
+            yield '{} - {} {}. '.format(*row).encode()
+
+
+class ShoppingCartCsvRenderer(ShoppingCartRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    header = ('Ингредиент', 'Количество', 'Единица измерения')
+
+    def stream(self, rows, title=None):
+        writer = csv.writer(Echo())
+        yield writer.writerow(
+            (title,) if title else self.header).encode()
+        for row in rows:
+            yield writer.writerow(row).encode()
+
+
+class ShoppingCartPdfRenderer(ShoppingCartRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+
+    def stream(self, rows, title=None):
+        writer = PdfWriter(load_font(settings.SHOPPING_CART_PDF_FONT))
+        lines = ('{} - {} {}'.format(*row) for row in rows)
+        return writer.stream(
+            self.title_lines(title or self.title, lines))
+
+    @staticmethod
+    def title_lines(title, lines):
+        yield f'{title}:'
+        yield ''
+        yield from lines
+
+
+class PrometheusRenderer(BaseRenderer):
+    '''Метрики в текстовом формате Prometheus (данные уже закодированы).
+    '''
+    media_type = 'text/plain'
+    format = 'prometheus'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        '''Ответы с ошибками выводятся текстом.
+        '''
+        if isinstance(data, bytes):
+            return data
+        if isinstance(data, dict):
+            data = data.get('detail', data)
+        return str(data).encode()
@@ -1,34 +1,66 @@
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
+from django.db import models, transaction
 from djoser.serializers import UserCreateSerializer, UserSerializer
-from recipes.models import (AmountOfIngredient, Favorite, Ingredient, Recipe,
-                            Shoppingcart, Tag)
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            Shoppingcart, ShoppingList, Tag)
+from recipes.similarity import index_recipes
 from rest_framework import serializers
 from users.models import Subscription
 
 from .field import Base64ImageField
+from .loaders import SubscriptionLoader
 
 User = get_user_model()
 
 
+def get_recipes_limit(request):
+    '''Параметр запроса recipes_limit: неотрицательное число или None,
+    если параметр не задан. Некорректное значение - ошибка 400.
+    '''
+    limit = request.query_params.get('recipes_limit')
+    if not limit:
+        return None
+    try:
+        return serializers.IntegerField(min_value=0).run_validation(limit)
+    except serializers.ValidationError as error:
+        raise serializers.ValidationError({'recipes_limit': error.detail})
+
+
+class SubscriptionListSerializer(serializers.ListSerializer):
+    '''Список объектов с загрузкой подписок на всех авторов списка сразу.
+    Поле автора задается атрибутом subscription_author_field сериализатора.
+    '''
+    def to_representation(self, data):
+        if isinstance(data, models.Manager):
+            data = data.all()
+        data = list(data)
+        request = self.context.get('request')
+        if request is not None:
+            field = self.child.subscription_author_field
+            SubscriptionLoader.for_request(request).prime(
+                getattr(obj, field) for obj in data)
+        return super().to_representation(data)
+
+
 class CustomUserSerializer(UserSerializer):
     '''Пользователь.
     '''
     is_subscribed = serializers.SerializerMethodField()
+    subscription_author_field = 'id'
 
     class Meta:
         model = User
         fields = ('email', 'id', 'username',
                   'first_name', 'last_name',
                   'is_subscribed')
+        list_serializer_class = SubscriptionListSerializer
 
     def get_is_subscribed(self, obj):
         '''Пользователь подписан на автора рецепта.
         '''
-        user_id = self.context.get('request').user.id
-        return Subscription.objects.filter(author=obj.id,
-                                           user=user_id
-                                           ).exists()
+        request = self.context.get('request')
+        return SubscriptionLoader.for_request(request).is_subscribed(obj.id)
 
 
 class CustomUserCreateSerializer(UserCreateSerializer):
@@ -65,6 +97,8 @@ class UserWithRecipesSerializer(serializers.ModelSerializer):
     def get_is_subscribed(self, obj):
         '''Пользователь подписан на автора рецепта.
         '''
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         user_id = self.context.get('request').user.id
         return Subscription.objects.filter(author=obj.id,
                                            user=user_id
@@ -73,18 +107,21 @@ class UserWithRecipesSerializer(serializers.ModelSerializer):
     def get_recipes_count(self, obj):
         '''Общее количество рецептов пользователя.
         '''
-        return Recipe.objects.filter(author=obj.id).count()
+        return obj.recipes_count
 
     def get_recipes(self, obj):
         '''Рецепты с огранечением выдачи.
         recipes_limit - Количество объектов внутри поля recipes
         '''
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
+        if hasattr(obj, 'limited_recipes'):
+            return RecipeMinifiedSerializer(obj.limited_recipes, many=True,
+                                            read_only=True
+                                            ).data
+        limit = get_recipes_limit(self.context.get('request'))
         recipes = Recipe.objects.filter(author=obj.id
                                         )
-        if limit:
-            recipes = recipes[:int(limit)]
+        if limit is not None:
+            recipes = recipes[:limit]
         serializer = RecipeMinifiedSerializer(recipes, many=True,
                                               read_only=True
                                               )
@@ -96,7 +133,7 @@ class TagSerializer(serializers.ModelSerializer):
     '''
     class Meta:
         model = Tag
-        fields = '__all__'
+        fields = ('id', 'name', 'color', 'slug')
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -107,22 +144,14 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit')
 
 
-class AmountOfIngredientSerializer(serializers.ModelSerializer):
-    '''Сериализатор колличества ингредиента.
-    '''
-    class Meta:
-        model = AmountOfIngredient
-        fields = ('id', 'ingredient', 'amount')
-
-
-class CreateAmountOfIngredientSerializer(serializers.ModelSerializer):
+class CreateRecipeIngredientSerializer(serializers.ModelSerializer):
     '''Сериализатор колличества ингредиента.
     '''
     id = serializers.PrimaryKeyRelatedField(
         queryset=Ingredient.objects.all())
 
     class Meta:
-        model = AmountOfIngredient
+        model = RecipeIngredient
         fields = ('id', 'amount')
 
 
@@ -143,7 +172,7 @@ class IngredientAmountSerializer(serializers.ModelSerializer):
         source='ingredient', slug_field='measurement_unit', read_only='True')
 
     class Meta:
-        model = AmountOfIngredient
+        model = RecipeIngredient
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
@@ -152,20 +181,25 @@ class RecipeSerializer(serializers.ModelSerializer):
     '''
     tags = TagSerializer(read_only=False, many=True)
     author = CustomUserSerializer(read_only=True)
-    ingredients = IngredientAmountSerializer(read_only=False, many=True)
+    ingredients = IngredientAmountSerializer(source='recipe_ingredients',
+                                             read_only=False, many=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
-    image = Base64ImageField()
+    image = Base64ImageField(rendition='full')
+    subscription_author_field = 'author_id'
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients',
                   'is_favorited', 'is_in_shopping_cart',
                   'name', 'image', 'text', 'cooking_time')
+        list_serializer_class = SubscriptionListSerializer
 
     def get_is_favorited(self, obj):
         '''Рецепт находится ли в избранном.
         '''
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user_id = self.context['request'].user.id
         return Favorite.objects.filter(recipe=obj.id,
                                        user=user_id,
@@ -174,11 +208,35 @@ class RecipeSerializer(serializers.ModelSerializer):
     def get_is_in_shopping_cart(self, obj):
         '''Рецепт находится ли в корзине.
         '''
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user_id = self.context['request'].user.id
         return Shoppingcart.objects.filter(
             recipe=obj.id, user=user_id).exists()
 
 
+class AuthorFragmentSerializer(serializers.ModelSerializer):
+    '''Автор рецепта без флага подписки текущего пользователя.
+    '''
+    class Meta:
+        model = User
+        fields = ('email', 'id', 'username', 'first_name', 'last_name')
+
+
+class RecipeFragmentSerializer(RecipeSerializer):
+    '''Общая для всех пользователей часть рецепта (хранится в кэше).
+    Картинка - ссылка без адреса сервера.
+    '''
+    author = AuthorFragmentSerializer(read_only=True)
+    is_favorited = None
+    is_in_shopping_cart = None
+
+    class Meta:
+        model = Recipe
+        fields = ('id', 'tags', 'author', 'ingredients',
+                  'name', 'image', 'text', 'cooking_time')
+
+
 class CreateRecipeSerializer(RecipeSerializer):
     '''Сериализатор создания Рецептов.
     '''
@@ -186,23 +244,43 @@ class CreateRecipeSerializer(RecipeSerializer):
         many=True, queryset=Tag.objects.all())
     author = serializers.PrimaryKeyRelatedField(
         read_only=True, default=serializers.CurrentUserDefault())
-    ingredients = CreateAmountOfIngredientSerializer(many=True)
+    ingredients = CreateRecipeIngredientSerializer(many=True)
 
     def validate_ingredients(self, value):
-        if value:
-            return value
-        raise ValidationError('Отсутствуют ингредиенты.')
+        if not value:
+            raise ValidationError('Отсутствуют ингредиенты.')
+        ingredients = [ingredient['id'] for ingredient in value]
+        if len(set(ingredients)) != len(ingredients):
+            raise ValidationError('Ингредиенты не должны повторяться.')
+        return value
 
     def validate_tags(self, value):
         if value:
             return value
         raise ValidationError('Отсутствуют тэги.')
 
+    @staticmethod
+    def create_ingredients(recipe, ingredients_data):
+        '''Ингредиенты рецепта и его подпись для поиска похожих.
+        '''
+        RecipeIngredient.objects.bulk_create([RecipeIngredient(
+            recipe=recipe,
+            ingredient=ingredient['id'],
+            amount=ingredient['amount']
+        ) for ingredient in ingredients_data])
+        index_recipes({recipe.pk: {ingredient['id'].pk
+                                   for ingredient in ingredients_data}})
+
+    @transaction.atomic
     def create(self, validated_data):
-        validated_data.pop('tags')
-        validated_data.pop('ingredients')
-        return Recipe.objects.create(**validated_data)
-
+        tags_data = validated_data.pop('tags')
+        ingredients_data = validated_data.pop('ingredients')
+        recipe = Recipe.objects.create(**validated_data)
+        recipe.tags.set(tags_data)
+        self.create_ingredients(recipe, ingredients_data)
+        return recipe
+
+    @transaction.atomic
     def update(self, instance, validated_data):
         instance.name = validated_data.get("name", instance.name)
         instance.image = validated_data.get("image", instance.image)
@@ -216,17 +294,9 @@ class CreateRecipeSerializer(RecipeSerializer):
             instance.tags.set(lst)
         if 'ingredients' in validated_data:
             ingredients_data = validated_data.pop('ingredients')
-            len_id = len(ingredients_data)
-            amofing_db = [AmountOfIngredient(
-                amount=ingredient['amount'],
-                ingredient=ingredient['id']
-            ) for ingredient in ingredients_data]
-            AmountOfIngredient.objects.bulk_create(amofing_db)
-            last_id = AmountOfIngredient.objects.all().latest('id').id
-            lst = list(AmountOfIngredient.objects.in_bulk(
-                list(range(last_id - len_id + 1, last_id + 1))
-            ).values())
-            instance.ingredients.set(lst)
+            with ShoppingList.objects.sync((instance.pk,)):
+                RecipeIngredient.objects.filter(recipe=instance).delete()
+                self.create_ingredients(instance, ingredients_data)
         instance.save()
         return instance
 
@@ -235,11 +305,64 @@ class CreateRecipeSerializer(RecipeSerializer):
                                 context=self.context).data
 
 
+class ImportIngredientSerializer(serializers.Serializer):
+    '''Ингредиент рецепта из пакетной загрузки.
+    '''
+    id = serializers.IntegerField()
+    amount = serializers.IntegerField(min_value=1)
+
+
+class ImportRecipeSerializer(serializers.ModelSerializer):
+    '''Рецепт из пакетной загрузки.
+    Тэги и ингредиенты проверяются по словарям context['tags'] и
+    context['ingredients'], загруженным сразу для всей пачки.
+    '''
+    tags = serializers.ListField(child=serializers.IntegerField())
+    ingredients = ImportIngredientSerializer(many=True)
+    image = Base64ImageField()
+
+    class Meta:
+        model = Recipe
+        fields = ('tags', 'ingredients', 'name', 'image', 'text',
+                  'cooking_time')
+
+    def validate_tags(self, value):
+        if not value:
+            raise ValidationError('Отсутствуют тэги.')
+        missing = set(value) - set(self.context['tags'])
+        if missing:
+            raise ValidationError(f'Тэги не найдены: {sorted(missing)}')
+        return [self.context['tags'][pk] for pk in dict.fromkeys(value)]
+
+    def validate_ingredients(self, value):
+        if not value:
+            raise ValidationError('Отсутствуют ингредиенты.')
+        ingredients = [ingredient['id'] for ingredient in value]
+        if len(set(ingredients)) != len(ingredients):
+            raise ValidationError('Ингредиенты не должны повторяться.')
+        missing = set(ingredients) - set(self.context['ingredients'])
+        if missing:
+            raise ValidationError(
+                f'Ингредиенты не найдены: {sorted(missing)}')
+        return [(self.context['ingredients'][ingredient['id']],
+                 ingredient['amount']) for ingredient in value]
+
+
 class RecipeMinifiedSerializer(serializers.ModelSerializer):
     '''Рецепт в сокращенном виде.
     '''
-    image = Base64ImageField()
+    image = Base64ImageField(rendition='thumbnail')
 
     class Meta:
         model = Recipe
         fields = ('id', 'name', 'image', 'cooking_time')
+
+
+class PantrySearchSerializer(serializers.Serializer):
+    '''Параметры поиска рецептов по имеющимся ингредиентам.
+    '''
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False)
+    match = serializers.ChoiceField(choices=('any', 'all'), default='any')
+    min_coverage = serializers.FloatField(min_value=0, max_value=1,
+                                          default=0)
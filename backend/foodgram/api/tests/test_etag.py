@@ -0,0 +1,102 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import update_last_login
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from api.ingredient_index import IngredientIndex
+from recipes.models import Ingredient, Recipe, Tag
+from recipes.versions import clear_versions
+
+User = get_user_model()
+
+
+class RecipeETagTest(APITestCase):
+    '''ETag рецепта не зависит от чужих пользователей и входов автора.
+    '''
+    def setUp(self):
+        self.author = User.objects.create_user(
+            'author', 'author@example.com', 'password',
+            first_name='Иван', last_name='Петров')
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Борщ', text='Сварить.',
+            cooking_time=60, image='recipes/images/borsch.png')
+        self.url = f'/api/recipes/{self.recipe.pk}/'
+
+    def get_etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def test_etag_ignores_signups_and_logins(self):
+        etag = self.get_etag()
+        User.objects.create_user('reader', 'reader@example.com', 'password')
+        update_last_login(None, self.author)
+        self.assertEqual(self.get_etag(), etag)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_follows_author_profile(self):
+        etag = self.get_etag()
+        self.author.first_name = 'Пётр'
+        self.author.save()
+        self.assertNotEqual(self.get_etag(), etag)
+
+    def test_versions_read_once(self):
+        self.get_etag()
+        clear_versions()
+        with CaptureQueriesContext(connection) as queries:
+            self.get_etag()
+        versions = [query for query in queries.captured_queries
+                    if 'recipes_tableversion' in query['sql']]
+        self.assertEqual(len(versions), 1)
+
+
+class ConditionalGetTest(APITransactionTestCase):
+    '''Ответ 304 по версиям таблиц отдается без запросов к БД.
+    '''
+    url = '/api/tags/'
+
+    def setUp(self):
+        clear_versions()
+        self.tag = Tag.objects.create(name='Обед', color='#00FF00',
+                                      slug='lunch')
+
+    def test_not_modified_without_queries(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_change_in_process_resets_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.tag.name = 'Ужин'
+        self.tag.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class IngredientListTest(APITransactionTestCase):
+    '''Поиск ингредиентов по прогретому индексу обходится без запросов
+    к БД; изменение таблицы в процессе перестраивает индекс.
+    '''
+    def setUp(self):
+        clear_versions()
+        IngredientIndex.current = None
+        Ingredient.objects.create(name='соль', measurement_unit='г')
+
+    def search(self, name):
+        response = self.client.get(f'/api/ingredients/?name={name}')
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.json()]
+
+    def test_warm_index_without_queries(self):
+        self.search('со')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.search('со'), ['соль'])
+
+    def test_change_rebuilds_index(self):
+        self.search('со')
+        Ingredient.objects.create(name='сода', measurement_unit='г')
+        self.assertEqual(self.search('со'), ['сода', 'соль'])
@@ -0,0 +1,68 @@
+from django.contrib.auth import get_user_model
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from users.models import Subscription
+
+from recipes.models import Recipe, Tag, TimelineEntry
+
+User = get_user_model()
+
+
+class FeedTest(APITestCase):
+    '''Лента подписок читается из TimelineEntry.
+    '''
+    def setUp(self):
+        self.reader = User.objects.create_user(
+            'reader', 'reader@example.com', 'password')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + (
+            Token.objects.create(user=self.reader).key))
+        self.author, self.star = (
+            User.objects.create_user(name, f'{name}@example.com', 'password')
+            for name in ('author', 'star'))
+        for author in (self.author, self.star):
+            Subscription.objects.create(user=self.reader, author=author)
+        User.objects.filter(pk=self.star.pk).update(followers_count=10 ** 6)
+        self.lunch = Tag.objects.create(name='Обед', color='#00FF00',
+                                        slug='lunch')
+        self.recipes = [self.publish(author) for author in (
+            self.author, self.star, self.author, self.star)]
+        self.recipes[1].tags.add(self.lunch)
+
+    def publish(self, author):
+        recipe = Recipe.objects.create(
+            author=author, name='Суп', text='Сварить.', cooking_time=10,
+            image='recipes/images/soup.png')
+        TimelineEntry.objects.fan_out(
+            Recipe.objects.select_related('author').get(pk=recipe.pk))
+        return recipe
+
+    def feed(self, query=''):
+        response = self.client.get(f'/api/recipes/feed/{query}')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_unsent_recipes_are_merged(self):
+        self.assertEqual(
+            [recipe['id'] for recipe in self.feed()['results']],
+            [recipe.pk for recipe in reversed(self.recipes)])
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 4)
+        self.assertFalse(Recipe.objects.get(pk=self.recipes[1].pk).fanned_out)
+
+    def test_filters_and_cursor(self):
+        self.assertEqual(
+            [recipe['id'] for recipe in self.feed('?tags=lunch')['results']],
+            [self.recipes[1].pk])
+        page = self.feed('?cursor=&limit=3')
+        self.assertEqual(len(page['results']), 3)
+        query = page['next'].split('/feed/')[1]
+        self.assertEqual([recipe['id'] for recipe in self.feed(query)[
+            'results']], [self.recipes[0].pk])
+
+    def test_unsubscribe_removes_recipes(self):
+        self.feed()
+        Subscription.objects.filter(user=self.reader,
+                                    author=self.star).delete()
+        self.assertEqual(
+            [recipe['id'] for recipe in self.feed()['results']],
+            [self.recipes[2].pk, self.recipes[0].pk])
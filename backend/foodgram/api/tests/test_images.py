@@ -0,0 +1,96 @@
+import base64
+import shutil
+import struct
+import tempfile
+import zlib
+from io import BytesIO, StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APITestCase
+
+from api.field import Base64ImageField
+from recipes.models import Ingredient, Recipe, Tag
+
+User = get_user_model()
+
+
+def image_data():
+    buffer = BytesIO()
+    Image.new('RGB', (64, 64), 'red').save(buffer, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+def png_chunk(kind, data=b''):
+    return (struct.pack('>I', len(data)) + kind + data
+            + struct.pack('>I', zlib.crc32(kind + data)))
+
+
+def png_header(width, height):
+    '''PNG-файл без пикселей: заголовок IHDR с заданными размерами.
+    '''
+    data = (b'\x89PNG\r\n\x1a\n'
+            + png_chunk(b'IHDR', struct.pack('>2I5B', width, height,
+                                             8, 2, 0, 0, 0))
+            + png_chunk(b'IEND'))
+    return 'data:image/png;base64,' + base64.b64encode(data).decode()
+
+
+class RenditionFallbackTest(APITestCase):
+    '''Пока копии картинки не созданы, в ответе - исходная картинка.
+    '''
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings = override_settings(MEDIA_ROOT=media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        author = User.objects.create_user('author', 'author@example.com',
+                                          'password')
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + (
+            Token.objects.create(user=author).key))
+        self.tag = Tag.objects.create(name='Обед', color='#00FF00',
+                                      slug='lunch')
+        self.ingredient = Ingredient.objects.create(name='соль',
+                                                    measurement_unit='г')
+
+    def test_original_until_renditions_ready(self):
+        response = self.client.post('/api/recipes/', {
+            'name': 'Суп', 'text': 'Сварить.', 'cooking_time': 10,
+            'image': image_data(), 'tags': [self.tag.pk],
+            'ingredients': [{'id': self.ingredient.pk, 'amount': 5}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        url = f"/api/recipes/{response.json()['id']}/"
+        self.assertTrue(response.json()['image'].endswith('.png'))
+        self.assertTrue(self.client.get(url).json()['image'].endswith('.png'))
+        call_command('run_worker', '--once', stdout=StringIO())
+        self.assertTrue(Recipe.objects.get(
+            pk=response.json()['id']).renditions_ready)
+        self.assertTrue(
+            self.client.get(url).json()['image'].endswith('.full.webp'))
+
+
+class PixelCheckTest(SimpleTestCase):
+    '''Размеры из заголовка проверяются до разбора картинки.
+    '''
+    def assert_rejected(self, data, code):
+        with self.assertRaises(ValidationError) as context:
+            Base64ImageField().to_internal_value(data)
+        self.assertEqual(context.exception.detail[0].code, code)
+
+    def test_too_many_pixels(self):
+        self.assert_rejected(png_header(8000, 8000), 'too_many_pixels')
+
+    def test_decompression_bomb(self):
+        self.assert_rejected(png_header(100000, 100000), 'too_many_pixels')
+
+    def test_invalid_image(self):
+        self.assert_rejected('data:image/png;base64,'
+                             + base64.b64encode(b'not an image').decode(),
+                             'invalid_image')
@@ -0,0 +1,77 @@
+from array import array
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from api.pantry_index import PantryIndex, as_bitset, from_bitset, pack
+from recipes.models import Ingredient, Recipe, RecipeChange, RecipeIngredient
+
+User = get_user_model()
+
+
+class PackTest(TestCase):
+    '''Списки рецептов ингредиента: маска и массив.
+    '''
+    def test_sparse_ids_are_array(self):
+        posting = pack({3, 70000}, 70000)
+        self.assertIsInstance(posting, array)
+        self.assertEqual(list(from_bitset(as_bitset(posting))), [3, 70000])
+
+    def test_dense_ids_are_bitset(self):
+        posting = pack(set(range(1, 100)), 100)
+        self.assertIsInstance(posting, int)
+        self.assertEqual(list(from_bitset(posting)), list(range(1, 100)))
+
+
+class PantryIndexTest(TestCase):
+    '''Обновление индекса по журналу изменений рецептов.
+    '''
+    def setUp(self):
+        PantryIndex.current = None
+        self.addCleanup(setattr, PantryIndex, 'current', None)
+        author = User.objects.create_user('author', 'author@example.com',
+                                          'password')
+        self.salt, self.sugar, self.beet = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('соль', 'сахар', 'свекла'))
+        self.soup, self.cake = (
+            Recipe.objects.create(author=author, name=name, text='Сварить.',
+                                  cooking_time=10, image='x.jpg')
+            for name in ('Суп', 'Торт'))
+        self.add(self.soup, self.salt)
+        self.add(self.soup, self.beet)
+        self.add(self.cake, self.sugar)
+
+    def add(self, recipe, ingredient):
+        RecipeIngredient.objects.create(recipe=recipe, ingredient=ingredient,
+                                        amount=1)
+
+    def search(self, *ingredients, **kwargs):
+        return PantryIndex.get().search(
+            [ingredient.pk for ingredient in ingredients], **kwargs)
+
+    def test_search(self):
+        self.assertEqual(self.search(self.salt, self.sugar),
+                         [self.cake.pk, self.soup.pk])
+        self.assertEqual(self.search(self.salt, self.beet, match='all'),
+                         [self.soup.pk])
+
+    def test_changes_are_read_from_journal(self):
+        index = PantryIndex.get()
+        self.add(self.cake, self.salt)
+        self.assertIsNot(PantryIndex.get(), index)
+        self.assertEqual(self.search(self.salt), [self.cake.pk, self.soup.pk])
+        self.soup.delete()
+        self.assertEqual(self.search(self.salt, self.beet), [self.cake.pk])
+
+    def test_late_entry_is_read(self):
+        PantryIndex.get()
+        position = RecipeChange.objects.position()
+        RecipeChange.objects.create(id=position + 2, recipe_id=self.soup.pk)
+        self.assertEqual(set(PantryIndex.get().gaps), {position + 1})
+        RecipeIngredient.objects.filter(recipe=self.cake).delete()
+        RecipeChange.objects.filter(id__gt=position + 2).delete()
+        RecipeChange.objects.create(id=position + 1, recipe_id=self.cake.pk)
+        index = PantryIndex.get()
+        self.assertEqual(index.gaps, {})
+        self.assertEqual(self.search(self.sugar), [])
@@ -0,0 +1,74 @@
+import io
+import os
+import struct
+import unittest
+
+from django.conf import settings
+from django.test import SimpleTestCase
+from pypdf import PdfReader
+
+from api.pdf import ENCODING, PdfWriter, load_font
+from api.renderers import ShoppingCartPdfRenderer
+
+CYRILLIC = 'АБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ'
+CYRILLIC += CYRILLIC.lower()
+
+
+def glyph_ids(font_file):
+    '''Номера глифов для кодов 0..255 из таблицы cmap формата 6.
+    '''
+    num_tables = struct.unpack('>H', font_file[4:6])[0]
+    for index in range(num_tables):
+        tag, _, offset, _ = struct.unpack(
+            '>4sIII', font_file[12 + 16 * index:28 + 16 * index])
+        if tag == b'cmap':
+            break
+    subtable = offset + struct.unpack(
+        '>I', font_file[offset + 8:offset + 12])[0]
+    first, count = struct.unpack('>2H', font_file[subtable + 6:subtable + 10])
+    ids = struct.unpack(f'>{count}H',
+                        font_file[subtable + 10:subtable + 10 + 2 * count])
+    return dict(zip(range(first, first + count), ids))
+
+
+@unittest.skipUnless(os.path.exists(settings.SHOPPING_CART_PDF_FONT),
+                     'Нет шрифта SHOPPING_CART_PDF_FONT.')
+class PdfWriterTest(SimpleTestCase):
+    '''Документ читается PDF-библиотекой, текст извлекается обратно,
+    в шрифте есть глифы всех букв кириллицы.
+    '''
+    def read(self, lines):
+        writer = PdfWriter(load_font(settings.SHOPPING_CART_PDF_FONT))
+        return PdfReader(io.BytesIO(b''.join(writer.stream(lines))))
+
+    def test_round_trip(self):
+        lines = [f'{CYRILLIC} {number}' for number in range(100)]
+        reader = self.read(lines)
+        writer = PdfWriter(load_font(settings.SHOPPING_CART_PDF_FONT))
+        self.assertEqual(len(reader.pages),
+                         -(-len(lines) // writer.lines_per_page))
+        text = ''.join(page.extract_text() for page in reader.pages)
+        for line in lines:
+            self.assertIn(line, text)
+
+    def test_empty_document(self):
+        reader = self.read(())
+        self.assertEqual(len(reader.pages), 1)
+
+    def test_cyrillic_glyphs(self):
+        font = self.read(('Щи',)).pages[0]['/Resources']['/Font']['/F1']
+        font_file = font['/FontDescriptor']['/FontFile2'].get_data()
+        glyphs = glyph_ids(font_file)
+        widths = font['/Widths']
+        for char in CYRILLIC:
+            code = char.encode(ENCODING)[0]
+            with self.subTest(char=char):
+                self.assertNotEqual(glyphs[code], 0)
+                self.assertGreater(widths[code], 0)
+
+    def test_renderer(self):
+        rows = [('Свёкла', 300, 'г'), ('Соль', 5, 'г')]
+        data = b''.join(ShoppingCartPdfRenderer().stream(rows))
+        text = PdfReader(io.BytesIO(data)).pages[0].extract_text()
+        self.assertIn('Список покупок:', text)
+        self.assertIn('Свёкла - 300 г', text)
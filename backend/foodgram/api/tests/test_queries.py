@@ -0,0 +1,73 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            Shoppingcart, Tag, TagInRecipe)
+from recipes.versions import clear_versions
+from users.models import Subscription
+
+User = get_user_model()
+
+ROWS = 5
+
+
+class ListQueriesTest(APITestCase):
+    '''Количество запросов списков рецептов и подписок не зависит
+    от количества строк.
+    '''
+    def setUp(self):
+        clear_versions()
+        self.user = User.objects.create_user('user', 'user@example.com',
+                                             'password')
+        self.client.force_authenticate(self.user)
+        self.tags = [
+            Tag.objects.create(name=f'Тэг {number}', color=f'#00000{number}',
+                               slug=f'tag{number}')
+            for number in range(2)]
+        self.ingredients = [
+            Ingredient.objects.create(name=f'ингредиент {number}',
+                                      measurement_unit='г')
+            for number in range(2)]
+
+    def create_recipes(self, count):
+        for number in range(Recipe.objects.count(),
+                            Recipe.objects.count() + count):
+            author = User.objects.create_user(
+                f'author{number}', f'author{number}@example.com', 'password')
+            Subscription.objects.create(user=self.user, author=author)
+            for copy in range(2):
+                recipe = Recipe.objects.create(
+                    author=author, name=f'Рецепт {number}.{copy}',
+                    text='Сварить.', cooking_time=10,
+                    image='recipes/images/soup.png')
+                TagInRecipe.objects.bulk_create([
+                    TagInRecipe(recipe=recipe, tag=tag) for tag in self.tags])
+                RecipeIngredient.objects.bulk_create([
+                    RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                     amount=5)
+                    for ingredient in self.ingredients])
+                Favorite.objects.create(user=self.user, recipe=recipe)
+                Shoppingcart.objects.create(user=self.user, recipe=recipe)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(queries)
+
+    def test_queries_do_not_depend_on_rows(self):
+        for url, model in (
+                ('/api/recipes/?limit=100', Recipe),
+                ('/api/recipes/?limit=100&cursor=', Recipe),
+                ('/api/users/subscriptions/?limit=100', Subscription),
+                ('/api/users/subscriptions/?limit=100&recipes_limit=1',
+                 Subscription)):
+            with self.subTest(url=url):
+                self.create_recipes(ROWS)
+                expected = self.count_queries(url)
+                self.create_recipes(ROWS)
+                with self.assertNumQueries(expected):
+                    response = self.client.get(url)
+                self.assertEqual(len(response.json()['results']),
+                                 model.objects.count())
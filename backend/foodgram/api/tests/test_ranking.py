@@ -0,0 +1,63 @@
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+
+from api.filters import RecipeFilter
+from recipes.models import (Favorite, Recipe, RecipeRanking,
+                            ensure_recipe_rankings)
+from recipes.ranking import rank_recipes
+
+User = get_user_model()
+
+
+class RankingOrderTest(APITestCase):
+    '''Выдача по рейтингу идет по строкам RecipeRanking.
+    '''
+    def setUp(self):
+        self.author = User.objects.create_user(
+            'author', 'author@example.com', 'password')
+        self.recipes = [
+            Recipe.objects.create(
+                author=self.author, name=f'Рецепт {number}', text='Сварить.',
+                cooking_time=10, image='recipes/images/soup.png')
+            for number in range(3)]
+
+    def get_ids(self, query):
+        response = self.client.get(f'/api/recipes/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.json()['results']]
+
+    def test_every_recipe_has_ranking(self):
+        ranking = RecipeRanking.objects.get(recipe=self.recipes[0])
+        self.assertEqual(ranking.pub_date, self.recipes[0].pub_date)
+        self.assertEqual(ranking.trending, 0)
+
+    def test_missing_rankings_are_created(self):
+        RecipeRanking.objects.all().delete()
+        ensure_recipe_rankings()
+        self.assertEqual(RecipeRanking.objects.count(), len(self.recipes))
+
+    def test_order(self):
+        first, second, third = self.recipes
+        Favorite.objects.create(user=self.author, recipe=first)
+        rank_recipes()
+        self.assertEqual(self.get_ids('ordering=trending'),
+                         [first.pk, third.pk, second.pk])
+        Favorite.objects.filter(recipe=first).delete()
+        rank_recipes()
+        self.assertEqual(self.get_ids('ordering=top'),
+                         [third.pk, second.pk, first.pk])
+
+    def test_order_uses_ranking_columns(self):
+        queryset = RecipeFilter({'ordering': 'trending'},
+                                queryset=Recipe.objects.all()).qs
+        sql = str(queryset.query)
+        self.assertIn('INNER JOIN "recipes_reciperanking"', sql)
+        self.assertIn(
+            'ORDER BY "recipes_reciperanking"."trending" DESC, '
+            '"recipes_reciperanking"."pub_date" DESC, '
+            '"recipes_recipe"."id" DESC', sql)
+
+    def test_cursor_is_rejected(self):
+        response = self.client.get('/api/recipes/?ordering=trending&cursor=')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cursor', response.json())
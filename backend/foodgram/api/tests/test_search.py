@@ -0,0 +1,33 @@
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+
+from recipes.models import Recipe
+
+User = get_user_model()
+
+
+class SearchPaginationTest(APITestCase):
+    '''Результаты поиска идут по релевантности и листаются по page.
+    '''
+    def setUp(self):
+        author = User.objects.create_user('author', 'author@example.com',
+                                          'password')
+        self.recipes = [
+            Recipe.objects.create(
+                author=author, name=name, text='Сварить.', cooking_time=10,
+                image='recipes/images/soup.png')
+            for name in ('Борщ', 'Суп', 'Борщ зеленый')]
+
+    def test_search(self):
+        response = self.client.get('/api/recipes/?search=борщ&page=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertCountEqual(
+            [item['id'] for item in response.json()['results']],
+            [self.recipes[0].pk, self.recipes[2].pk])
+
+    def test_cursor_is_rejected(self):
+        self.assertEqual(self.client.get('/api/recipes/?cursor=').status_code,
+                         200)
+        response = self.client.get('/api/recipes/?search=борщ&cursor=')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cursor', response.json())
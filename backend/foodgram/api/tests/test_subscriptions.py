@@ -0,0 +1,49 @@
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+
+from recipes.models import Recipe
+from users.models import Subscription
+
+User = get_user_model()
+
+
+class RecipesLimitTest(APITestCase):
+    '''Параметр recipes_limit подписок: число не меньше 0.
+    '''
+    def setUp(self):
+        self.user = User.objects.create_user('user', 'user@example.com',
+                                             'password')
+        self.client.force_authenticate(self.user)
+        self.author = User.objects.create_user(
+            'author', 'author@example.com', 'password')
+        for number in range(3):
+            Recipe.objects.create(
+                author=self.author, name=f'Рецепт {number}', text='Сварить.',
+                cooking_time=10, image='recipes/images/soup.png')
+
+    def test_limit(self):
+        Subscription.objects.create(user=self.user, author=self.author)
+        response = self.client.get(
+            '/api/users/subscriptions/?recipes_limit=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results'][0]['recipes']), 2)
+
+    def test_invalid_limit(self):
+        Subscription.objects.create(user=self.user, author=self.author)
+        for limit in ('abc', '-1'):
+            with self.subTest(limit=limit):
+                response = self.client.get(
+                    f'/api/users/subscriptions/?recipes_limit={limit}')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('recipes_limit', response.json())
+
+    def test_invalid_limit_on_subscribe(self):
+        response = self.client.post(
+            f'/api/users/{self.author.pk}/subscribe/?recipes_limit=abc')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('recipes_limit', response.json())
+        self.assertFalse(Subscription.objects.exists())
+        response = self.client.post(
+            f'/api/users/{self.author.pk}/subscribe/?recipes_limit=1')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['recipes']), 1)
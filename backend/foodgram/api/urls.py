@@ -1,6 +1,7 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from .metrics import MetricsView
 from .views import (CastomDjUserViewSet, IngredientViewSet, RecipeViewSet,
                     TagViewSet)
 
@@ -17,5 +18,6 @@ router.register('ingredients', IngredientViewSet)
 
 urlpatterns = [
     path('auth/', include('djoser.urls.authtoken')),
+    path('metrics', MetricsView.as_view(), name='metrics'),
     path('', include(router.urls)),
 ]
@@ -1,32 +1,77 @@
+from hashlib import md5
+
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Value, Window
+from django.db.models.functions import RowNumber
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
-from rest_framework import filters, status, viewsets
+from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from users.models import Subscription
 
-from foodgram.settings import FILE_NAME
-from recipes.models import (AmountOfIngredient, Favorite, Ingredient,
-                            IngredientInRecipe, Recipe, Shoppingcart, Tag)
+from foodgram.settings import (CHUNK_SIZE, FILE_NAME, INGREDIENT_SEARCH_LIMIT,
+                               PANTRY_MAX_RESULTS, SIMILAR_LIMIT)
+from recipes.models import (Favorite, Ingredient, Recipe, Shoppingcart,
+                            ShoppingList, Tag, TimelineEntry)
+from recipes.similarity import similar_recipes
 
 from .filters import RecipeFilter
+from .fragments import KEY_FIELDS, RecipeFragmentCache, with_related
+from .importer import RecipeImporter
+from .ingredient_index import IngredientIndex
+from .loaders import VersionLoader
+from .mixins import VersionedCacheMixin
+from .pantry_index import PantryIndex
 from .pagination import CustomPaginator
+from .parsers import JSONLinesParser
 from .permissions import IsAutherOrReadOnly
+from .renderers import (ShoppingCartCsvRenderer, ShoppingCartPdfRenderer,
+                        ShoppingCartTxtRenderer)
 from .serializers import (CreateRecipeSerializer, IngredientSerializer,
-                          RecipeMinifiedSerializer, RecipeSerializer,
-                          TagSerializer, UserWithRecipesSerializer)
+                          PantrySearchSerializer, RecipeMinifiedSerializer,
+                          RecipeSerializer, TagSerializer,
+                          UserWithRecipesSerializer, get_recipes_limit)
 
 User = get_user_model()
 
 
+def attach_limited_recipes(authors, limit=None):
+    '''Рецепты авторов страницы одним запросом.
+    limit - Количество рецептов каждого автора (ROW_NUMBER по автору).
+    Рецепты сохраняются в атрибут limited_recipes каждого автора.
+    '''
+    recipes = Recipe.objects.filter(author__in=[obj.id for obj in authors])
+    if limit is not None:
+        recipes = recipes.annotate(row_number=Window(
+            expression=RowNumber(),
+            partition_by=[F('author')],
+            order_by=F('pub_date').desc()))
+        sql, params = recipes.query.sql_with_params()
+        recipes = Recipe.objects.raw(
+            f'SELECT * FROM ({sql}) AS ranked '
+            'WHERE "row_number" <= %s ORDER BY "row_number"',
+            (*params, limit))
+    recipes_by_author = {obj.id: [] for obj in authors}
+    for recipe in recipes:
+        recipes_by_author[recipe.author_id].append(recipe)
+    for obj in authors:
+        obj.limited_recipes = recipes_by_author[obj.id]
+    return authors
+
+
 class CastomDjUserViewSet(UserViewSet):
     '''Кастомный djoser UserViewSet.
     '''
+    cursor_ordering = ('id',)
 
     @action(["get"], detail=False, permission_classes=[IsAuthenticated])
     def me(self, request, *args, **kwargs):
@@ -39,10 +84,14 @@ class CastomDjUserViewSet(UserViewSet):
     def subscriptions(self, request, *args, **kwargs):
         '''Мои подписки.
         '''
-        follow = Subscription.objects.values_list(
-            'author', flat=True).filter(user=request.user)
-        follow_list = User.objects.filter(id__in=follow)
+        follow_list = (
+            User.objects.filter(sub_author__user=request.user)
+            .annotate(is_subscribed=Value(True))
+            .order_by('id')
+        )
+        limit = get_recipes_limit(request)
         page = self.paginate_queryset(follow_list)
+        attach_limited_recipes(page, limit)
         serializer = UserWithRecipesSerializer(page, many=True,
                                                context={'request': request}
                                                )
@@ -59,18 +108,22 @@ class CastomDjUserViewSet(UserViewSet):
                                                user=user_obj.id,
                                                )
         if request.method == 'POST':
+            # recipes_limit проверяется до создания подписки
+            get_recipes_limit(request)
             if sub_post.exists():
                 mess = {"errors": "Пользователь уже подписан на автора!"}
                 return Response(mess, status=status.HTTP_400_BAD_REQUEST)
-            Subscription.objects.create(author=author_obj,
-                                        user=user_obj,
-                                        )
+            with transaction.atomic():
+                Subscription.objects.create(author=author_obj,
+                                            user=user_obj,
+                                            )
             serializer = UserWithRecipesSerializer(author_obj,
                                                    context={'request': request}
                                                    )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         if sub_post.exists():
-            sub_post.delete()
+            with transaction.atomic():
+                sub_post.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
         mess = {"errors": "Пользователь не был подписан на автора!"}
         return Response(mess, status=status.HTTP_400_BAD_REQUEST)
@@ -104,20 +157,33 @@ class CastomDjUserViewSet(UserViewSet):
         return Response(status=status.HTTP_404_NOT_FOUND)
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(VersionedCacheMixin, viewsets.ReadOnlyModelViewSet):
+    version_models = (Tag,)
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(VersionedCacheMixin, viewsets.ReadOnlyModelViewSet):
+    version_models = (Ingredient,)
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
-    filter_backends = (filters.SearchFilter,)
-    search_fields = ('^name',)
+
+    def list(self, request, *args, **kwargs):
+        '''Поиск ингредиентов по началу названия без запросов к БД.
+        name  - Начало названия ингредиента;
+        limit - Количество ингредиентов в выдаче.
+        '''
+        name = request.query_params.get(api_settings.SEARCH_PARAM, '')
+        limit = INGREDIENT_SEARCH_LIMIT if name else None
+        if request.query_params.get('limit', '').isdigit():
+            limit = min(int(request.query_params['limit']),
+                        INGREDIENT_SEARCH_LIMIT)
+        version = VersionLoader.for_request(request).get(Ingredient)[0]
+        return Response(IngredientIndex.get(version).search(name, limit))
 
 
 class RecipeViewSet(viewsets.ModelViewSet):
@@ -126,7 +192,184 @@ class RecipeViewSet(viewsets.ModelViewSet):
     permission_classes = (IsAutherOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    cursor_ordering = ('-pub_date', '-id')
     http_method_names = ['get', 'options', 'post', 'head', 'delete', 'patch']
+    # Действия, которые отдают представления рецептов из кэша
+    fragment_actions = ('list', 'retrieve', 'feed', 'similar', 'cook')
+
+    def get_user_flags(self):
+        '''Флаги текущего пользователя для аннотации рецептов.
+        '''
+        user = self.request.user
+        if not user.is_authenticated:
+            return {'is_favorited': Value(False),
+                    'is_in_shopping_cart': Value(False)}
+        return {
+            'is_favorited': Exists(Favorite.objects.filter(
+                recipe=OuterRef('pk'), user=user)),
+            'is_in_shopping_cart': Exists(Shoppingcart.objects.filter(
+                recipe=OuterRef('pk'), user=user)),
+        }
+
+    def get_queryset(self):
+        '''Рецепты с флагами текущего пользователя и связанными объектами.
+        Количество запросов к БД не зависит от размера страницы. Для
+        списка и просмотра связанные объекты не загружаются: представления
+        рецептов берутся из кэша.
+        '''
+        queryset = super().get_queryset().annotate(**self.get_user_flags())
+        if self.action in self.fragment_actions:
+            return queryset.only(*KEY_FIELDS)
+        return with_related(queryset)
+
+    def get_validators(self):
+        '''ETag и Last-Modified рецепта одним запросом к БД.
+        ETag учитывает дату изменения рецепта (она же меняется при правке
+        профиля автора, см. touch_author_recipes), флаги текущего
+        пользователя и версии таблиц тэгов и ингредиентов. Last-Modified
+        отдается только анонимам: флаги пользователя в нем не отражены.
+        '''
+        user = self.request.user
+        flags = self.get_user_flags()
+        flags['is_subscribed'] = Exists(Subscription.objects.filter(
+            author=OuterRef('author'), user=user.id))
+        try:
+            row = (Recipe.objects.filter(pk=self.kwargs['pk'])
+                   .annotate(**flags)
+                   .values_list('updated_at', *flags).first())
+        except ValueError:
+            row = None
+        if row is None:
+            return None, None
+        versions = VersionLoader.for_request(self.request).get(
+            Tag, Ingredient)
+        key = '{}|{}|{}|{}'.format(
+            row, versions, user.id,
+            self.request.META.get('HTTP_ACCEPT', ''))
+        etag = '"{}"'.format(md5(key.encode()).hexdigest())
+        return etag, None if user.is_authenticated else row[0]
+
+    def represent_page(self, queryset):
+        '''Страница рецептов: представления из кэша одним get_many.
+        '''
+        page = self.paginate_queryset(queryset)
+        fragments = RecipeFragmentCache(self.request,
+                                        self.get_serializer_context())
+        if page is None:
+            return Response(fragments.represent(queryset))
+        return self.get_paginated_response(fragments.represent(page))
+
+    def list(self, request, *args, **kwargs):
+        return self.represent_page(self.filter_queryset(self.get_queryset()))
+
+    @action(["get"], detail=False, permission_classes=[IsAuthenticated])
+    def feed(self, request, *args, **kwargs):
+        '''Лента: рецепты авторов, на которых подписан пользователь,
+        от новых к старым. Фильтры - как у списка рецептов. Страница
+        выбирается по записям ленты (TimelineEntry), ее рецепты читаются
+        одним запросом.
+        '''
+        recipes = self.filter_queryset(self.get_queryset())
+        entries = TimelineEntry.objects.page_source(request.user, recipes)
+        self.cursor_ordering = ('-pub_date', '-recipe_id')
+        page = self.paginate_queryset(entries)
+        rows = list(entries) if page is None else page
+        found = recipes.in_bulk([entry.recipe_id for entry in rows])
+        data = RecipeFragmentCache(
+            request, self.get_serializer_context()
+        ).represent(found[entry.recipe_id] for entry in rows
+                    if entry.recipe_id in found)
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
+
+    @action(["get"], detail=True)
+    def similar(self, request, *args, **kwargs):
+        '''Похожие рецепты (по ингредиентам), от более похожих.
+        limit - Количество рецептов (не больше SIMILAR_LIMIT).
+        '''
+        recipe = self.get_object()
+        limit = SIMILAR_LIMIT
+        if request.query_params.get('limit', '').isdigit():
+            limit = min(int(request.query_params['limit']), SIMILAR_LIMIT)
+        ids = [pk for pk, _ in similar_recipes(recipe.pk, limit)]
+        recipes = self.get_queryset().in_bulk(ids)
+        return Response(RecipeFragmentCache(
+            request, self.get_serializer_context()
+        ).represent(recipes[pk] for pk in ids if pk in recipes))
+
+    @action(["get"], detail=False)
+    def cook(self, request, *args, **kwargs):
+        '''Что приготовить: рецепты по убыванию доли их ингредиентов,
+        которые есть у пользователя (обратный индекс в памяти).
+        ingredients  - id имеющихся ингредиентов (через запятую);
+        match        - any (хотя бы один ингредиент) или all (все);
+        min_coverage - наименьшая доля имеющихся ингредиентов рецепта.
+        Фильтры - как у списка рецептов.
+        '''
+        params = PantrySearchSerializer(data={
+            'ingredients': [
+                value for values in request.query_params.getlist(
+                    'ingredients') for value in values.split(',') if value],
+            **{name: request.query_params[name]
+               for name in ('match', 'min_coverage')
+               if name in request.query_params},
+        })
+        params.is_valid(raise_exception=True)
+        ids = PantryIndex.get().search(limit=PANTRY_MAX_RESULTS,
+                                       **params.validated_data)
+        allowed = set(self.filter_queryset(self.get_queryset())
+                      .filter(pk__in=ids).values_list('id', flat=True))
+        ids = [pk for pk in ids if pk in allowed]
+        page = self.paginate_queryset(ids)
+        if page is not None:
+            ids = page
+        recipes = self.get_queryset().in_bulk(ids)
+        data = RecipeFragmentCache(
+            request, self.get_serializer_context()
+        ).represent(recipes[pk] for pk in ids if pk in recipes)
+        if page is None:
+            return Response(data)
+        return self.get_paginated_response(data)
+
+    def represent_object(self):
+        data = RecipeFragmentCache(
+            self.request, self.get_serializer_context()
+        ).represent([self.get_object()])
+        if not data:
+            raise Http404
+        return Response(data[0])
+
+    def retrieve(self, request, *args, **kwargs):
+        '''Рецепт с поддержкой условных запросов.
+        '''
+        etag, last_modified = self.get_validators()
+        if etag is None:
+            return self.represent_object()
+        if last_modified:
+            last_modified = int(last_modified.timestamp())
+        response = get_conditional_response(request, etag=etag,
+                                            last_modified=last_modified)
+        if response is None:
+            response = self.represent_object()
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified)
+            visibility = ('private' if request.user.is_authenticated
+                          else 'public')
+            patch_cache_control(response, must_revalidate=True, max_age=0,
+                                **{visibility: True})
+            patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def get_serializer_context(self):
+        '''В списках рецептов - картинки размера карточки.
+        '''
+        context = super().get_serializer_context()
+        if self.action in self.fragment_actions and self.action != 'retrieve':
+            context['image_rendition'] = 'card'
+        return context
 
     def get_serializer_class(self):
         if self.request.method == "POST":
@@ -137,36 +380,46 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
-        super().perform_create(serializer)
 
     def perform_update(self, serializer):
         serializer.save(author=self.request.user)
-        super().perform_update(serializer)
 
     @action(["get"], detail=False,
-            permission_classes=[IsAuthenticated]
+            permission_classes=[IsAuthenticated],
+            renderer_classes=[ShoppingCartTxtRenderer,
+                              ShoppingCartCsvRenderer,
+                              ShoppingCartPdfRenderer]
             )
     def download_shopping_cart(self, request, *args, **kwargs):
-        '''Скачать файл со списком покупок.'''
-        ingredients_list = (
-            IngredientInRecipe.objects
-            .filter(recipe__shop_recipe__user=request.user)
-            .values_list('ingredient', flat=True)
-        )
+        '''Скачать файл со списком покупок.
+        format - Формат файла: txt (по умолчанию), csv или pdf.
+        '''
         ingredients = (
-            AmountOfIngredient.objects.filter(id__in=ingredients_list)
-            .values('ingredient')
-            .annotate(total_amount=Sum('amount'))
+            ShoppingList.objects.filter(user=request.user)
+            .order_by('ingredient__name')
             .values_list('ingredient__name', 'total_amount',
                          'ingredient__measurement_unit')
         )
-        file_list = ['Список покупок: ']
-        [file_list.append(
-            '{} - {} {}. '.format(*ingredient)) for ingredient in ingredients]
-        response = HttpResponse(file_list, content_type='text/plain')
-        response['Content-Disposition'] = f'attachment; filename={FILE_NAME}'
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(ingredients.iterator(chunk_size=CHUNK_SIZE)),
+            content_type=renderer.media_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename={FILE_NAME}.{renderer.format}')
         return response
 
+    @action(["post"], detail=False, url_path='import',
+            permission_classes=[IsAuthenticated],
+            parser_classes=[JSONLinesParser]
+            )
+    def import_recipes(self, request, *args, **kwargs):
+        '''Пакетная загрузка рецептов в формате JSON Lines
+        (по одному рецепту в строке, поля как при создании рецепта).
+        '''
+        report = RecipeImporter(
+            request.user, context={'request': request}).run(request.data)
+        return Response(report, status=status.HTTP_200_OK)
+
     @action(["post", "delete"], detail=True,
             permission_classes=[IsAuthenticated]
             )
@@ -177,15 +430,19 @@ class RecipeViewSet(viewsets.ModelViewSet):
         sub_post = Shoppingcart.objects.filter(
             recipe=recipe_obj, user=user_obj)
         if request.method == 'POST':
+            # recipes_limit проверяется до создания подписки
+            get_recipes_limit(request)
             if sub_post.exists():
                 mess = {"errors": "Рецепт уже был добавлен в список покупок!"}
                 return Response(mess, status=status.HTTP_400_BAD_REQUEST)
-            Shoppingcart.objects.create(
-                recipe=recipe_obj, user=user_obj)
+            with transaction.atomic():
+                Shoppingcart.objects.create(
+                    recipe=recipe_obj, user=user_obj)
             serializer = RecipeMinifiedSerializer(recipe_obj)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         if sub_post.exists():
-            sub_post.delete()
+            with transaction.atomic():
+                sub_post.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
         mess = {"errors": "Рецепт еще не был добавлен в список покупок!"}
         return Response(mess, status=status.HTTP_400_BAD_REQUEST)
@@ -201,16 +458,20 @@ class RecipeViewSet(viewsets.ModelViewSet):
                                            user=user_obj,
                                            )
         if request.method == 'POST':
+            # recipes_limit проверяется до создания подписки
+            get_recipes_limit(request)
             if sub_post.exists():
                 mess = {"errors": "Рецепт уже был добавлен в избранное!"}
                 return Response(mess, status=status.HTTP_400_BAD_REQUEST)
-            Favorite.objects.create(recipe=recipe_obj,
-                                    user=user_obj,
-                                    )
+            with transaction.atomic():
+                Favorite.objects.create(recipe=recipe_obj,
+                                        user=user_obj,
+                                        )
             serializer = RecipeMinifiedSerializer(recipe_obj)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         if sub_post.exists():
-            sub_post.delete()
+            with transaction.atomic():
+                sub_post.delete()
             return Response(status=status.HTTP_204_NO_CONTENT)
         mess = {"errors": "Рецепт еще не был добавлен в избранное!"}
         return Response(mess, status=status.HTTP_400_BAD_REQUEST)
@@ -36,6 +36,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'django_filters',
     'rest_framework.authtoken',
@@ -44,10 +45,12 @@ INSTALLED_APPS = [
     'api.apps.ApiConfig',
     'recipes.apps.RecipesConfig',
     'users.apps.UsersConfig',
+    'jobs.apps.JobsConfig',
 
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -94,6 +97,57 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# Кэш общий для всех процессов gunicorn. В нем только данные, которые
+# можно собрать заново: версии таблиц и журнал изменений хранятся в БД,
+# поэтому вытеснение записей безопасно. Размер задается явно: по умолчанию
+# FileBasedCache держит 300 записей и при переполнении удаляет треть.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='/tmp/foodgram_cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', default=10000)),
+            'CULL_FREQUENCY': 10,
+        },
+    },
+    # Представления рецептов (api.fragments): отдельный кэш, чтобы
+    # они не вытесняли остальные записи
+    'fragments': {
+        'BACKEND': os.getenv(
+            'FRAGMENT_CACHE_BACKEND',
+            default='django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('FRAGMENT_CACHE_LOCATION',
+                              default='/tmp/foodgram_fragments'),
+        'TIMEOUT': 60 * 60 * 24,
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('FRAGMENT_CACHE_MAX_ENTRIES',
+                                         default=50000)),
+            'CULL_FREQUENCY': 10,
+        },
+    },
+}
+
+# Срок (в секундах), в течение которого клиент может не перепроверять
+# ответы с ETag по версии таблиц
+VERSIONED_CACHE_MAX_AGE = 0
+
+# Сколько секунд процесс использует прочитанные из БД версии таблиц, не
+# перечитывая их (столько же другие процессы не видят изменений тэгов
+# и ингредиентов)
+TABLE_VERSION_TIMEOUT = 2
+
+# Журнал изменений рецептов (RecipeChange): сколько записей можно догнать
+# без полной перестройки индекса, сколько секунд хранится запись и сколько
+# секунд ждать запись с пропущенным номером (транзакция еще не завершена)
+CHANGE_JOURNAL_SIZE = 1000
+CHANGE_JOURNAL_RETENTION = 60 * 60 * 24
+CHANGE_JOURNAL_GAP_TIMEOUT = 60
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -180,5 +234,80 @@ DJOSER = {
         },
 }
 
-# Название скачиваемого файла корзины
-FILE_NAME = 'shopping_cart.txt'
+# Название скачиваемого файла корзины (расширение задает формат файла)
+FILE_NAME = 'shopping_cart'
+
+# Количество строк, читаемых из курсора БД за один раз
+CHUNK_SIZE = 2000
+
+# TrueType-шрифт с кириллицей для списка покупок в формате PDF
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+
+# Максимальное количество ингредиентов в выдаче поиска по названию
+INGREDIENT_SEARCH_LIMIT = 100
+
+# Начиная с этого количества строк админка показывает оценку размера
+# таблицы из статистики PostgreSQL вместо COUNT(*)
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 100000
+
+# Количество рецептов в одной транзакции пакетной загрузки
+IMPORT_CHUNK_SIZE = 500
+
+# Лента подписок: рецепты авторов, у которых подписчиков больше
+# FEED_FANOUT_LIMIT, не рассылаются в ленты, а добавляются при чтении;
+# при подписке в ленту добавляются FEED_BACKFILL_SIZE последних рецептов
+# автора; рассылка идет пачками по FEED_FANOUT_BATCH_SIZE записей; при
+# чтении добавляются рецепты новее последней записи автора в ленте с
+# запасом FEED_MERGE_WINDOW секунд (на еще не выполненные рассылки)
+FEED_FANOUT_LIMIT = 10000
+FEED_BACKFILL_SIZE = 100
+FEED_FANOUT_BATCH_SIZE = 1000
+FEED_MERGE_WINDOW = 60
+
+# Рейтинг рецептов: добавления в избранное и в списки покупок за последние
+# RANKING_WINDOW_DAYS дней с весами RANKING_WEIGHTS; вес добавления убывает
+# вдвое за RANKING_HALF_LIFE_HOURS часов
+RANKING_WINDOW_DAYS = 7
+RANKING_HALF_LIFE_HOURS = 24
+RANKING_WEIGHTS = {
+    'favorite': 1.0,
+    'shopping_cart': 2.0,
+}
+
+# Похожие рецепты: подпись MinHash из SIMILAR_NUM_PERM хэшей делится на
+# SIMILAR_BANDS полос LSH; точный коэффициент Жаккара считается не больше
+# чем для SIMILAR_CANDIDATES кандидатов, в выдаче до SIMILAR_LIMIT рецептов
+SIMILAR_NUM_PERM = 64
+SIMILAR_BANDS = 16
+SIMILAR_CANDIDATES = 200
+SIMILAR_LIMIT = 10
+
+# Поиск рецептов по имеющимся ингредиентам: не больше PANTRY_MAX_RESULTS
+# рецептов с наибольшей долей имеющихся ингредиентов
+PANTRY_MAX_RESULTS = 1000
+
+# Ограничения загружаемых картинок: размер файла (байт) и количество пикселей
+IMAGE_MAX_SIZE = 10 * 1024 * 1024
+IMAGE_MAX_PIXELS = 40000000
+
+# Копии картинок рецептов (наибольшие ширина и высота) и их формат
+IMAGE_RENDITIONS = {
+    'thumbnail': (160, 160),
+    'card': (600, 600),
+    'full': (1600, 1600),
+}
+IMAGE_RENDITION_FORMAT = os.getenv('IMAGE_RENDITION_FORMAT', default='WEBP')
+IMAGE_RENDITION_QUALITY = 80
+
+# Фоновые задания: JOBS_EAGER=True - выполнять сразу, без run_worker
+JOBS_EAGER = os.getenv('JOBS_EAGER', default='False') == 'True'
+JOBS_MAX_ATTEMPTS = 5
+# Задержка перед повтором (секунды): удваивается с каждой попыткой
+JOBS_RETRY_DELAY = 10
+JOBS_RETRY_MAX_DELAY = 3600
+# Задание, выполняющееся дольше (секунды), возвращается в очередь
+JOBS_TIMEOUT = 600
+# Пауза обработчика при пустой очереди (секунды)
+JOBS_POLL_INTERVAL = 1
@@ -0,0 +1,24 @@
+'''Настройки gunicorn (файл читается из рабочего каталога при запуске).
+
+Процессы-воркеры пишут метрики API (api.metrics) в файлы каталога
+PROMETHEUS_MULTIPROC_DIR: каталог очищается при старте сервера, файлы
+завершившихся воркеров учитываются в счетчиках.
+'''
+import os
+import shutil
+import tempfile
+
+os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR',
+    os.path.join(tempfile.gettempdir(), 'foodgram-metrics'))
+
+
+def on_starting(server):
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,28 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        'id',
+        'name',
+        'status',
+        'priority',
+        'attempts',
+        'run_at',
+        'locked_by',
+    )
+    list_filter = ('status', 'name')
+    search_fields = ('^name',)
+    ordering = ('-id',)
+    actions = ('requeue',)
+    empty_value_display = '-пусто-'
+
+    @admin.action(description='Вернуть в очередь')
+    def requeue(self, request, queryset):
+        queryset.exclude(status=Job.RUNNING).update(
+            status=Job.QUEUED, attempts=0, locked_by='', locked_at=None)
+
+
+admin.site.register(Job, JobAdmin)
@@ -0,0 +1,51 @@
+import os
+import signal
+import socket
+import time
+
+from django.core.management.base import BaseCommand
+
+from foodgram.settings import JOBS_POLL_INTERVAL
+from jobs.queue import dequeue, requeue_stale, run_job
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задания из очереди'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Выполнить готовые задания и завершиться.')
+        parser.add_argument('--max-jobs', type=int, default=0,
+                            help='Завершиться после N заданий.')
+        parser.add_argument('--poll-interval', type=float,
+                            default=JOBS_POLL_INTERVAL)
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        worker = f'{socket.gethostname()}:{os.getpid()}'
+        done = failed = 0
+        requeue_stale()
+        while not self.stopping:
+            job = dequeue(worker)
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                requeue_stale()
+                continue
+            if run_job(job):
+                done += 1
+            else:
+                failed += 1
+                self.stderr.write(f'{job}: {job.last_error}')
+            if options['max_jobs'] and done + failed >= options['max_jobs']:
+                break
+        self.stdout.write(self.style.SUCCESS(
+            f'Выполнено заданий: {done}, с ошибкой: {failed}.'))
+
+    def stop(self, signum, frame):
+        '''Завершиться после текущего задания.
+        '''
+        self.stopping = True
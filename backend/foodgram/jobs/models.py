@@ -0,0 +1,92 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    '''Фоновое задание:
+    name         - Имя задачи (функции, зарегистрированной через @task);
+    args         - Позиционные аргументы задачи;
+    kwargs       - Именованные аргументы задачи;
+    priority     - Приоритет (задания с большим выполняются раньше);
+    status       - Состояние;
+    attempts     - Количество начатых попыток;
+    max_attempts - Наибольшее количество попыток;
+    run_at       - Время, раньше которого задание не выполняется;
+    locked_by    - Обработчик, выполняющий задание;
+    locked_at    - Время начала выполнения;
+    last_error   - Ошибка последней попытки;
+    created_at   - Дата создания.
+    '''
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField(
+        verbose_name='Задача',
+        max_length=200
+    )
+    args = models.JSONField(
+        verbose_name='Аргументы',
+        default=list
+    )
+    kwargs = models.JSONField(
+        verbose_name='Именованные аргументы',
+        default=dict
+    )
+    priority = models.IntegerField(
+        verbose_name='Приоритет',
+        default=0
+    )
+    status = models.CharField(
+        verbose_name='Состояние',
+        max_length=20,
+        choices=STATUSES,
+        default=QUEUED
+    )
+    attempts = models.PositiveIntegerField(
+        verbose_name='Попыток',
+        default=0
+    )
+    max_attempts = models.PositiveIntegerField(
+        verbose_name='Наибольшее количество попыток',
+        default=5
+    )
+    run_at = models.DateTimeField(
+        verbose_name='Выполнить не раньше',
+        default=timezone.now
+    )
+    locked_by = models.CharField(
+        verbose_name='Обработчик',
+        max_length=200,
+        blank=True
+    )
+    locked_at = models.DateTimeField(
+        verbose_name='Начало выполнения',
+        null=True,
+        blank=True
+    )
+    last_error = models.TextField(
+        verbose_name='Последняя ошибка',
+        blank=True
+    )
+    created_at = models.DateTimeField(
+        verbose_name='Дата создания',
+        auto_now_add=True
+    )
+
+    class Meta:
+        ordering = ['-priority', 'run_at', 'id']
+        verbose_name = 'Фоновое задание'
+        verbose_name_plural = 'Фоновые задания'
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_at', 'id'],
+                         name='job_dequeue_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
@@ -0,0 +1,144 @@
+'''Очередь фоновых заданий в базе данных.
+
+Задачи регистрируются декоратором @task в модулях tasks.py приложений
+и ставятся в очередь функцией enqueue или пачкой - enqueue_many (в той
+же транзакции, что и изменение данных). Задания выполняет команда run_worker.
+PostgreSQL: задание выбирается SELECT ... FOR UPDATE SKIP LOCKED,
+обработчики не ждут друг друга. Остальные СУБД: задание занимается
+условным UPDATE, при гонке берется следующее.
+'''
+import traceback
+from datetime import timedelta
+
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from foodgram.settings import (JOBS_EAGER, JOBS_MAX_ATTEMPTS, JOBS_RETRY_DELAY,
+                               JOBS_RETRY_MAX_DELAY, JOBS_TIMEOUT)
+
+from .models import Job
+
+TASKS = {}
+
+
+def task(name, priority=0, max_attempts=JOBS_MAX_ATTEMPTS):
+    '''Зарегистрировать функцию как задачу name.
+    '''
+    def decorator(func):
+        func.priority = priority
+        func.max_attempts = max_attempts
+        TASKS[name] = func
+        return func
+    return decorator
+
+
+def make_job(name, args, kwargs, priority, delay):
+    func = TASKS[name]
+    return Job(
+        name=name, args=list(args), kwargs=kwargs,
+        priority=func.priority if priority is None else priority,
+        max_attempts=func.max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay))
+
+
+def enqueue(name, *args, priority=None, delay=0, **kwargs):
+    '''Поставить задачу name в очередь. При JOBS_EAGER выполнить сразу.
+    '''
+    job = make_job(name, args, kwargs, priority, delay)
+    job.save()
+    if JOBS_EAGER:
+        job.status = Job.RUNNING
+        job.attempts = 1
+        run_job(job)
+    return job
+
+
+def enqueue_many(name, calls, priority=None, delay=0):
+    '''Поставить в очередь задачу name с каждым набором позиционных
+    аргументов из calls одним запросом. При JOBS_EAGER выполнить сразу.
+    '''
+    if JOBS_EAGER:
+        return [enqueue(name, *args, priority=priority, delay=delay)
+                for args in calls]
+    return Job.objects.bulk_create([
+        make_job(name, args, {}, priority, delay) for args in calls])
+
+
+def retry_delay(attempts):
+    '''Экспоненциальная задержка перед следующей попыткой (секунды).
+    '''
+    return min(JOBS_RETRY_DELAY * 2 ** (attempts - 1), JOBS_RETRY_MAX_DELAY)
+
+
+def ready_jobs():
+    return Job.objects.filter(
+        status=Job.QUEUED, run_at__lte=timezone.now()
+    ).order_by('-priority', 'run_at', 'id')
+
+
+def claim(job_id, worker):
+    return Job.objects.filter(pk=job_id, status=Job.QUEUED).update(
+        status=Job.RUNNING, locked_by=worker, locked_at=timezone.now(),
+        attempts=F('attempts') + 1)
+
+
+def dequeue(worker):
+    '''Занять следующее задание или вернуть None.
+    '''
+    connection = connections[Job.objects.db]
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = ready_jobs().select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            job.status = Job.RUNNING
+            job.locked_by = worker
+            job.locked_at = timezone.now()
+            job.attempts += 1
+            job.save(update_fields=('status', 'locked_by', 'locked_at',
+                                    'attempts'))
+            return job
+    for job_id in ready_jobs().values_list('id', flat=True)[:10]:
+        if claim(job_id, worker):
+            return Job.objects.get(pk=job_id)
+    return None
+
+
+def run_job(job):
+    '''Выполнить занятое задание: при успехе удалить его, при ошибке -
+    вернуть в очередь с задержкой или отметить как неудачное.
+    '''
+    func = TASKS.get(job.name)
+    try:
+        if func is None:
+            raise LookupError(f'Задача {job.name} не зарегистрирована.')
+        with transaction.atomic():
+            func(*job.args, **job.kwargs)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.status = Job.QUEUED
+            job.run_at = timezone.now() + timedelta(
+                seconds=retry_delay(job.attempts))
+        else:
+            job.status = Job.FAILED
+        job.locked_by = ''
+        job.locked_at = None
+        job.save()
+        return False
+    job.delete()
+    return True
+
+
+def requeue_stale():
+    '''Вернуть в очередь задания, обработчик которых не отвечает
+    дольше JOBS_TIMEOUT (например, был остановлен).
+    '''
+    stale = Job.objects.filter(
+        status=Job.RUNNING,
+        locked_at__lt=timezone.now() - timedelta(seconds=JOBS_TIMEOUT))
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, locked_by='', locked_at=None,
+        last_error='Превышено время выполнения.')
+    return stale.update(status=Job.QUEUED, locked_by='', locked_at=None)
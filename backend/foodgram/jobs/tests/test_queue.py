@@ -0,0 +1,20 @@
+from django.test import TestCase
+
+from jobs.models import Job
+from jobs.queue import enqueue_many, task
+
+
+@task(name='tests.noop')
+def noop(*args):
+    pass
+
+
+class EnqueueManyTest(TestCase):
+    '''Пачка заданий создается одним запросом.
+    '''
+    def test_one_query(self):
+        with self.assertNumQueries(1):
+            enqueue_many('tests.noop', [(pk,) for pk in range(50)])
+        self.assertEqual(
+            sorted(Job.objects.values_list('args', flat=True)),
+            [[pk] for pk in range(50)])
@@ -1,15 +1,20 @@
 from django.contrib import admin
 
-from .models import (AmountOfIngredient, Favorite, Ingredient,
-                     IngredientInRecipe, Recipe, Shoppingcart, Tag,
-                     TagInRecipe)
+from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                     RecipeRanking, Shoppingcart, ShoppingList, Tag,
+                     TagInRecipe, TimelineEntry)
+from .paginators import EstimatedCountPaginator
 
 
-class IngredientInRecipeInline(admin.StackedInline):
-    model = IngredientInRecipe
+class RecipeIngredientInline(admin.StackedInline):
+    model = RecipeIngredient
     list_display = (
         'recipe',
     )
+    autocomplete_fields = ('ingredient',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('ingredient')
 
 
 class TagInRecipeInline(admin.StackedInline):
@@ -18,6 +23,9 @@ class TagInRecipeInline(admin.StackedInline):
         'tag',
     )
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('tag')
+
 
 class RecipeAdmin(admin.ModelAdmin):
     list_display = (
@@ -27,13 +35,23 @@ class RecipeAdmin(admin.ModelAdmin):
         'in_favorites'
     )
     readonly_fields = ('in_favorites',)
-    inlines = [IngredientInRecipeInline, TagInRecipeInline]
-    list_filter = ('author', 'name', 'tags',)
+    inlines = [RecipeIngredientInline, TagInRecipeInline]
+    list_filter = ('tags',)
+    list_select_related = ('author',)
+    search_fields = ('^name', '^author__username')
+    autocomplete_fields = ('author',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
-    @admin.display(description='В избранном')
+    @admin.display(description='В избранном', ordering='favorites_count')
     def in_favorites(self, obj):
-        return obj.favorit_recipe.count()
+        return obj.favorites_count
+
+    def save_related(self, request, form, formsets, change):
+        recipes = (form.instance.pk,) if change else ()
+        with ShoppingList.objects.sync(recipes):
+            super().save_related(request, form, formsets, change)
 
 
 class TagAdmin(admin.ModelAdmin):
@@ -42,7 +60,9 @@ class TagAdmin(admin.ModelAdmin):
         'name',
         'color',
         'slug',
+        'bit',
     )
+    search_fields = ('name', 'slug')
     empty_value_display = '-пусто-'
 
 
@@ -52,7 +72,9 @@ class IngredientAdmin(admin.ModelAdmin):
         'name',
         'measurement_unit',
     )
-    list_filter = ('name',)
+    search_fields = ('^name',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
 
@@ -61,9 +83,14 @@ class FavoriteAdmin(admin.ModelAdmin):
         'id',
         'user',
         'recipe',
+        'created_at',
     )
-    search_fields = ('user',)
-    list_filter = ('user',)
+    list_select_related = ('user', 'recipe')
+    search_fields = ('^user__username', '^recipe__name')
+    autocomplete_fields = ('user', 'recipe')
+    ordering = ('-id',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
 
@@ -72,9 +99,14 @@ class ShoppingcartAdmin(admin.ModelAdmin):
         'id',
         'recipe',
         'user',
+        'created_at',
     )
-    search_fields = ('user',)
-    list_filter = ('user',)
+    list_select_related = ('recipe', 'user')
+    search_fields = ('^user__username', '^recipe__name')
+    autocomplete_fields = ('recipe', 'user')
+    ordering = ('-id',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
 
@@ -84,33 +116,100 @@ class TagInRecipeAdmin(admin.ModelAdmin):
         'recipe',
         'tag',
     )
+    list_select_related = ('recipe', 'tag')
+    list_filter = ('tag',)
+    autocomplete_fields = ('recipe', 'tag')
+    ordering = ('-id',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
 
-class IngredientInRecipeAdmin(admin.ModelAdmin):
+class RecipeIngredientAdmin(admin.ModelAdmin):
     list_display = (
+        'id',
         'recipe',
         'ingredient',
+        'amount',
     )
+    list_select_related = ('recipe', 'ingredient')
+    search_fields = ('^recipe__name', '^ingredient__name')
+    autocomplete_fields = ('recipe', 'ingredient')
+    ordering = ('-id',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
+    def save_model(self, request, obj, form, change):
+        recipes = {obj.recipe_id, form.initial.get('recipe')} - {None}
+        with ShoppingList.objects.sync(recipes):
+            super().save_model(request, obj, form, change)
+
+    def delete_model(self, request, obj):
+        with ShoppingList.objects.sync((obj.recipe_id,)):
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        recipes = set(queryset.values_list('recipe', flat=True))
+        with ShoppingList.objects.sync(recipes):
+            super().delete_queryset(request, queryset)
 
-class AmountOfIngredientAdmin(admin.ModelAdmin):
+
+class ShoppingListAdmin(admin.ModelAdmin):
     list_display = (
         'id',
+        'user',
         'ingredient',
-        'amount',
+        'total_amount',
+    )
+    list_select_related = ('user', 'ingredient')
+    search_fields = ('^user__username', '^ingredient__name')
+    autocomplete_fields = ('user', 'ingredient')
+    ordering = ('-id',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    empty_value_display = '-пусто-'
+
+
+class TimelineEntryAdmin(admin.ModelAdmin):
+    list_display = (
+        'id',
+        'user',
+        'recipe',
+        'author',
     )
-    search_fields = ('ingredient',)
-    list_filter = ('ingredient',)
+    list_select_related = ('user', 'recipe', 'author')
+    search_fields = ('^user__username', '^author__username')
+    autocomplete_fields = ('user', 'recipe', 'author')
+    ordering = ('-id',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
 
+class RecipeRankingAdmin(admin.ModelAdmin):
+    list_display = (
+        'recipe',
+        'trending',
+        'top',
+    )
+    list_select_related = ('recipe',)
+    search_fields = ('^recipe__name',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    empty_value_display = '-пусто-'
+
+    def has_add_permission(self, request):
+        return False
+
+
 admin.site.register(Tag, TagAdmin)
 admin.site.register(TagInRecipe, TagInRecipeAdmin)
 admin.site.register(Ingredient, IngredientAdmin)
-admin.site.register(IngredientInRecipe, IngredientInRecipeAdmin)
+admin.site.register(RecipeIngredient, RecipeIngredientAdmin)
 admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(Favorite, FavoriteAdmin)
 admin.site.register(Shoppingcart, ShoppingcartAdmin)
-admin.site.register(AmountOfIngredient, AmountOfIngredientAdmin)
+admin.site.register(ShoppingList, ShoppingListAdmin)
+admin.site.register(TimelineEntry, TimelineEntryAdmin)
+admin.site.register(RecipeRanking, RecipeRankingAdmin)
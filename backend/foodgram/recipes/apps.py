@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class RecipesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
+
+    def ready(self):
+        from .models import (ensure_recipe_rankings, ensure_table_versions,
+                             ensure_tag_masks, ensure_timeline_dates)
+        from .search import ensure_search_schema
+        post_migrate.connect(ensure_search_schema, sender=self)
+        post_migrate.connect(ensure_tag_masks, sender=self)
+        post_migrate.connect(ensure_timeline_dates, sender=self)
+        post_migrate.connect(ensure_table_versions, sender=self)
+        post_migrate.connect(ensure_recipe_rankings, sender=self)
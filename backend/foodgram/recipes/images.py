@@ -0,0 +1,77 @@
+'''Копии картинок рецептов.
+
+Для каждой картинки сохраняются копии размеров IMAGE_RENDITIONS в формате
+IMAGE_RENDITION_FORMAT без EXIF и других метаданных:
+recipes/images/pie.png -> recipes/images/renditions/pie.png.thumbnail.webp.
+Имя исходного файла входит в имя копии целиком, вместе с расширением:
+у pie.png и pie.jpg копии разные.
+'''
+import posixpath
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+from foodgram.settings import (IMAGE_RENDITION_FORMAT, IMAGE_RENDITION_QUALITY,
+                               IMAGE_RENDITIONS)
+
+EXTENSIONS = {
+    'WEBP': 'webp',
+    'JPEG': 'jpg',
+}
+
+
+def rendition_name(name, rendition):
+    '''Имя файла копии rendition картинки name в хранилище.
+    '''
+    directory, filename = posixpath.split(name)
+    extension = EXTENSIONS[IMAGE_RENDITION_FORMAT]
+    return posixpath.join(directory, 'renditions',
+                          f'{filename}.{rendition}.{extension}')
+
+
+def has_renditions(image_file):
+    return image_file.storage.exists(
+        rendition_name(image_file.name, next(iter(IMAGE_RENDITIONS))))
+
+
+def prepare(image):
+    '''Повернуть по EXIF и привести к режиму, который поддерживает формат.
+    '''
+    image = ImageOps.exif_transpose(image)
+    has_alpha = (image.mode in ('RGBA', 'LA', 'PA')
+                 or 'transparency' in image.info)
+    if IMAGE_RENDITION_FORMAT == 'WEBP' and has_alpha:
+        return image.convert('RGBA')
+    return image.convert('RGB')
+
+
+def encode(image, size):
+    copy = image.copy()
+    copy.thumbnail(size, Image.LANCZOS)
+    copy.info = {}
+    buffer = BytesIO()
+    copy.save(buffer, IMAGE_RENDITION_FORMAT,
+              quality=IMAGE_RENDITION_QUALITY)
+    return buffer.getvalue()
+
+
+def make_renditions(image_file):
+    '''Сохранить копии картинки всех размеров (существующие заменяются).
+    '''
+    storage = image_file.storage
+    image_file.open('rb')
+    try:
+        with Image.open(image_file) as image:
+            image = prepare(image)
+            for rendition, size in IMAGE_RENDITIONS.items():
+                name = rendition_name(image_file.name, rendition)
+                storage.delete(name)
+                storage.save(name, ContentFile(encode(image, size)))
+    finally:
+        image_file.close()
+
+
+def delete_renditions(storage, name):
+    for rendition in IMAGE_RENDITIONS:
+        storage.delete(rendition_name(name, rendition))
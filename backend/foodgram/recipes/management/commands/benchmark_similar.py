@@ -0,0 +1,113 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+from recipes.similarity import index_recipes, similar_recipes
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Измеряет время поиска похожих рецептов на каталогах разного '
+            'размера (тестовые данные удаляются откатом транзакции)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+',
+                            default=[1000, 5000, 20000],
+                            help='Размеры каталога по возрастанию.')
+        parser.add_argument('--queries', type=int, default=200,
+                            help='Количество запросов на каждый размер.')
+        parser.add_argument('--ingredients', type=int, default=2000,
+                            help='Количество ингредиентов в каталоге.')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        with transaction.atomic():
+            self.setup(options['ingredients'])
+            for size in sorted(options['sizes']):
+                self.grow(size)
+                self.measure(size, options['queries'])
+            transaction.set_rollback(True)
+
+    def setup(self, count):
+        self.author = User.objects.create(
+            username=f'benchmark{time.time_ns()}',
+            email=f'benchmark{time.time_ns()}@example.com')
+        start = (Ingredient.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        Ingredient.objects.bulk_create([
+            Ingredient(id=start + number, name=f'benchmark {number}',
+                       measurement_unit='г')
+            for number in range(count)
+        ], batch_size=1000)
+        self.ingredients = list(range(start, start + count))
+        # Частота ингредиентов по закону Ципфа: соль есть почти везде
+        self.weights = [1 / rank for rank in range(1, count + 1)]
+        self.next_id = (Recipe.objects.aggregate(last=Max('id'))['last']
+                        or 0) + 1
+        self.recipes = {}
+        self.sets = []
+
+    def ingredient_set(self):
+        '''Набор ингредиентов: каждый третий рецепт - вариация
+        одного из прежних (замена одного-двух ингредиентов).
+        '''
+        if self.sets and self.random.random() < 0.3:
+            base = set(self.random.choice(self.sets))
+            for _ in range(self.random.randint(1, 2)):
+                base.discard(self.random.choice(sorted(base)))
+                base.add(self.random.choice(self.ingredients))
+            return base
+        size = self.random.randint(4, 12)
+        chosen = set()
+        while len(chosen) < size:
+            chosen.update(self.random.choices(self.ingredients, self.weights,
+                                              k=size - len(chosen)))
+        return chosen
+
+    def grow(self, size, batch_size=1000):
+        '''Добавить рецепты до размера каталога size.
+        '''
+        while len(self.recipes) < size:
+            count = min(batch_size, size - len(self.recipes))
+            batch = {}
+            for recipe_id in range(self.next_id, self.next_id + count):
+                batch[recipe_id] = self.ingredient_set()
+                self.sets.append(batch[recipe_id])
+            self.next_id += count
+            Recipe.objects.bulk_create([
+                Recipe(id=recipe_id, author=self.author,
+                       name=f'Рецепт {recipe_id}', text='benchmark',
+                       image='recipes/images/benchmark.png', cooking_time=1)
+                for recipe_id in batch
+            ])
+            RecipeIngredient.objects.bulk_create([
+                RecipeIngredient(recipe_id=recipe_id,
+                                 ingredient_id=ingredient_id, amount=1)
+                for recipe_id, ingredient_ids in batch.items()
+                for ingredient_id in ingredient_ids
+            ])
+            index_recipes(batch)
+            self.recipes.update(batch)
+
+    def measure(self, size, queries):
+        recipe_ids = list(self.recipes)
+        timings = []
+        found = 0
+        for _ in range(queries):
+            recipe_id = self.random.choice(recipe_ids)
+            started = time.perf_counter()
+            found += len(similar_recipes(recipe_id))
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        p50 = statistics.median(timings)
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        self.stdout.write(
+            f'Каталог {size}: p50 {p50:.2f} мс, p95 {p95:.2f} мс, '
+            f'в среднем найдено {found / queries:.1f}')
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, Shoppingcart, User
+from users.models import Subscription
+
+
+def count_of(model, field):
+    '''Подзапрос: число строк model, ссылающихся на объект через field.
+    '''
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')})
+        .order_by().values(field).annotate(total=Count('pk'))
+        .values('total'),
+        output_field=IntegerField()
+    ), 0)
+
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', Shoppingcart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Subscription, 'author'),
+)
+
+
+class Command(BaseCommand):
+    help = ('Сверяет счетчики рецептов и пользователей с данными '
+            'и исправляет расхождения')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Только сверить, не исправляя.')
+
+    def handle(self, *args, **options):
+        drift = 0
+        for model, field, source, source_field in COUNTERS:
+            with transaction.atomic():
+                wrong = (
+                    model.objects
+                    .annotate(actual=count_of(source, source_field))
+                    .filter(~Q(**{field: F('actual')}))
+                )
+                rows = list(wrong.values_list('pk', field, 'actual'))
+                for pk, stored, actual in rows:
+                    self.stdout.write(
+                        f'{model._meta.model_name}={pk} {field}: '
+                        f'{stored} != {actual}')
+                if rows and not options['check']:
+                    model.objects.filter(
+                        pk__in=[pk for pk, _, _ in rows]
+                    ).update(**{field: count_of(source, source_field)})
+            drift += len(rows)
+        if drift and options['check']:
+            raise CommandError(f'Расхождений: {drift}')
+        if drift:
+            self.stdout.write(f'Исправлено счетчиков: {drift}.')
+        self.stdout.write(self.style.SUCCESS('Счетчики совпадают с данными.'))
@@ -1,27 +1,183 @@
 import csv
+import io
+import json
+import time
+from itertools import islice
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
 
-from recipes.models import Ingredient
+from recipes.models import AmountOfIngredient, Ingredient, RecipeIngredient
+from recipes.versions import bump_version
+
+READ_SIZE = 64 * 1024
+
+
+def read_csv(file):
+    '''Строки CSV без заголовка: название, единица измерения.
+    '''
+    for row in csv.reader(file):
+        if row:
+            yield row[0], row[1] if len(row) > 1 else ''
+
+
+def read_json(file):
+    '''Элементы JSON-массива объектов, разбираемые по мере чтения файла.
+    '''
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    while True:
+        chunk = file.read(READ_SIZE)
+        buffer += chunk
+        if not started and buffer.strip():
+            buffer = buffer.lstrip()
+            if not buffer.startswith('['):
+                raise CommandError('Ожидается JSON-массив.')
+            buffer = buffer[1:]
+            started = True
+        buffer = buffer.lstrip(', \t\r\n')
+        while buffer and not buffer.startswith(']'):
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except ValueError:
+                if not chunk:
+                    raise CommandError('Некорректный JSON.')
+                break
+            yield item['name'], item['measurement_unit']
+            buffer = buffer[end:].lstrip(', \t\r\n')
+        if not chunk or buffer.startswith(']'):
+            return
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    batch = list(islice(iterator, size))
+    while batch:
+        yield batch
+        batch = list(islice(iterator, size))
 
 
 class Command(BaseCommand):
-    help = 'Добавляет данные из файлa ingredients.csv в таблицу Ingredient'
+    help = ('Загружает ингредиенты из CSV или JSON файла в таблицу '
+            'Ingredient. Повторная загрузка добавляет только новые записи')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?',
+            default=f'{settings.BASE_DIR}/static/data/ingredients.csv')
+        parser.add_argument('--format', choices=READERS,
+                            help='По умолчанию - по расширению файла.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--copy', action='store_true',
+                            help='Загружать через COPY (PostgreSQL).')
+        parser.add_argument('--prune', action='store_true',
+                            help='Удалить ингредиенты, которых нет в файле '
+                                 '(кроме используемых в рецептах).')
 
     def handle(self, *args, **options):
-        print('\nCreating Ingredient list')
-        with open(
-            f'{settings.BASE_DIR}/static/data/ingredients.csv',
-                'r',
-                encoding='utf-8'
-        ) as csv_file:
-            r = csv.DictReader(csv_file,
-                               fieldnames=['name', 'measurement_unit'])
-
-            for row in r:
-                print(row['name'], ',', row['measurement_unit'])
-                Ingredient.objects.get_or_create(
-                    name=row['name'],
-                    measurement_unit=row['measurement_unit'])
-            print(' -List created\nDone')
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('--copy поддерживается только PostgreSQL.')
+        fmt = options['format'] or options['path'].rsplit('.', 1)[-1]
+        if fmt not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {fmt}')
+        write = self.copy_batch if options['copy'] else self.insert_batch
+        started = time.monotonic()
+        existing = {
+            (name, unit): pk for pk, name, unit
+            in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit').iterator()
+        }
+        with open(options['path'], encoding='utf-8') as file:
+            with transaction.atomic():
+                read, created, seen = self.load(
+                    READERS[fmt](file), existing, write,
+                    options['batch_size'])
+                pruned, kept = 0, []
+                if options['prune']:
+                    pruned, kept = self.prune(
+                        [pk for key, pk in existing.items()
+                         if key not in seen],
+                        options['batch_size'])
+        bump_version(Ingredient)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано: {read}, добавлено: {created}, '
+            f'уже были: {len(seen) - created}, удалено: {pruned}. '
+            f'{elapsed:.2f} с, {read / elapsed if elapsed else read:.0f} '
+            f'строк/с.'))
+        if kept:
+            self.stdout.write(self.style.WARNING(
+                f'Нет в файле, но используются в рецептах и не удалены '
+                f'({len(kept)}): ' + '; '.join(kept)))
+
+    def load(self, rows, existing, write, batch_size):
+        '''Записать пачками строки, которых еще нет в таблице.
+        '''
+        seen = set()
+        read = created = 0
+        for batch in batches(rows, batch_size):
+            read += len(batch)
+            new = []
+            for name, unit in batch:
+                key = (name.strip(), unit.strip())
+                if key not in seen and key not in existing:
+                    new.append(key)
+                seen.add(key)
+            if new:
+                write(new)
+                created += len(new)
+        return read, created, seen
+
+    def insert_batch(self, rows):
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=name, measurement_unit=unit)
+             for name, unit in rows],
+            ignore_conflicts=True)
+
+    def copy_batch(self, rows):
+        '''COPY во временную таблицу и перенос без конфликтующих строк.
+        '''
+        table = Ingredient._meta.db_table
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE IF NOT EXISTS ingredient_load '
+                '(name varchar(200), measurement_unit varchar(200)) '
+                'ON COMMIT DROP')
+            cursor.copy_expert(
+                'COPY ingredient_load (name, measurement_unit) '
+                'FROM STDIN WITH (FORMAT csv)', buffer)
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                f'SELECT name, measurement_unit FROM ingredient_load '
+                f'ON CONFLICT DO NOTHING')
+            cursor.execute('TRUNCATE ingredient_load')
+
+    def prune(self, ids, batch_size):
+        '''Удалить ингредиенты ids, которых нет ни в одном рецепте.
+        Возвращает количество удаленных и названия оставленных.
+        '''
+        in_use = (
+            Exists(RecipeIngredient.objects.filter(ingredient=OuterRef('pk')))
+            | Exists(AmountOfIngredient.objects.filter(
+                ingredient=OuterRef('pk'))))
+        pruned = 0
+        kept = []
+        for batch in batches(ids, batch_size):
+            ingredients = Ingredient.objects.filter(pk__in=batch)
+            kept.extend(str(ingredient)
+                        for ingredient in ingredients.filter(in_use))
+            pruned += ingredients.exclude(in_use).delete()[1].get(
+                Ingredient._meta.label, 0)
+        return pruned, kept
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe, TimelineEntry
+
+
+class Command(BaseCommand):
+    help = 'Рассылает в ленты подписчиков еще не разосланные рецепты'
+
+    def handle(self, *args, **options):
+        sent = skipped = 0
+        recipes = Recipe.objects.filter(fanned_out=False).select_related(
+            'author').only('id', 'author', 'pub_date',
+                           'author__followers_count')
+        for recipe in recipes.iterator():
+            if TimelineEntry.objects.fan_out(recipe):
+                sent += 1
+            else:
+                skipped += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Разослано рецептов: {sent}, добавляются при чтении: '
+            f'{skipped}.'))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import has_renditions, make_renditions
+from recipes.models import Recipe, mark_renditions_ready
+
+
+class Command(BaseCommand):
+    help = 'Создает копии картинок рецептов, для которых их еще нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Пересоздать все копии (после изменения '
+                                 'размеров или формата).')
+
+    def handle(self, *args, **options):
+        made = failed = 0
+        recipes = Recipe.objects.exclude(image='').only(
+            'id', 'image', 'renditions_ready')
+        for recipe in recipes.iterator():
+            if options['force'] or not has_renditions(recipe.image):
+                try:
+                    make_renditions(recipe.image)
+                except (OSError, ValueError) as error:
+                    failed += 1
+                    self.stderr.write(f'Рецепт {recipe.id}: {error}')
+                    continue
+                made += 1
+            elif recipe.renditions_ready:
+                continue
+            mark_renditions_ready((recipe.id,))
+        self.stdout.write(self.style.SUCCESS(
+            f'Созданы копии картинок рецептов: {made}, ошибок: {failed}.'))
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+
+from recipes.models import (AmountOfIngredient, IngredientInRecipe, Recipe,
+                            RecipeChange, RecipeIngredient, ShoppingList)
+
+
+class Command(BaseCommand):
+    help = ('Переносит ингредиенты рецептов из таблиц AmountOfIngredient '
+            'и IngredientInRecipe в RecipeIngredient')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Количество рецептов в одной транзакции.')
+        parser.add_argument('--keep-legacy', action='store_true',
+                            help='Не удалять перенесенные строки.')
+
+    def handle(self, *args, **options):
+        last_id = 0
+        moved = recipes = 0
+        while True:
+            batch = list(
+                Recipe.objects.filter(id__gt=last_id).order_by('id')
+                .values_list('id', flat=True)[:options['batch_size']])
+            if not batch:
+                break
+            moved += self.move(batch, options['keep_legacy'])
+            recipes += len(batch)
+            last_id = batch[-1]
+        self.stdout.write(self.style.SUCCESS(
+            f'Рецептов: {recipes}, перенесено ингредиентов: {moved}.'))
+
+    def move(self, recipes, keep_legacy):
+        '''Перенести ингредиенты рецептов одной транзакцией.
+        Одинаковые ингредиенты рецепта складываются, списки покупок
+        пересчитываются.
+        '''
+        with transaction.atomic(), ShoppingList.objects.sync(recipes):
+            rows = [
+                RecipeIngredient(recipe_id=recipe_id,
+                                 ingredient_id=ingredient_id,
+                                 amount=amount)
+                for recipe_id, ingredient_id, amount in
+                IngredientInRecipe.objects.filter(recipe__in=recipes)
+                .values('recipe', 'ingredient__ingredient')
+                .annotate(amount=Sum('ingredient__amount'))
+                .values_list('recipe', 'ingredient__ingredient', 'amount')
+                .order_by()
+            ]
+            RecipeIngredient.objects.bulk_create(rows, ignore_conflicts=True)
+            RecipeChange.objects.log(recipes)
+            if not keep_legacy:
+                AmountOfIngredient.objects.filter(
+                    ingredient_in__recipe__in=recipes).delete()
+        return len(rows)
@@ -0,0 +1,41 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.ranking import rank_recipes
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рейтинг рецептов (trending и top)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Пересчитывать каждые N секунд, '
+                                 'пока процесс не остановят.')
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        while not self.stopping:
+            started = time.monotonic()
+            ranked = rank_recipes()
+            elapsed = time.monotonic() - started
+            self.stdout.write(self.style.SUCCESS(
+                f'Рецептов в рейтинге: {ranked} ({elapsed:.1f} с).'))
+            if not options['interval']:
+                break
+            self.sleep(options['interval'] - elapsed)
+
+    def sleep(self, seconds):
+        '''Ждать следующего пересчета, проверяя остановку раз в секунду.
+        '''
+        deadline = time.monotonic() + seconds
+        while not self.stopping and time.monotonic() < deadline:
+            time.sleep(min(1, deadline - time.monotonic()))
+
+    def stop(self, signum, frame):
+        '''Завершиться после текущего пересчета.
+        '''
+        self.stopping = True
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import ShoppingList
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает сводные списки покупок и сверяет их '
+            'с корзинами пользователей')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Только сверить, не пересобирая.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            ShoppingList.objects.rebuild(batch_size=options['batch_size'])
+            self.stdout.write('Сводные списки покупок пересобраны.')
+        live = {
+            (user_id, ingredient_id): total_amount
+            for user_id, ingredient_id, total_amount
+            in ShoppingList.objects.live_totals().iterator()
+        }
+        stored = {
+            (user_id, ingredient_id): total_amount
+            for user_id, ingredient_id, total_amount
+            in ShoppingList.objects.values_list(
+                'user', 'ingredient', 'total_amount').iterator()
+        }
+        drift = {key for key in set(live) | set(stored)
+                 if live.get(key) != stored.get(key)}
+        for user_id, ingredient_id in sorted(drift):
+            self.stdout.write(
+                f'user={user_id} ingredient={ingredient_id}: '
+                f'{stored.get((user_id, ingredient_id))} != '
+                f'{live.get((user_id, ingredient_id))}')
+        if drift:
+            raise CommandError(f'Расхождений: {len(drift)}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Сводные списки совпадают с корзинами: {len(live)} строк.'))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import Recipe, RecipeSignature, SignatureBucket
+from recipes.similarity import band_keys, index_recipe_ids, unpack
+
+
+class Command(BaseCommand):
+    help = 'Строит индекс похожих рецептов (подписи MinHash и корзины LSH)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Количество рецептов в одной транзакции.')
+        parser.add_argument('--buckets-only', action='store_true',
+                            help='Пересобрать корзины из сохраненных '
+                                 'подписей (после изменения SIMILAR_BANDS).')
+
+    def handle(self, *args, **options):
+        last_id = 0
+        indexed = 0
+        while True:
+            batch = list(
+                Recipe.objects.filter(id__gt=last_id).order_by('id')
+                .values_list('id', flat=True)[:options['batch_size']])
+            if not batch:
+                break
+            if options['buckets_only']:
+                self.rebuild_buckets(batch)
+            else:
+                index_recipe_ids(batch)
+            indexed += len(batch)
+            last_id = batch[-1]
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано рецептов: {indexed}.'))
+
+    @transaction.atomic
+    def rebuild_buckets(self, recipes):
+        signatures = RecipeSignature.objects.filter(recipe__in=recipes)
+        SignatureBucket.objects.filter(recipe__in=recipes).delete()
+        SignatureBucket.objects.bulk_create([
+            SignatureBucket(recipe_id=row.recipe_id, key=key)
+            for row in signatures
+            for key in band_keys(unpack(bytes(row.signature)))
+        ])
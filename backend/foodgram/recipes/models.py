@@ -1,19 +1,49 @@
 # https://docs.djangoproject.com/en/2.2/ref/models/fields/#field-types
 
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, RegexValidator
-from django.db import models
-from django.db.models.signals import post_delete
+from django.db import IntegrityError, models, transaction
+from django.db.models import (Case, Exists, F, IntegerField, Max, Min,
+                              OuterRef, Q, Subquery, Sum, Value, When)
+from django.db.models.functions import Greatest
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
 from django.dispatch import receiver
+from django.utils import timezone
+from django_cleanup.signals import cleanup_post_delete
+from jobs.queue import enqueue
+from users.models import Subscription
+
+from foodgram.settings import (CHANGE_JOURNAL_GAP_TIMEOUT,
+                               CHANGE_JOURNAL_RETENTION, CHUNK_SIZE,
+                               FEED_BACKFILL_SIZE, FEED_FANOUT_BATCH_SIZE,
+                               FEED_FANOUT_LIMIT, FEED_MERGE_WINDOW)
+
+from .images import delete_renditions, has_renditions
+from .search import delete_search_document, update_search_document
+from .versions import bump_version, ensure_versions
 
 User = get_user_model()
 
+# Поля пользователя в представлении рецепта
+AUTHOR_FIELDS = ('email', 'username', 'first_name', 'last_name')
+# Маска тэгов рецепта хранится в BigIntegerField: бит знака не используется
+TAG_BITS = 63
+
 
 class Tag(models.Model):
     '''Тэги:
     name   - Название;
     color  - Цвет в HEX;
-    slug   - Уникальный слаг.
+    slug   - Уникальный слаг;
+    bit    - Номер бита тэга в маске тэгов рецепта.
     '''
     name = models.CharField(
         verbose_name='Тэг',
@@ -37,15 +67,62 @@ class Tag(models.Model):
         max_length=200,
         unique=True
     )
+    bit = models.PositiveSmallIntegerField(
+        verbose_name='Бит в маске',
+        null=True,
+        editable=False
+    )
 
     class Meta:
         ordering = ['name']
         verbose_name = 'Тэг'
         verbose_name_plural = 'Тэги'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['bit'],
+                name='unique_tag_bit'
+            )
+        ]
 
     def __str__(self):
         return self.name
 
+    @property
+    def mask(self):
+        return 1 << self.bit
+
+    def save(self, *args, **kwargs):
+        '''Тэгу без бита назначается свободный бит. Если его одновременно
+        занял другой тэг (нарушение unique_tag_bit), берется следующий.
+        Тэги, созданные без save() (loaddata, bulk_create), получают бит
+        в ensure_tag_masks.
+        '''
+        if self.bit is not None:
+            return super().save(*args, **kwargs)
+        while True:
+            self.bit = self.free_bit()
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                taken = (Tag.objects.filter(bit=self.bit)
+                         .exclude(pk=self.pk).exists())
+                self.bit = None
+                if not taken:
+                    raise
+
+    @classmethod
+    def free_bit(cls):
+        '''Наименьший номер бита, не занятый другими тэгами.
+        '''
+        used = set(cls.objects.exclude(bit=None)
+                   .values_list('bit', flat=True))
+        for bit in range(TAG_BITS):
+            if bit not in used:
+                return bit
+        raise ValidationError(
+            f'Тэгов не может быть больше {TAG_BITS}.')
+
 
 class Ingredient(models.Model):
     '''Ингредиенты:
@@ -66,13 +143,56 @@ class Ingredient(models.Model):
         ordering = ['name']
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                name="unique_ingredient",
+                fields=['name', 'measurement_unit'],
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class TableVersion(models.Model):
+    '''Версия таблицы для инвалидации кэшей (см. recipes.versions):
+    name    - Модель (app_label.model_name);
+    version - Номер версии.
+    '''
+    name = models.CharField(
+        verbose_name='Модель',
+        max_length=100,
+        primary_key=True
+    )
+    version = models.BigIntegerField(
+        verbose_name='Версия'
+    )
+
+    class Meta:
+        verbose_name = 'Версия таблицы'
+        verbose_name_plural = 'Версии таблиц'
+
+    def __str__(self):
+        return f'{self.name}: {self.version}'
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def bump_table_version(sender, **kwargs):
+    bump_version(sender)
+
+
+def ensure_table_versions(sender, **kwargs):
+    '''Записи версий таблиц тэгов и ингредиентов.
+    '''
+    ensure_versions(Tag, Ingredient)
+
+
 class AmountOfIngredient(models.Model):
-    '''Содержание ингредиента в рецепте:
+    '''Содержание ингредиента в рецепте (устаревшая схема, данные
+    переносятся в RecipeIngredient командой move_recipe_ingredients):
     amount     - Колличество ингредиента;
     ingredient - Ингредиент;
     amount     - Колличество ингредиента.
@@ -106,7 +226,16 @@ class Recipe(models.Model):
     name           - Название;
     image          - Ссылка на картинку на сайте;
     text           - Описание;
-    cooking_time   - Время приготовления (в минутах).
+    cooking_time   - Время приготовления (в минутах);
+    pub_date       - Дата публикации;
+    updated_at     - Дата изменения (в том числе тэгов и ингредиентов);
+    favorites_count - Сколько раз добавлен в избранное;
+    in_carts_count - Сколько раз добавлен в список покупок;
+    fanned_out     - Разослан в ленты подписчиков автора;
+    renditions_ready - Копии картинки созданы (до этого в ответах API -
+                     исходная картинка);
+    tag_mask       - Маска тэгов рецепта (бит Tag.bit каждого тэга);
+    search_vector  - Поисковый документ (PostgreSQL).
     '''
     tags = models.ManyToManyField(
         Tag,
@@ -122,9 +251,9 @@ class Recipe(models.Model):
         db_index=True
     )
     ingredients = models.ManyToManyField(
-        AmountOfIngredient,
+        Ingredient,
         verbose_name='Список ингредиентов',
-        through='IngredientInRecipe'
+        through='RecipeIngredient'
     )
     name = models.CharField(
         verbose_name='Название',
@@ -150,20 +279,100 @@ class Recipe(models.Model):
         auto_now_add=True,
         db_index=True
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True
+    )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name='В списках покупок',
+        default=0,
+        editable=False
+    )
+    fanned_out = models.BooleanField(
+        verbose_name='Разослан в ленты',
+        default=False,
+        editable=False
+    )
+    renditions_ready = models.BooleanField(
+        verbose_name='Копии картинки созданы',
+        default=False,
+        editable=False
+    )
+    tag_mask = models.BigIntegerField(
+        verbose_name='Маска тэгов',
+        default=0,
+        editable=False
+    )
+    search_vector = SearchVectorField(
+        verbose_name='Поисковый документ',
+        null=True,
+        editable=False
+    )
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=['author', '-pub_date'],
+                         condition=Q(fanned_out=False),
+                         name='recipe_unsent_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
 
+@receiver(post_save, sender=Recipe)
+def update_recipe_search_document(sender, instance, **kwargs):
+    update_search_document(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_recipe_search_document(sender, instance, **kwargs):
+    delete_search_document(instance)
+
+
+def mark_renditions_ready(recipes):
+    '''Отметить, что копии картинок рецептов созданы. Дата изменения
+    обновляется, чтобы представления в кэше перешли на копии.
+    '''
+    Recipe.objects.filter(pk__in=recipes).update(
+        renditions_ready=True, updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Recipe)
+def enqueue_recipe_image_renditions(sender, instance, **kwargs):
+    '''Копии новой картинки создаются заданием, до тех пор отдается
+    исходная.
+    '''
+    ready = bool(instance.image) and has_renditions(instance.image)
+    if ready != instance.renditions_ready:
+        Recipe.objects.filter(pk=instance.pk).update(renditions_ready=ready)
+        instance.renditions_ready = ready
+    if instance.image and not ready:
+        enqueue('recipes.image_renditions', instance.pk)
+
+
+@receiver(cleanup_post_delete, sender=Recipe)
+def delete_recipe_image_renditions(sender, file, file_name, **kwargs):
+    '''Имя берется из file_name: после удаления у file его уже нет.
+    '''
+    delete_renditions(file.storage, file_name)
+
+
 class Favorite(models.Model):
     '''Избранные рецепты:
-    user   - Пользователь добавил рецепт в избранное;
-    recipe - Рецепт.
+    user       - Пользователь добавил рецепт в избранное;
+    recipe     - Рецепт;
+    created_at - Дата добавления.
     '''
     user = models.ForeignKey(
         User,
@@ -178,6 +387,12 @@ class Favorite(models.Model):
         on_delete=models.CASCADE,
         related_name='favorit_recipe'
     )
+    created_at = models.DateTimeField(
+        verbose_name='Дата добавления',
+        default=timezone.now,
+        editable=False,
+        db_index=True
+    )
 
     class Meta:
         ordering = ['user']
@@ -196,8 +411,9 @@ class Favorite(models.Model):
 
 class Shoppingcart(models.Model):
     '''Список покупок:
-    recipe - Рецепт
-    user   - Пользователь добавил рецепт в корзину.
+    recipe     - Рецепт
+    user       - Пользователь добавил рецепт в корзину;
+    created_at - Дата добавления.
     '''
     recipe = models.ForeignKey(
         Recipe,
@@ -211,6 +427,12 @@ class Shoppingcart(models.Model):
         on_delete=models.CASCADE,
         related_name='shop_user'
     )
+    created_at = models.DateTimeField(
+        verbose_name='Дата добавления',
+        default=timezone.now,
+        editable=False,
+        db_index=True
+    )
 
     class Meta:
         ordering = ['user']
@@ -259,7 +481,8 @@ class TagInRecipe(models.Model):
 
 
 class IngredientInRecipe(models.Model):
-    '''Ингредиенты в рецептах:
+    '''Ингредиенты в рецептах (устаревшая схема, данные переносятся
+    в RecipeIngredient командой move_recipe_ingredients):
     recipe     - Рецепт;
     ingredient - Ингредиент.
     '''
@@ -291,6 +514,688 @@ class IngredientInRecipe(models.Model):
         return f'{self.recipe} {self.ingredient}'
 
 
-@receiver(post_delete, sender=IngredientInRecipe)
-def auto_delete_amount_with_ingredientinrecipe(sender, instance, **kwargs):
-    instance.ingredient.delete()
+class RecipeIngredient(models.Model):
+    '''Ингредиенты в рецептах:
+    recipe     - Рецепт;
+    ingredient - Ингредиент;
+    amount     - Количество ингредиента.
+    '''
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE,
+        related_name='recipe_ingredients'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        verbose_name='Ингредиент',
+        on_delete=models.CASCADE,
+        related_name='ingredient_recipes'
+    )
+    amount = models.PositiveIntegerField(
+        verbose_name='Количество ингредиента',
+        validators=[MinValueValidator(1)]
+    )
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Ингредиент в рецепте'
+        verbose_name_plural = 'Ингредиенты в рецепте'
+        constraints = [
+            models.UniqueConstraint(
+                name="unique_recipe_ingredient",
+                fields=['recipe', 'ingredient'],
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} {self.ingredient}'
+
+
+class RecipeChangeManager(models.Manager):
+    '''Журнал изменений рецептов: по нему индексы в памяти процессов
+    (api.pantry_index) перечитывают только изменившиеся рецепты.
+    Запись добавляется в той же транзакции, что и изменение, и видна
+    читателям вместе с ним. Номера записей выдаются при вставке, а
+    транзакции фиксируются в любом порядке, поэтому номер, пропущенный
+    при чтении, может появиться позже: пропуски перечитываются
+    CHANGE_JOURNAL_GAP_TIMEOUT секунд (номера отмененных транзакций
+    не появятся никогда).
+    '''
+    def log(self, recipes):
+        self.bulk_create([self.model(recipe_id=pk) for pk in recipes])
+
+    def position(self):
+        '''Номер последней записи журнала.
+        '''
+        return self.aggregate(position=Max('id'))['position'] or 0
+
+    def start(self):
+        '''Позиция и пропуски для нового читателя: записи старше
+        CHANGE_JOURNAL_GAP_TIMEOUT секунд считаются прочитанными, среди
+        более новых ищутся пропуски.
+        '''
+        settled = Q(created_at__lt=timezone.now() - timedelta(
+            seconds=CHANGE_JOURNAL_GAP_TIMEOUT))
+        bounds = self.aggregate(first=Min('id'),
+                                settled=Max('id', filter=settled))
+        since = bounds['settled'] or (bounds['first'] or 1) - 1
+        position, _, gaps = self.read(since, {})
+        return position, gaps
+
+    def read(self, since, gaps):
+        '''Записи после номера since и пропуски gaps ({номер: время, когда
+        пропуск замечен}). Возвращает новую позицию, множество id
+        измененных рецептов и оставшиеся пропуски.
+        '''
+        now = time.monotonic()
+        rows = dict(self.filter(Q(id__gt=since) | Q(id__in=list(gaps)))
+                    .values_list('id', 'recipe_id'))
+        position = max(since, *rows) if rows else since
+        gaps = {number: found for number, found in gaps.items()
+                if number not in rows
+                and now - found < CHANGE_JOURNAL_GAP_TIMEOUT}
+        gaps.update((number, now) for number in range(since + 1, position)
+                    if number not in rows)
+        return position, set(rows.values()), gaps
+
+    def prune(self):
+        '''Удалить записи старше CHANGE_JOURNAL_RETENTION секунд.
+        '''
+        return self.filter(created_at__lt=timezone.now() - timedelta(
+            seconds=CHANGE_JOURNAL_RETENTION)).delete()
+
+
+class RecipeChange(models.Model):
+    '''Запись журнала изменений рецептов:
+    recipe_id  - id измененного или удаленного рецепта;
+    created_at - Время изменения.
+    '''
+    recipe_id = models.PositiveIntegerField(
+        verbose_name='id рецепта'
+    )
+    created_at = models.DateTimeField(
+        verbose_name='Время изменения',
+        auto_now_add=True,
+        db_index=True
+    )
+
+    objects = RecipeChangeManager()
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Изменение рецепта'
+        verbose_name_plural = 'Журнал изменений рецептов'
+
+    def __str__(self):
+        return f'{self.id}: {self.recipe_id}'
+
+
+def touch_recipes(recipes):
+    '''Отметить изменение рецептов (тэгов и ингредиентов).
+    '''
+    Recipe.objects.filter(pk__in=recipes).update(updated_at=timezone.now())
+    RecipeChange.objects.log(recipes)
+
+
+def update_tag_masks(recipes):
+    '''Пересчитать маски тэгов рецептов по таблице TagInRecipe.
+    Возвращает словарь {id рецепта: маска}.
+    '''
+    masks = dict.fromkeys(recipes, 0)
+    rows = (TagInRecipe.objects.filter(recipe__in=list(masks))
+            .exclude(tag__bit=None).values_list('recipe', 'tag__bit'))
+    for recipe_id, bit in rows:
+        masks[recipe_id] |= 1 << bit
+    groups = defaultdict(list)
+    for recipe_id, mask in masks.items():
+        groups[mask].append(recipe_id)
+    for mask, recipe_ids in groups.items():
+        Recipe.objects.filter(pk__in=recipe_ids).update(tag_mask=mask)
+    return masks
+
+
+def ensure_tag_masks(sender=None, **kwargs):
+    '''Назначить биты тэгам без бита (созданным до появления масок,
+    через loaddata или bulk_create) и пересчитать маски их рецептов.
+    '''
+    tags = list(Tag.objects.filter(bit=None))
+    if not tags:
+        return
+    for tag in tags:
+        tag.save(update_fields=['bit'])
+    recipe_ids = list(TagInRecipe.objects.filter(tag__in=tags)
+                      .order_by().values_list('recipe', flat=True).distinct())
+    for start in range(0, len(recipe_ids), CHUNK_SIZE):
+        update_tag_masks(recipe_ids[start:start + CHUNK_SIZE])
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def log_recipe_change(sender, instance, **kwargs):
+    RecipeChange.objects.log((instance.pk,))
+
+
+@receiver(m2m_changed, sender=TagInRecipe)
+@receiver(m2m_changed, sender=RecipeIngredient)
+def touch_recipe_on_m2m_change(sender, instance, action, reverse, pk_set,
+                               **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        recipes = (instance.pk,)
+    elif pk_set:
+        recipes = pk_set
+    else:
+        return
+    if sender is TagInRecipe:
+        masks = update_tag_masks(recipes)
+        if not reverse:
+            # Рецепт могут сохранить после изменения тэгов
+            instance.tag_mask = masks[instance.pk]
+    touch_recipes(recipes)
+
+
+@receiver(post_save, sender=TagInRecipe)
+@receiver(post_delete, sender=TagInRecipe)
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def touch_recipe_on_relation_change(sender, instance, **kwargs):
+    if sender is TagInRecipe:
+        update_tag_masks((instance.recipe_id,))
+    touch_recipes((instance.recipe_id,))
+
+
+@receiver(post_save, sender=User)
+def touch_author_recipes(sender, instance, created, update_fields, **kwargs):
+    '''Профиль автора входит в представление его рецептов.
+    Сохранение только служебных полей (например, last_login) рецепты
+    не меняет.
+    '''
+    if created:
+        return
+    if update_fields and not set(update_fields) & set(AUTHOR_FIELDS):
+        return
+    Recipe.objects.filter(author=instance).update(updated_at=timezone.now())
+
+
+class ShoppingListManager(models.Manager):
+    '''Поддержка сводного списка покупок в актуальном состоянии.
+    Списки меняются при добавлении рецепта в корзину и удалении из нее
+    (сигналы Shoppingcart) и при изменении ингредиентов рецептов внутри
+    блока with sync(...) (API, админка, move_recipe_ingredients).
+    Изменения в обход sync исправляет команда shopping_list.
+    '''
+    def recipe_amounts(self, recipe):
+        '''Количество каждого ингредиента в рецепте.
+        '''
+        return dict(
+            RecipeIngredient.objects.filter(recipe=recipe)
+            .values_list('ingredient', 'amount')
+        )
+
+    def apply_amounts(self, users, amounts):
+        '''Прибавить количества ингредиентов к спискам пользователей.
+        amounts - {id ингредиента: изменение количества}.
+        '''
+        amounts = {key: value for key, value in amounts.items() if value}
+        if not amounts:
+            return
+        with transaction.atomic():
+            user_ids = list(
+                User.objects.select_for_update().filter(id__in=users)
+                .order_by('id').values_list('id', flat=True)
+            )
+            rows = self.filter(user__in=user_ids, ingredient__in=amounts)
+            existing = set(rows.values_list('user', 'ingredient'))
+            rows.update(total_amount=F('total_amount') + Case(
+                *[When(ingredient=key, then=Value(value))
+                  for key, value in amounts.items()],
+                output_field=IntegerField()))
+            self.bulk_create([
+                self.model(user_id=user_id, ingredient_id=key,
+                           total_amount=value)
+                for user_id in user_ids
+                for key, value in amounts.items()
+                if value > 0 and (user_id, key) not in existing
+            ])
+            self.filter(user__in=user_ids, total_amount__lte=0).delete()
+
+    def add_recipe(self, users, recipe, sign=1):
+        '''Добавить (sign=-1 - убрать) ингредиенты рецепта в списки.
+        '''
+        self.apply_amounts(users, {
+            key: sign * value
+            for key, value in self.recipe_amounts(recipe).items()})
+
+    def amounts(self, recipes):
+        '''Количество каждого ингредиента в рецептах:
+        {id рецепта: {id ингредиента: количество}}.
+        '''
+        amounts = defaultdict(dict)
+        for recipe_id, ingredient_id, amount in (
+                RecipeIngredient.objects.filter(recipe__in=list(recipes))
+                .values_list('recipe', 'ingredient', 'amount')):
+            amounts[recipe_id][ingredient_id] = amount
+        return amounts
+
+    @contextmanager
+    def sync(self, recipes):
+        '''Учесть во всех корзинах изменения ингредиентов рецептов
+        recipes (id), сделанные внутри блока with.
+        '''
+        with transaction.atomic():
+            carts = defaultdict(list)
+            for recipe_id, user_id in Shoppingcart.objects.filter(
+                    recipe__in=list(recipes)).values_list('recipe', 'user'):
+                carts[recipe_id].append(user_id)
+            old_amounts = self.amounts(carts)
+            yield
+            new_amounts = self.amounts(carts)
+            for recipe_id, users in carts.items():
+                old, new = old_amounts[recipe_id], new_amounts[recipe_id]
+                self.apply_amounts(users, {
+                    key: new.get(key, 0) - old.get(key, 0)
+                    for key in set(old) | set(new)})
+
+    def live_totals(self):
+        '''Сводный список, посчитанный по корзинам пользователей.
+        '''
+        return (
+            Shoppingcart.objects
+            .filter(recipe__recipe_ingredients__isnull=False)
+            .values('user', 'recipe__recipe_ingredients__ingredient')
+            .annotate(total_amount=Sum('recipe__recipe_ingredients__amount'))
+            .values_list('user', 'recipe__recipe_ingredients__ingredient',
+                         'total_amount')
+            .order_by()
+        )
+
+    def rebuild(self, batch_size=1000):
+        '''Пересобрать сводный список по корзинам пользователей.
+        '''
+        with transaction.atomic():
+            self.all().delete()
+            batch = []
+            for user_id, ingredient_id, total_amount in (
+                    self.live_totals().iterator(chunk_size=batch_size)):
+                batch.append(self.model(user_id=user_id,
+                                        ingredient_id=ingredient_id,
+                                        total_amount=total_amount))
+                if len(batch) == batch_size:
+                    self.bulk_create(batch)
+                    batch = []
+            self.bulk_create(batch)
+
+
+class ShoppingList(models.Model):
+    '''Сводный список покупок (сумма ингредиентов рецептов корзины):
+    user         - Пользователь;
+    ingredient   - Ингредиент (название и единица измерения);
+    total_amount - Общее количество ингредиента.
+    '''
+    user = models.ForeignKey(
+        User,
+        verbose_name='Пользователь',
+        on_delete=models.CASCADE,
+        related_name='shopping_list'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        verbose_name='Ингредиент',
+        on_delete=models.CASCADE,
+    )
+    total_amount = models.IntegerField(
+        verbose_name='Общее количество ингредиента',
+    )
+
+    objects = ShoppingListManager()
+
+    class Meta:
+        ordering = ['user']
+        verbose_name = 'Сводный список покупок'
+        verbose_name_plural = 'Сводные списки покупок'
+        constraints = [
+            models.UniqueConstraint(
+                name="unique_shopping_list",
+                fields=['user', 'ingredient'],
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user} {self.ingredient}'
+
+
+def change_counter(model, pk, field, delta):
+    '''Изменить счетчик объекта одним UPDATE (не меньше нуля).
+    '''
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)})
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(sender, instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(sender, instance, **kwargs):
+    change_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Favorite)
+def increment_favorites_count(sender, instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def decrement_favorites_count(sender, instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id, 'favorites_count', -1)
+
+
+@receiver(post_save, sender=Shoppingcart)
+def increment_in_carts_count(sender, instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'in_carts_count', 1)
+
+
+@receiver(post_delete, sender=Shoppingcart)
+def decrement_in_carts_count(sender, instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id, 'in_carts_count', -1)
+
+
+@receiver(post_save, sender=Shoppingcart)
+def add_recipe_to_shopping_list(sender, instance, created, **kwargs):
+    if created:
+        ShoppingList.objects.add_recipe((instance.user_id,),
+                                        instance.recipe_id)
+
+
+@receiver(pre_delete, sender=Shoppingcart)
+def remove_recipe_from_shopping_list(sender, instance, **kwargs):
+    ShoppingList.objects.add_recipe((instance.user_id,), instance.recipe_id,
+                                    sign=-1)
+
+
+class RecipeRanking(models.Model):
+    '''Рейтинг рецепта (пересчитывается командой rank_recipes):
+    recipe   - Рецепт;
+    trending - Популярность за последние дни с затуханием по времени;
+    top      - Популярность за все время;
+    pub_date - Дата публикации рецепта (копия для индексов).
+    Строка есть у каждого рецепта (без добавлений рейтинг 0), поэтому
+    выдача по рейтингу идет по индексу этой таблицы от начала.
+    '''
+    recipe = models.OneToOneField(
+        Recipe,
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='ranking'
+    )
+    trending = models.FloatField(
+        verbose_name='Популярность сейчас',
+        default=0
+    )
+    top = models.FloatField(
+        verbose_name='Популярность за все время',
+        default=0
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации рецепта',
+        null=True
+    )
+
+    class Meta:
+        ordering = ['-trending']
+        indexes = [
+            models.Index(fields=['-trending', '-pub_date', '-recipe'],
+                         name='ranking_trending_idx'),
+            models.Index(fields=['-top', '-pub_date', '-recipe'],
+                         name='ranking_top_idx'),
+        ]
+        verbose_name = 'Рейтинг рецепта'
+        verbose_name_plural = 'Рейтинг рецептов'
+
+    def __str__(self):
+        return f'{self.recipe} {self.trending:.2f}'
+
+
+@receiver(post_save, sender=Recipe)
+def create_recipe_ranking(sender, instance, created, **kwargs):
+    if created:
+        RecipeRanking.objects.create(recipe=instance,
+                                     pub_date=instance.pub_date)
+
+
+def ensure_recipe_rankings(sender=None, **kwargs):
+    '''Строки рейтинга для рецептов без них (созданных bulk_create или
+    до появления строк для всех рецептов) и даты публикации в строках.
+    '''
+    while True:
+        rows = [RecipeRanking(recipe_id=pk, pub_date=pub_date)
+                for pk, pub_date in Recipe.objects.filter(ranking=None)
+                .order_by().values_list('id', 'pub_date')[:CHUNK_SIZE]]
+        if not rows:
+            break
+        RecipeRanking.objects.bulk_create(rows, ignore_conflicts=True)
+    RecipeRanking.objects.filter(pub_date=None).update(
+        pub_date=Subquery(Recipe.objects.filter(
+            pk=OuterRef('recipe')).values('pub_date')[:1]))
+
+
+class RecipeSignature(models.Model):
+    '''Подпись MinHash набора ингредиентов рецепта:
+    recipe    - Рецепт;
+    signature - Минимальные хэши (по 8 байт).
+    '''
+    recipe = models.OneToOneField(
+        Recipe,
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='signature'
+    )
+    signature = models.BinaryField(
+        verbose_name='Подпись MinHash'
+    )
+
+    class Meta:
+        verbose_name = 'Подпись рецепта'
+        verbose_name_plural = 'Подписи рецептов'
+
+    def __str__(self):
+        return f'{self.recipe}'
+
+
+class SignatureBucket(models.Model):
+    '''Корзина LSH - рецепты с одинаковой полосой подписи:
+    recipe - Рецепт;
+    key    - Хэш номера полосы и ее значений.
+    '''
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE,
+        related_name='signature_buckets'
+    )
+    key = models.BigIntegerField(
+        verbose_name='Корзина'
+    )
+
+    class Meta:
+        verbose_name = 'Корзина LSH'
+        verbose_name_plural = 'Корзины LSH'
+        indexes = [
+            models.Index(fields=['key', 'recipe'],
+                         name='signature_bucket_key_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} {self.key}'
+
+
+class TimelineManager(models.Manager):
+    '''Ленты подписок.
+    Новый рецепт рассылается в ленты подписчиков автора (fan-out on write).
+    Рецепты авторов, у которых подписчиков больше FEED_FANOUT_LIMIT, и
+    еще не разосланные рецепты добавляются в ленту читателя при чтении
+    (merge_unsent), после чего лента читается только из TimelineEntry.
+    '''
+    def entries(self, user_ids, recipe):
+        return [self.model(user_id=user_id, recipe_id=recipe.pk,
+                           author_id=recipe.author_id,
+                           pub_date=recipe.pub_date)
+                for user_id in user_ids]
+
+    def fan_out(self, recipe):
+        '''Разослать рецепт в ленты подписчиков автора пачками.
+        '''
+        if recipe.author.followers_count > FEED_FANOUT_LIMIT:
+            return False
+        followers = (Subscription.objects.filter(author=recipe.author_id)
+                     .order_by().values_list('user', flat=True))
+        batch = []
+        for user_id in followers.iterator(chunk_size=FEED_FANOUT_BATCH_SIZE):
+            batch.append(user_id)
+            if len(batch) >= FEED_FANOUT_BATCH_SIZE:
+                self.bulk_create(self.entries(batch, recipe),
+                                 ignore_conflicts=True)
+                batch = []
+        self.bulk_create(self.entries(batch, recipe), ignore_conflicts=True)
+        Recipe.objects.filter(pk=recipe.pk).update(fanned_out=True)
+        return True
+
+    def backfill(self, user_id, author_id):
+        '''Добавить в ленту подписчика последние рецепты автора.
+        '''
+        recipes = (Recipe.objects.filter(author=author_id)
+                   .order_by('-pub_date', '-id')
+                   .only('id', 'author', 'pub_date')[:FEED_BACKFILL_SIZE])
+        self.bulk_create([
+            entry for recipe in recipes
+            for entry in self.entries((user_id,), recipe)
+        ], ignore_conflicts=True)
+
+    def cleanup(self, user_id, author_id):
+        '''Убрать из ленты подписчика рецепты автора.
+        '''
+        return self.filter(user=user_id, author=author_id).delete()
+
+    def merge_unsent(self, user):
+        '''Добавить в ленту пользователя неразосланные рецепты авторов,
+        на которых он подписан: для каждого автора - новее последней его
+        записи в ленте (с запасом FEED_MERGE_WINDOW секунд на задания
+        рассылки, которые еще не выполнены), не больше FEED_BACKFILL_SIZE.
+        Неразосланные рецепты есть только у авторов с числом подписчиков
+        больше FEED_FANOUT_LIMIT и среди только что опубликованных, их
+        читает частичный индекс recipe_unsent_idx.
+        '''
+        latest = (self.filter(user=user, author=OuterRef('author'))
+                  .order_by('-pub_date').values('pub_date')[:1])
+        recipes = (
+            Recipe.objects.filter(
+                fanned_out=False,
+                author__in=Subscription.objects.filter(
+                    user=user).values('author'))
+            .annotate(latest=Subquery(latest))
+            .filter(Q(latest=None) | Q(pub_date__gt=F('latest') - timedelta(
+                seconds=FEED_MERGE_WINDOW)))
+            .exclude(Exists(self.filter(user=user, recipe=OuterRef('pk'))))
+            .order_by('-pub_date', '-id')
+            .only('id', 'author', 'pub_date')[:FEED_BACKFILL_SIZE])
+        entries = [entry for recipe in recipes
+                   for entry in self.entries((user.pk,), recipe)]
+        if entries:
+            self.bulk_create(entries, ignore_conflicts=True)
+        return len(entries)
+
+    def page_source(self, user, recipes):
+        '''Записи ленты пользователя от новых к старым (по индексу
+        timeline_user_date_idx), рецепты которых входят в recipes.
+        '''
+        self.merge_unsent(user)
+        entries = self.filter(user=user)
+        if recipes.query.has_filters():
+            entries = entries.filter(recipe__in=recipes.values('pk'))
+        return entries.order_by('-pub_date', '-recipe_id')
+
+
+class TimelineEntry(models.Model):
+    '''Запись ленты подписок:
+    user     - Подписчик;
+    recipe   - Рецепт автора, на которого он подписан;
+    author   - Автор рецепта (для очистки ленты при отписке);
+    pub_date - Дата публикации рецепта (порядок ленты).
+    '''
+    user = models.ForeignKey(
+        User,
+        verbose_name='Подписчик',
+        on_delete=models.CASCADE,
+        related_name='timeline'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    author = models.ForeignKey(
+        User,
+        verbose_name='Автор рецепта',
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации рецепта',
+        null=True
+    )
+
+    objects = TimelineManager()
+
+    class Meta:
+        ordering = ['user']
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                name="unique_timeline_entry",
+                fields=['user', 'recipe'],
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'author', '-pub_date'],
+                         name='timeline_user_author_date_idx'),
+            models.Index(fields=['user', '-pub_date', '-recipe'],
+                         name='timeline_user_date_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} {self.recipe}'
+
+
+def ensure_timeline_dates(sender, **kwargs):
+    '''Заполнить даты записей ленты, созданных до появления поля.
+    '''
+    TimelineEntry.objects.filter(pub_date=None).update(
+        pub_date=Subquery(Recipe.objects.filter(
+            pk=OuterRef('recipe')).values('pub_date')[:1]))
+
+
+@receiver(post_save, sender=Recipe)
+def enqueue_recipe_fan_out(sender, instance, created, **kwargs):
+    if created:
+        enqueue('recipes.fan_out', instance.pk)
+
+
+@receiver(post_save, sender=Subscription)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        TimelineEntry.objects.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def cleanup_timeline(sender, instance, **kwargs):
+    TimelineEntry.objects.cleanup(instance.user_id, instance.author_id)
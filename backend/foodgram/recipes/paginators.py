@@ -0,0 +1,36 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from foodgram.settings import ADMIN_ESTIMATED_COUNT_THRESHOLD
+
+
+def estimated_count(queryset):
+    '''Оценка количества строк таблицы по статистике PostgreSQL.
+    Для остальных СУБД - None.
+    '''
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [queryset.model._meta.db_table])
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+class EstimatedCountPaginator(Paginator):
+    '''Пагинатор для списков админки по большим таблицам.
+    Если список не отфильтрован, а таблица больше
+    ADMIN_ESTIMATED_COUNT_THRESHOLD строк, количество берется из оценки
+    планировщика вместо COUNT(*) по всей таблице.
+    '''
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset)
+            if estimate and estimate > ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
@@ -0,0 +1,73 @@
+'''Рейтинг рецептов.
+
+trending - сумма добавлений рецепта в избранное и в списки покупок за
+последние RANKING_WINDOW_DAYS дней; вес каждого добавления убывает вдвое
+за RANKING_HALF_LIFE_HOURS часов. top - та же сумма за все время без
+затухания (по счетчикам рецепта). Рейтинг пересчитывается целиком и
+записывается в таблицу RecipeRanking одной транзакцией: строки есть
+у всех рецептов, у рецептов без добавлений рейтинг 0.
+'''
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from foodgram.settings import (CHUNK_SIZE, RANKING_HALF_LIFE_HOURS,
+                               RANKING_WEIGHTS, RANKING_WINDOW_DAYS)
+
+from .models import (Favorite, Recipe, RecipeRanking, Shoppingcart,
+                     ensure_recipe_rankings)
+
+EVENTS = (
+    (Favorite, RANKING_WEIGHTS['favorite']),
+    (Shoppingcart, RANKING_WEIGHTS['shopping_cart']),
+)
+
+
+def trending_scores(now):
+    '''Рейтинг за окно с затуханием: добавления читаются потоком.
+    '''
+    since = now - timedelta(days=RANKING_WINDOW_DAYS)
+    half_life = RANKING_HALF_LIFE_HOURS * 3600
+    scores = defaultdict(float)
+    for model, weight in EVENTS:
+        events = (model.objects.filter(created_at__gte=since).order_by()
+                  .values_list('recipe', 'created_at'))
+        for recipe_id, created_at in events.iterator(chunk_size=CHUNK_SIZE):
+            age = max((now - created_at).total_seconds(), 0)
+            scores[recipe_id] += weight * 0.5 ** (age / half_life)
+    return scores
+
+
+def top_scores():
+    return (
+        Recipe.objects
+        .filter(Q(favorites_count__gt=0) | Q(in_carts_count__gt=0))
+        .annotate(score=(
+            F('favorites_count') * RANKING_WEIGHTS['favorite']
+            + F('in_carts_count') * RANKING_WEIGHTS['shopping_cart']))
+        .order_by()
+        .values_list('id', 'score')
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+
+
+def rank_recipes(now=None, batch_size=1000):
+    '''Пересчитать рейтинг и вернуть количество рецептов с ненулевым
+    рейтингом.
+    '''
+    now = now or timezone.now()
+    rows = {recipe_id: RecipeRanking(recipe_id=recipe_id, top=score)
+            for recipe_id, score in top_scores()}
+    for recipe_id, score in trending_scores(now).items():
+        rows.setdefault(recipe_id, RecipeRanking(recipe_id=recipe_id))
+        rows[recipe_id].trending = score
+    with transaction.atomic():
+        ensure_recipe_rankings()
+        RecipeRanking.objects.filter(Q(trending__gt=0) | Q(top__gt=0)).update(
+            trending=0, top=0)
+        RecipeRanking.objects.bulk_update(rows.values(), ('trending', 'top'),
+                                          batch_size=batch_size)
+    return len(rows)
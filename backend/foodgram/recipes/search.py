@@ -0,0 +1,129 @@
+'''Полнотекстовый поиск рецептов.
+
+PostgreSQL: поле search_vector с GIN-индексом и сходство названий
+по триграммам (pg_trgm) для запросов с опечатками.
+SQLite (локальная разработка): виртуальная таблица FTS5.
+Служебные индексы и таблицы создаются после миграций приложения.
+'''
+import re
+
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector, TrigramSimilarity)
+from django.db import connections
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipe_fts'
+
+
+def document(config=SEARCH_CONFIG):
+    '''Поисковый документ рецепта: название важнее описания.
+    '''
+    return (SearchVector('name', weight='A', config=config)
+            + SearchVector('text', weight='B', config=config))
+
+
+def fts_query(value):
+    '''Запрос FTS5: все слова, каждое как префикс.
+    '''
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', value))
+
+
+def ensure_search_schema(sender, using='default', **kwargs):
+    '''Создать индексы поиска и заполнить документы рецептов.
+    '''
+    recipe_model = sender.get_model('Recipe')
+    connection = connections[using]
+    table = recipe_model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {table}_search_gin '
+                f'ON {table} USING gin (search_vector)')
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {table}_name_trgm '
+                f'ON {table} USING gin (name gin_trgm_ops)')
+            recipe_model.objects.using(using).filter(
+                search_vector__isnull=True).update(search_vector=document())
+        elif connection.vendor == 'sqlite':
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} '
+                f'USING fts5(name, text, tokenize="unicode61")')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+                f'SELECT id, name, text FROM {table} '
+                f'WHERE id NOT IN (SELECT rowid FROM {FTS_TABLE})')
+
+
+def update_search_document(recipe):
+    '''Обновить поисковый документ сохраненного рецепта.
+    '''
+    connection = connections[recipe._state.db]
+    if connection.vendor == 'postgresql':
+        type(recipe).objects.using(recipe._state.db).filter(
+            pk=recipe.pk).update(search_vector=document())
+    elif connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                           [recipe.pk])
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+                f'VALUES (%s, %s, %s)', [recipe.pk, recipe.name, recipe.text])
+
+
+def update_search_documents(queryset):
+    '''Обновить поисковые документы рецептов, созданных bulk_create.
+    '''
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        queryset.update(search_vector=document())
+    elif connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+                f'VALUES (%s, %s, %s)',
+                list(queryset.values_list('id', 'name', 'text')))
+
+
+def delete_search_document(recipe):
+    connection = connections[recipe._state.db]
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                           [recipe.pk])
+
+
+def search_recipes(queryset, value):
+    '''Рецепты, подходящие под запрос, по убыванию релевантности.
+    Порядок отличается от порядка курсорной пагинации (-pub_date, -id).
+    '''
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        query = SearchQuery(value, config=SEARCH_CONFIG,
+                            search_type='websearch')
+        return (
+            queryset
+            .annotate(rank=SearchRank(F('search_vector'), query),
+                      similarity=TrigramSimilarity('name', value))
+            .filter(Q(search_vector=query) | Q(name__trigram_similar=value))
+            .order_by('-rank', '-similarity', '-pub_date')
+        )
+    if vendor == 'sqlite':
+        query = fts_query(value)
+        if not query:
+            return queryset.none()
+        table = queryset.model._meta.db_table
+        # bm25() тем меньше, чем релевантнее документ.
+        return (
+            queryset
+            .annotate(rank=RawSQL(
+                f'SELECT bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id',
+                [query]))
+            .filter(rank__isnull=False)
+            .order_by('rank', '-pub_date')
+        )
+    return queryset.filter(Q(name__icontains=value)
+                           | Q(text__icontains=value))
@@ -0,0 +1,126 @@
+'''Похожие рецепты: MinHash LSH по наборам ингредиентов.
+
+Подпись рецепта - SIMILAR_NUM_PERM минимумов хэш-функций
+h(x) = (a * x + b) mod p по id его ингредиентов: доля совпадающих
+минимумов двух подписей оценивает коэффициент Жаккара наборов. Подпись
+делится на SIMILAR_BANDS полос, рецепты с одинаковой полосой попадают
+в одну корзину SignatureBucket. Кандидатами становятся рецепты из корзин
+рецепта, первыми - совпавшие в большем числе полос; для не более чем
+SIMILAR_CANDIDATES кандидатов считается точный коэффициент Жаккара.
+Работа запроса ограничена размером корзин и числом кандидатов, а не
+размером каталога.
+'''
+import random
+import struct
+from collections import defaultdict
+from hashlib import blake2b
+
+from django.db import transaction
+from django.db.models import Count
+
+from foodgram.settings import (SIMILAR_BANDS, SIMILAR_CANDIDATES,
+                               SIMILAR_LIMIT, SIMILAR_NUM_PERM)
+
+from .models import RecipeIngredient, RecipeSignature, SignatureBucket
+
+# Простое число Мерсенна 2**61 - 1: хэши помещаются в 8 байт
+PRIME = (1 << 61) - 1
+
+# Коэффициенты хэш-функций не должны меняться между запусками,
+# иначе сохраненные подписи станут несравнимы с новыми
+_random = random.Random(20230401)
+HASHES = [(_random.randrange(1, PRIME), _random.randrange(PRIME))
+          for _ in range(SIMILAR_NUM_PERM)]
+
+
+def get_signature(ingredient_ids):
+    return [min((a * x + b) % PRIME for x in ingredient_ids)
+            for a, b in HASHES]
+
+
+def pack(signature):
+    return struct.pack(f'<{len(signature)}Q', *signature)
+
+
+def unpack(data):
+    return list(struct.unpack(f'<{len(data) // 8}Q', data))
+
+
+def band_keys(signature):
+    '''Ключи корзин полос подписи (8-байтовые хэши со знаком).
+    '''
+    rows = len(signature) // SIMILAR_BANDS
+    keys = []
+    for band in range(SIMILAR_BANDS):
+        values = signature[band * rows:(band + 1) * rows]
+        digest = blake2b(struct.pack(f'<H{rows}Q', band, *values),
+                         digest_size=8).digest()
+        keys.append(int.from_bytes(digest, 'little', signed=True))
+    return keys
+
+
+def jaccard(first, second):
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+def ingredient_sets(recipe_ids):
+    '''Наборы id ингредиентов рецептов одним запросом.
+    '''
+    sets = defaultdict(set)
+    rows = (RecipeIngredient.objects.filter(recipe__in=recipe_ids)
+            .order_by().values_list('recipe', 'ingredient'))
+    for recipe_id, ingredient_id in rows:
+        sets[recipe_id].add(ingredient_id)
+    return sets
+
+
+@transaction.atomic
+def index_recipes(ingredients):
+    '''Заменить подписи и корзины рецептов.
+    ingredients - Словарь {id рецепта: id его ингредиентов}.
+    '''
+    RecipeSignature.objects.filter(recipe__in=list(ingredients)).delete()
+    SignatureBucket.objects.filter(recipe__in=list(ingredients)).delete()
+    signatures = []
+    buckets = []
+    for recipe_id, ingredient_ids in ingredients.items():
+        if not ingredient_ids:
+            continue
+        signature = get_signature(ingredient_ids)
+        signatures.append(RecipeSignature(recipe_id=recipe_id,
+                                          signature=pack(signature)))
+        buckets.extend(SignatureBucket(recipe_id=recipe_id, key=key)
+                       for key in band_keys(signature))
+    RecipeSignature.objects.bulk_create(signatures)
+    SignatureBucket.objects.bulk_create(buckets)
+
+
+def index_recipe_ids(recipe_ids):
+    '''Пересчитать подписи рецептов по их ингредиентам в БД.
+    '''
+    sets = ingredient_sets(recipe_ids)
+    index_recipes({recipe_id: sets[recipe_id] for recipe_id in recipe_ids})
+
+
+def similar_recipes(recipe_id, limit=SIMILAR_LIMIT):
+    '''Похожие рецепты: список пар (id рецепта, коэффициент Жаккара)
+    от более похожих к менее похожим.
+    '''
+    keys = SignatureBucket.objects.filter(recipe=recipe_id).values('key')
+    candidates = list(
+        SignatureBucket.objects.filter(key__in=keys)
+        .exclude(recipe=recipe_id)
+        .values('recipe')
+        .annotate(hits=Count('id'))
+        .order_by('-hits', '-recipe')
+        .values_list('recipe', flat=True)[:SIMILAR_CANDIDATES]
+    )
+    if not candidates:
+        return []
+    sets = ingredient_sets([recipe_id, *candidates])
+    scored = sorted(
+        ((jaccard(sets[recipe_id], sets[pk]), pk) for pk in candidates),
+        reverse=True)
+    return [(pk, score) for score, pk in scored[:limit] if score > 0]
@@ -0,0 +1,24 @@
+from jobs.queue import task
+
+from .images import make_renditions
+from .models import Recipe, TimelineEntry, mark_renditions_ready
+
+
+@task(name='recipes.image_renditions')
+def make_recipe_image_renditions(recipe_id):
+    '''Создать копии картинки рецепта.
+    '''
+    recipe = Recipe.objects.filter(pk=recipe_id).only('id', 'image').first()
+    if recipe is not None and recipe.image:
+        make_renditions(recipe.image)
+        mark_renditions_ready((recipe.pk,))
+
+
+@task(name='recipes.fan_out')
+def fan_out_recipe(recipe_id):
+    '''Разослать рецепт в ленты подписчиков автора.
+    '''
+    recipe = Recipe.objects.select_related('author').filter(
+        pk=recipe_id).first()
+    if recipe is not None:
+        TimelineEntry.objects.fan_out(recipe)
@@ -0,0 +1,58 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from recipes.models import Favorite, Recipe, Tag
+
+User = get_user_model()
+
+ROWS = 5
+
+
+class RecipeChangelistTest(TestCase):
+    '''Количество запросов списка рецептов в админке не зависит от
+    количества строк.
+    '''
+    url = reverse('admin:recipes_recipe_changelist')
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client.force_login(self.admin)
+        self.tag = Tag.objects.create(name='Обед', color='#00FF00',
+                                      slug='lunch')
+
+    def create_recipes(self, count):
+        for number in range(Recipe.objects.count(),
+                            Recipe.objects.count() + count):
+            author = User.objects.create_user(
+                f'author{number}', f'author{number}@example.com', 'password')
+            recipe = Recipe.objects.create(
+                author=author, name=f'Рецепт {number}', text='Сварить.',
+                cooking_time=10, image='recipes/images/soup.png')
+            recipe.tags.add(self.tag)
+            Favorite.objects.create(user=self.admin, recipe=recipe)
+
+    def get_changelist(self, query=''):
+        response = self.client.get(self.url + query)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def count_queries(self, query=''):
+        with CaptureQueriesContext(connection) as queries:
+            self.get_changelist(query)
+        return len(queries)
+
+    def test_queries_do_not_depend_on_rows(self):
+        for query in ('', f'?tags__id__exact={self.tag.pk}', '?q=Рецепт'):
+            with self.subTest(query=query):
+                self.create_recipes(ROWS)
+                expected = self.count_queries(query)
+                self.create_recipes(ROWS)
+                with self.assertNumQueries(expected):
+                    response = self.get_changelist(query)
+                self.assertEqual(
+                    len(response.context['cl'].result_list),
+                    Recipe.objects.count())
@@ -0,0 +1,46 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+
+User = get_user_model()
+
+
+class PruneTest(TestCase):
+    '''csv_to_db --prune не удаляет ингредиенты рецептов.
+    '''
+    def setUp(self):
+        author = User.objects.create_user('author', 'author@example.com',
+                                          'password')
+        self.used = Ingredient.objects.create(name='свекла',
+                                              measurement_unit='г')
+        self.unused = Ingredient.objects.create(name='укроп',
+                                                measurement_unit='г')
+        self.recipe = Recipe.objects.create(
+            author=author, name='Борщ', text='Сварить.', cooking_time=60,
+            image='recipes/images/borsch.png')
+        RecipeIngredient.objects.create(recipe=self.recipe,
+                                        ingredient=self.used, amount=300)
+        file = tempfile.NamedTemporaryFile(
+            'w', suffix='.csv', encoding='utf-8', delete=False)
+        with file:
+            file.write('соль,г\n')
+        self.addCleanup(os.remove, file.name)
+        self.path = file.name
+
+    def test_prune_keeps_used_ingredients(self):
+        output = StringIO()
+        call_command('csv_to_db', self.path, prune=True, stdout=output)
+        self.assertTrue(Ingredient.objects.filter(pk=self.used.pk).exists())
+        self.assertFalse(
+            Ingredient.objects.filter(pk=self.unused.pk).exists())
+        self.assertTrue(Ingredient.objects.filter(name='соль').exists())
+        self.assertTrue(RecipeIngredient.objects.filter(
+            recipe=self.recipe, ingredient=self.used).exists())
+        self.assertIn('удалено: 1', output.getvalue())
+        self.assertIn('свекла', output.getvalue())
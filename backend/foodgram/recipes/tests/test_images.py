@@ -0,0 +1,67 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db.models.fields.files import FieldFile
+from django.test import SimpleTestCase
+from PIL import Image
+
+from foodgram.settings import IMAGE_RENDITIONS
+from recipes.images import (delete_renditions, has_renditions, make_renditions,
+                            rendition_name)
+from recipes.models import Recipe
+
+
+def image_content(image_format, color):
+    buffer = BytesIO()
+    Image.new('RGB', (64, 64), color).save(buffer, image_format)
+    return ContentFile(buffer.getvalue())
+
+
+class RenditionsTest(SimpleTestCase):
+    '''Копии картинок с одинаковым именем без расширения.
+    '''
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        self.storage = FileSystemStorage(location=self.media)
+        field = Recipe._meta.get_field('image')
+        self.png, self.jpg = (
+            FieldFile(None, field, self.storage.save(
+                f'recipes/images/pie.{extension}',
+                image_content(image_format, color)))
+            for extension, image_format, color in (
+                ('png', 'PNG', 'red'), ('jpg', 'JPEG', 'blue')))
+        self.png.storage = self.jpg.storage = self.storage
+
+    def test_rendition_names_differ(self):
+        for rendition in IMAGE_RENDITIONS:
+            self.assertNotEqual(rendition_name(self.png.name, rendition),
+                                rendition_name(self.jpg.name, rendition))
+
+    def test_renditions_are_separate(self):
+        make_renditions(self.png)
+        self.assertTrue(has_renditions(self.png))
+        self.assertFalse(has_renditions(self.jpg))
+        make_renditions(self.jpg)
+        for image_file, color in ((self.png, (255, 0, 0)),
+                                  (self.jpg, (0, 0, 255))):
+            for rendition in IMAGE_RENDITIONS:
+                name = rendition_name(image_file.name, rendition)
+                with self.storage.open(name) as rendition_file:
+                    pixel = Image.open(rendition_file).convert('RGB')
+                    self.assertTrue(all(
+                        abs(actual - expected) < 16 for actual, expected
+                        in zip(pixel.getpixel((0, 0)), color)))
+
+    def test_delete_keeps_other_renditions(self):
+        make_renditions(self.png)
+        make_renditions(self.jpg)
+        delete_renditions(self.storage, self.png.name)
+        self.assertFalse(has_renditions(self.png))
+        self.assertTrue(has_renditions(self.jpg))
+        for rendition in IMAGE_RENDITIONS:
+            self.assertTrue(self.storage.exists(
+                rendition_name(self.jpg.name, rendition)))
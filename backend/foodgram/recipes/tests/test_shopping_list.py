@@ -0,0 +1,64 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from recipes.models import (Ingredient, Recipe, RecipeIngredient, Shoppingcart,
+                            ShoppingList)
+
+User = get_user_model()
+
+
+class ShoppingListSyncTest(TestCase):
+    '''Сводный список покупок следует за изменениями ингредиентов
+    рецептов в корзинах.
+    '''
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client.force_login(self.admin)
+        self.beet = Ingredient.objects.create(name='свекла',
+                                              measurement_unit='г')
+        self.salt = Ingredient.objects.create(name='соль',
+                                              measurement_unit='г')
+        self.recipe = Recipe.objects.create(
+            author=self.admin, name='Борщ', text='Сварить.', cooking_time=60,
+            image='recipes/images/borsch.png')
+        self.row = RecipeIngredient.objects.create(
+            recipe=self.recipe, ingredient=self.beet, amount=300)
+        for number in range(2):
+            user = User.objects.create_user(
+                f'user{number}', f'user{number}@example.com', 'password')
+            Shoppingcart.objects.create(user=user, recipe=self.recipe)
+
+    def assert_in_sync(self):
+        self.assertCountEqual(
+            ShoppingList.objects.values_list('user', 'ingredient',
+                                             'total_amount'),
+            ShoppingList.objects.live_totals())
+
+    def test_sync(self):
+        with ShoppingList.objects.sync((self.recipe.pk,)):
+            RecipeIngredient.objects.filter(pk=self.row.pk).update(amount=500)
+            RecipeIngredient.objects.create(
+                recipe=self.recipe, ingredient=self.salt, amount=5)
+        self.assert_in_sync()
+        self.assertEqual(ShoppingList.objects.count(), 4)
+
+    def test_admin_change(self):
+        url = reverse('admin:recipes_recipeingredient_change',
+                      args=(self.row.pk,))
+        response = self.client.post(url, {
+            'recipe': self.recipe.pk, 'ingredient': self.salt.pk,
+            'amount': 10})
+        self.assertEqual(response.status_code, 302)
+        self.assert_in_sync()
+        self.assertFalse(
+            ShoppingList.objects.filter(ingredient=self.beet).exists())
+
+    def test_admin_delete(self):
+        url = reverse('admin:recipes_recipeingredient_delete',
+                      args=(self.row.pk,))
+        response = self.client.post(url, {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assert_in_sync()
+        self.assertFalse(ShoppingList.objects.exists())
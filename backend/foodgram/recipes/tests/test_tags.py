@@ -0,0 +1,60 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from rest_framework.test import APITestCase
+
+from recipes.models import Recipe, Tag, TagInRecipe, ensure_tag_masks
+
+User = get_user_model()
+
+
+class TagBitTest(APITestCase):
+    '''Биты тэгов в масках рецептов уникальны и назначаются и тэгам,
+    созданным без save().
+    '''
+    def setUp(self):
+        self.author = User.objects.create_user(
+            'author', 'author@example.com', 'password')
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Суп', text='Сварить.', cooking_time=10,
+            image='recipes/images/soup.png')
+
+    def test_unique_bit(self):
+        Tag.objects.create(name='Обед', color='#00FF00', slug='lunch')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Tag.objects.bulk_create([
+                Tag(name='Ужин', color='#0000FF', slug='dinner', bit=0)])
+
+    def test_taken_bit_is_retried(self):
+        Tag.objects.bulk_create([
+            Tag(name='Обед', color='#00FF00', slug='lunch', bit=0)])
+        with mock.patch.object(Tag, 'free_bit', side_effect=[0, 1]):
+            tag = Tag.objects.create(name='Ужин', color='#0000FF',
+                                     slug='dinner')
+        self.assertEqual(tag.bit, 1)
+
+    def test_bulk_created_tags_get_bits(self):
+        Tag.objects.bulk_create([
+            Tag(name='Обед', color='#00FF00', slug='lunch'),
+            Tag(name='Ужин', color='#0000FF', slug='dinner')])
+        TagInRecipe.objects.bulk_create([
+            TagInRecipe(recipe=self.recipe,
+                        tag=Tag.objects.get(slug='dinner'))])
+        ensure_tag_masks()
+        bits = Tag.objects.values_list('bit', flat=True)
+        self.assertCountEqual(bits, [0, 1])
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.tag_mask,
+                         Tag.objects.get(slug='dinner').mask)
+
+    def test_filter_by_tag_without_bit(self):
+        Tag.objects.bulk_create([
+            Tag(name='Обед', color='#00FF00', slug='lunch')])
+        TagInRecipe.objects.bulk_create([
+            TagInRecipe(recipe=self.recipe,
+                        tag=Tag.objects.get(slug='lunch'))])
+        response = self.client.get('/api/recipes/?tags=lunch')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.json()['results']],
+                         [self.recipe.pk])
@@ -0,0 +1,44 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from recipes.models import Ingredient, Tag
+from recipes.versions import (bump_version, clear_versions, get_version,
+                              get_versions)
+
+
+class TableVersionTest(TestCase):
+    '''Версии таблиц в БД.
+    '''
+    def setUp(self):
+        clear_versions()
+
+    def test_bump(self):
+        version = get_version(Tag)
+        bump_version(Tag)
+        bump_version(Tag)
+        self.assertEqual(get_version(Tag), version + 2)
+
+    def test_bump_before_first_read(self):
+        bump_version(Ingredient)
+        self.assertEqual(get_versions(Ingredient), [get_version(Ingredient)])
+
+    def test_cache_clear_keeps_versions(self):
+        versions = get_versions(Tag, Ingredient)
+        cache.clear()
+        self.assertEqual(get_versions(Tag, Ingredient), versions)
+
+    def test_change_bumps_version(self):
+        version = get_version(Ingredient)
+        Ingredient.objects.create(name='соль', measurement_unit='г')
+        self.assertGreater(get_version(Ingredient), version)
+
+    def test_read_is_kept_in_process(self):
+        versions = get_versions(Tag, Ingredient)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_versions(Tag, Ingredient), versions)
+
+    def test_uncommitted_change_is_not_kept(self):
+        bump_version(Tag)
+        version = get_version(Tag)
+        with self.assertNumQueries(1):
+            self.assertEqual(get_version(Tag), version)
@@ -0,0 +1,103 @@
+'''Версии таблиц для инвалидации кэшей.
+
+Версия хранится в таблице TableVersion и увеличивается атомарным UPDATE
+в той же транзакции, что и изменение таблицы, поэтому вытеснение записей
+из кэша версии не сбрасывает. Первая версия таблицы берется от текущего
+времени и не совпадает с версиями, под которыми в кэше могли остаться
+данные прежней базы.
+
+Прочитанные версии процесс держит в памяти TABLE_VERSION_TIMEOUT секунд:
+условный GET и поиск ингредиентов обходятся без запросов к БД, а
+изменения из других процессов становятся видны с этой задержкой.
+Процесс, изменивший таблицу, забывает ее версию сразу и еще раз после
+фиксации транзакции (другой поток мог прочитать прежнюю). Версия, прочитанная
+в транзакции, которая сама изменила таблицу, в память не попадает: до
+фиксации ее не видят другие процессы, а при откате она не наступит.
+'''
+import threading
+import time
+
+from django.apps import apps
+from django.db import connection, transaction
+from django.db.models import F
+
+from foodgram.settings import TABLE_VERSION_TIMEOUT
+
+# Версии, прочитанные процессом: {имя таблицы: (версия, время чтения)}
+local_versions = {}
+# Таблицы, измененные текущим потоком в незавершенной транзакции
+changed = threading.local()
+
+
+def table_versions():
+    return apps.get_model('recipes', 'TableVersion').objects
+
+
+def changed_tables():
+    '''Таблицы, измененные потоком в текущей транзакции.
+    '''
+    if not hasattr(changed, 'names'):
+        changed.names = set()
+    if not connection.in_atomic_block:
+        changed.names.clear()
+    return changed.names
+
+
+def clear_versions():
+    '''Забыть прочитанные версии (например, между тестами).
+    '''
+    local_versions.clear()
+    changed.names = set()
+
+
+def get_versions(*models):
+    '''Текущие версии таблиц моделей: из памяти процесса или одним
+    запросом к БД. Версия таблицы без записи в TableVersion - 0.
+    '''
+    names = [model._meta.label_lower for model in models]
+    now = time.monotonic()
+    stale = [name for name in names
+             if name not in local_versions
+             or now - local_versions[name][1] >= TABLE_VERSION_TIMEOUT]
+    if not stale:
+        return [local_versions[name][0] for name in names]
+    versions = {name: local_versions[name][0] for name in names
+                if name not in stale}
+    versions.update(dict.fromkeys(stale, 0))
+    versions.update(table_versions().filter(name__in=stale)
+                    .values_list('name', 'version'))
+    uncommitted = changed_tables()
+    for name in stale:
+        if name not in uncommitted:
+            local_versions[name] = (versions[name], now)
+    return [versions[name] for name in names]
+
+
+def get_version(model):
+    '''Текущая версия таблицы модели.
+    '''
+    return get_versions(model)[0]
+
+
+def bump_version(model):
+    '''Отметить изменение таблицы модели.
+    '''
+    name = model._meta.label_lower
+    changed_tables().add(name)
+    local_versions.pop(name, None)
+    transaction.on_commit(lambda: local_versions.pop(name, None))
+    versions = table_versions().filter(name=name)
+    if not versions.update(version=F('version') + 1):
+        table_versions().get_or_create(
+            name=name, defaults={'version': time.time_ns()})
+
+
+def ensure_versions(*models):
+    '''Создать записи версий таблиц, чтобы чтение версий ничего
+    не записывало в БД.
+    '''
+    table_versions().bulk_create(
+        [table_versions().model(name=model._meta.label_lower,
+                                version=time.time_ns())
+         for model in models],
+        ignore_conflicts=True)
@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth import get_user_model
 
+from recipes.paginators import EstimatedCountPaginator
+
 from .models import Subscription
 
 User = get_user_model()
@@ -15,8 +17,12 @@ class UserAdmin(admin.ModelAdmin):
         'password',
         'first_name',
         'last_name',
+        'recipes_count',
+        'followers_count',
     )
-    list_filter = ('username', 'email')
+    search_fields = ('^username', '^email')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
 
@@ -26,8 +32,12 @@ class SubscriptionAdmin(admin.ModelAdmin):
         'author',
         'user',
     )
-    search_fields = ('user', 'author')
-    list_filter = ('user',)
+    list_select_related = ('author', 'user')
+    search_fields = ('^user__username', '^author__username')
+    autocomplete_fields = ('author', 'user')
+    ordering = ('-id',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
 
@@ -0,0 +1,45 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from users.models import Subscription
+
+User = get_user_model()
+
+ROWS = 5
+
+
+class UserChangelistTest(TestCase):
+    '''Количество запросов списков пользователей и подписок в админке
+    не зависит от количества строк.
+    '''
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client.force_login(self.admin)
+
+    def create_users(self, count):
+        for number in range(User.objects.count(),
+                            User.objects.count() + count):
+            user = User.objects.create_user(
+                f'user{number}', f'user{number}@example.com', 'password')
+            Subscription.objects.create(user=user, author=self.admin)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(queries)
+
+    def test_queries_do_not_depend_on_rows(self):
+        for url in (reverse('admin:users_user_changelist'),
+                    reverse('admin:users_user_changelist') + '?q=user',
+                    reverse('admin:users_subscription_changelist')):
+            with self.subTest(url=url):
+                self.create_users(ROWS)
+                expected = self.count_queries(url)
+                self.create_users(ROWS)
+                with self.assertNumQueries(expected):
+                    response = self.client.get(url)
+                self.assertEqual(len(response.context['cl'].result_list),
+                                 response.context['cl'].result_count)